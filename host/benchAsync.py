@@ -0,0 +1,89 @@
+'''
+    CPython benchmark: asyncSerialOM vs serialOM in an asyncio event loop.
+
+    Runs update cycles with both classes against a fakeRRF, connected to
+    asyncSerialOM through asyncio streams, while a second task ticks every
+    millisecond (standing in for the button, LEDs and display animation).
+    Reports the update time and the longest gap between ticks during the
+    updates; the blocking serialOM stalls the other task for the whole
+    update, asyncSerialOM only while it parses.
+
+    usage: python3 benchAsync.py [capture.log] [cycles] [stream]
+'''
+
+from sys import argv, path
+from os.path import dirname, join
+from time import perf_counter
+import asyncio
+
+path.insert(0, join(dirname(__file__), '..', 'microPython'))
+from serialOM import serialOM
+from asyncSerialOM import asyncSerialOM
+from fakeRRF import fakeRRF
+
+omKeys = {'FFF':['heat','tools','job','network']}
+
+class streamWriter:
+    # the asyncio StreamWriter methods used by asyncSerialOM
+    def __init__(self, rrf):
+        self._rrf = rrf
+
+    def write(self, data):
+        self._rrf.write(data)
+
+    async def drain(self):
+        pass
+
+async def connect(rrf):
+    # asyncio streams for a fakeRRF, the reader is fed as bytes arrive
+    reader = asyncio.StreamReader()
+    async def pump():
+        while True:
+            waiting = rrf.in_waiting
+            if waiting:
+                reader.feed_data(rrf.read(waiting))
+            await asyncio.sleep(0.0005)
+    task = asyncio.get_running_loop().create_task(pump())
+    return (reader, streamWriter(rrf)), task
+
+async def run(capture, cycles, stream, useAsync):
+    ticks = [0, 0]
+    async def ticker():
+        # the longest gap between ticks
+        ticks[0] = perf_counter()
+        while True:
+            await asyncio.sleep(0.001)
+            now = perf_counter()
+            ticks[1] = max(ticks[1], now - ticks[0])
+            ticks[0] = now
+    rrf = fakeRRF(capture)
+    if useAsync:
+        streams, pump = await connect(rrf)
+        OM = asyncSerialOM(streams, omKeys, quiet=True, noCheck=True, stream=stream)
+        await OM.start()
+    else:
+        OM = serialOM(rrf, omKeys, quiet=True, noCheck=True, stream=stream)
+    tick = asyncio.get_running_loop().create_task(ticker())
+    times = []
+    failed = 0
+    for _ in range(cycles):
+        await asyncio.sleep(0.01)
+        start = perf_counter()
+        if not (await OM.update() if useAsync else OM.update()):
+            failed += 1
+        times.append(perf_counter() - start)
+    tick.cancel()
+    if useAsync:
+        pump.cancel()
+    return sum(times) / cycles * 1000, ticks[1] * 1000, failed
+
+if __name__ == '__main__':
+    capture = argv[1] if len(argv) > 1 else join(dirname(__file__), 'captures', 'fff-printing.log')
+    cycles = int(argv[2]) if len(argv) > 2 else 20
+    stream = len(argv) > 3 and argv[3] == 'stream'
+    print('capture: {}, {} cycles, {} mode'.format(capture, cycles, 'stream' if stream else 'line'))
+    print('{:14} {:>10} {:>14} {:>7}'.format('class', 'ms/update', 'max tick gap', 'failed'))
+    for useAsync in (False, True):
+        ms, gap, failed = asyncio.run(run(capture, cycles, stream, useAsync))
+        print('{:14} {:10.1f} {:14.1f} {:7d}'.format('asyncSerialOM' if useAsync else 'serialOM',
+                                                     ms, gap, failed))
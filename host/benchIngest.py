@@ -0,0 +1,106 @@
+'''
+    CPython benchmark: M409 response ingestion, line mode vs stream mode.
+
+    Replays the responses recorded in a serialOM rawLog capture file to
+    serialOM instances using the default (readline + decode + json.loads)
+    path and the streaming (omStream) parser, and reports the ingest time
+    and the peak traced allocation for verbose and frequent update cycles.
+
+    usage: python3 benchIngest.py [capture.log] [cycles]
+'''
+
+from sys import argv, path
+from os.path import dirname, join
+from time import perf_counter
+import tracemalloc
+
+path.insert(0, join(dirname(__file__), '..', 'microPython'))
+from serialOM import serialOM
+
+class captureSerial:
+    '''
+        A minimal serial device that answers each command with the next
+        response recorded for that command in a rawLog capture.
+        Responses are made available immediately; there is no timing.
+    '''
+    def __init__(self, capture):
+        self._replies = {}
+        self._index = {}
+        cmd = None
+        with open(capture) as log:
+            for line in log:
+                if line.startswith('> '):
+                    cmd = line[2:].strip()
+                    self._replies.setdefault(cmd, []).append(b'')
+                    self._index[cmd] = 0
+                elif cmd is not None:
+                    self._replies[cmd][-1] += line.encode('ascii')
+        self._pending = bytearray()
+        self.timeout = 0
+        self.write_timeout = 0
+
+    def write(self, data):
+        cmd = bytes(data).decode().strip()
+        if cmd in self._replies:
+            i = self._index[cmd]
+            self._pending += self._replies[cmd][i]
+            self._index[cmd] = (i + 1) % len(self._replies[cmd])
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        return len(self._pending)
+
+    def readline(self):
+        n = self._pending.find(b'\n') + 1
+        if n == 0:
+            n = len(self._pending)
+        line = bytes(self._pending[:n])
+        del self._pending[:n]
+        return line
+
+    def readinto(self, buf):
+        n = min(len(buf), len(self._pending))
+        buf[:n] = self._pending[:n]
+        del self._pending[:n]
+        return n
+
+def run(capture, stream, verbose, cycles):
+    rrf = captureSerial(capture)
+    OM = serialOM(rrf, {'FFF':['heat','tools','job','network']},
+                  quiet=True, noCheck=True, stream=stream)
+    times = []
+    peaks = []
+    omRequest = OM._omRequest
+    def tracedRequest(OMkey, OMflags):
+        # record the peak allocation for each individual request
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        result = omRequest(OMkey, OMflags)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        tracemalloc.stop()
+        return result
+    for trace in (False, True):
+        OM._omRequest = tracedRequest if trace else omRequest
+        for _ in range(cycles):
+            if verbose:
+                # force verbose requests for every key
+                for key in OM._seqs.keys():
+                    OM._seqs[key] = -1
+            start = perf_counter()
+            OM.update()
+            if not trace:
+                times.append(perf_counter() - start)
+    return sum(times) / len(times) * 1000, sum(peaks) // len(peaks), max(peaks)
+
+if __name__ == '__main__':
+    capture = argv[1] if len(argv) > 1 else join(dirname(__file__), 'captures', 'fff-printing.log')
+    cycles = int(argv[2]) if len(argv) > 2 else 50
+    print('capture: {}, {} cycles'.format(capture, cycles))
+    print('{:10} {:8} {:>10} {:>15} {:>14}'.format('updates', 'mode', 'ms/update',
+                                                    'mean peak b/req', 'max peak b/req'))
+    for verbose in (True, False):
+        for stream in (False, True):
+            ms, mean, peak = run(capture, stream, verbose, cycles)
+            print('{:10} {:8} {:10.3f} {:15d} {:14d}'.format('verbose' if verbose else 'frequent',
+                  'stream' if stream else 'line', ms, mean, peak))
@@ -0,0 +1,115 @@
+'''
+    CPython microbenchmark: frequent update merging.
+
+    Takes the verbose and frequent ('f' flag) M409 payloads recorded in a
+    serialOM rawLog capture and applies every frequent payload, in the
+    order recorded, to a model built from the verbose ones. Compares the
+    original copying merge with the in-place serialOM.merge(); reporting
+    time per merge, the peak (transient) allocation per merge and the
+    number of leaves changed.
+
+    usage: python3 benchMerge.py [capture.log] [repeats]
+'''
+
+from sys import argv, path
+from os.path import dirname, join
+from json import loads
+from copy import deepcopy
+from time import perf_counter
+import tracemalloc
+
+path.insert(0, join(dirname(__file__), '..', 'microPython'))
+from serialOM import mergeKey
+
+# The original serialOM merge and its zip_longest shim, for comparison
+def zip_longest(*args, fillvalue=None):
+    def repeat(object, times=None):
+        if times is None:
+            while True:
+                yield object
+        else:
+            for i in range(times):
+                yield object
+    iterators = [iter(it) for it in args]
+    num_active = len(iterators)
+    if not num_active:
+        return
+    while True:
+        values = []
+        for i, it in enumerate(iterators):
+            try:
+                value = next(it)
+            except StopIteration:
+                num_active -= 1
+                if not num_active:
+                    return
+                iterators[i] = repeat(fillvalue)
+                value = fillvalue
+            values.append(value)
+        yield tuple(values)
+
+def copyMerge(a, b):
+    if isinstance(a, dict) and isinstance(b, dict):
+        d = dict(a)
+        d.update({k: copyMerge(a.get(k, None), b[k]) for k in b})
+        return d
+    if isinstance(a, list) and isinstance(b, list):
+        return [copyMerge(x, y) for x, y in zip_longest(a, b)]
+    return a if b is None else b
+
+def loadCapture(capture):
+    # Returns the initial (verbose) model and the list of frequent payloads
+    model = {}
+    frequent = []
+    with open(capture) as log:
+        for line in log:
+            if not line.startswith('{'):
+                continue
+            payload = loads(line)
+            if 'key' not in payload or payload['result'] is None:
+                continue
+            if 'f' in payload['flags']:
+                frequent.append(payload)
+            elif payload['key'] not in model:
+                model[payload['key']] = payload['result']
+    return model, frequent
+
+def copyUpdate(model, payload):
+    model[payload['key']] = copyMerge(model[payload['key']], payload['result'])
+    return 0
+
+def inPlaceUpdate(model, payload):
+    return mergeKey(model, payload['key'], payload['result'])
+
+def run(update, model, frequent, repeats):
+    # time, then trace allocations, for each merge
+    model = deepcopy(model)
+    start = perf_counter()
+    for _ in range(repeats):
+        for payload in frequent:
+            update(model, payload)
+    elapsed = perf_counter() - start
+    merges = repeats * len(frequent)
+    model = deepcopy(model)
+    touched = 0
+    peak = 0
+    tracemalloc.start()
+    for payload in frequent:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        touched += update(model, payload)
+        peak += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    n = len(frequent)
+    return elapsed / merges * 1000000, peak / n, touched / n
+
+if __name__ == '__main__':
+    capture = argv[1] if len(argv) > 1 else join(dirname(__file__), 'captures', 'fff-printing.log')
+    repeats = int(argv[2]) if len(argv) > 2 else 200
+    model, frequent = loadCapture(capture)
+    print('capture: {}, {} frequent payloads x {}'.format(capture, len(frequent), repeats))
+    print('{:10} {:>10} {:>18} {:>14}'.format('merge', 'us/merge', 'peak bytes/merge', 'leaves/merge'))
+    for name, update in (('copy', copyUpdate), ('in-place', inPlaceUpdate)):
+        us, peak, touched = run(update, model, frequent, repeats)
+        print('{:10} {:10.2f} {:18.1f} {:>14}'.format(name, us, peak,
+              '{:.1f}'.format(touched) if update is inPlaceUpdate else '-'))
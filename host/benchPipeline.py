@@ -0,0 +1,68 @@
+'''
+    CPython benchmark: serialOM update cycles against a simulated controller.
+
+    Runs serialOM update cycles against fakeRRF.fakeRRF, replaying the
+    object model from a rawLog capture with simulated baud rate and controller
+    latency (plus optional jitter, dropped and out of sequence responses),
+    for each pipeline depth with per key, adaptive per key and
+    snapshot requests in both line and stream mode. Reports the mean and
+    worst update time, and the requests and bytes per update.
+
+    usage: python3 benchPipeline.py [capture.log] [cycles] [baud] [latency ms]
+                                    [jitter ms] [drop %] [reorder %]
+'''
+
+from sys import argv, path
+from os.path import dirname, join
+from time import perf_counter
+
+path.insert(0, join(dirname(__file__), '..', 'microPython'))
+from serialOM import serialOM
+from fakeRRF import fakeRRF
+
+omKeys = {'FFF':['heat','tools','job','network']}
+
+# requests: serialOM arguments
+requests = {'per key':{},
+            'adaptive':{'adaptive':True},
+            'snapshot':{'snapshot':['FFF']}}
+
+def run(capture, cycles, faults, stream, depth, options):
+    rrf = fakeRRF(capture, **faults)
+    OM = serialOM(rrf, omKeys, quiet=True, noCheck=True, stream=stream, pipeline=depth,
+                  **options)
+    requests = rrf.requests
+    sent = rrf.sent
+    times = []
+    failed = 0
+    for _ in range(cycles):
+        start = perf_counter()
+        if not OM.update():
+            failed += 1
+        times.append(perf_counter() - start)
+    return (sum(times) / cycles * 1000, max(times) * 1000, (rrf.requests - requests) / cycles,
+            (rrf.sent - sent) // cycles, failed)
+
+if __name__ == '__main__':
+    capture = argv[1] if len(argv) > 1 else join(dirname(__file__), 'captures', 'fff-printing.log')
+    cycles = int(argv[2]) if len(argv) > 2 else 20
+    baud = int(argv[3]) if len(argv) > 3 else 230400
+    latency = float(argv[4]) / 1000 if len(argv) > 4 else 0.005
+    jitter = float(argv[5]) / 1000 if len(argv) > 5 else 0
+    drop = float(argv[6]) / 100 if len(argv) > 6 else 0
+    reorder = float(argv[7]) / 100 if len(argv) > 7 else 0
+    faults = {'baud':baud, 'latency':latency, 'jitter':jitter, 'drop':drop, 'reorder':reorder}
+    print('capture: {}, {} cycles, {} baud, {:.1f} ms latency'.format(capture, cycles, baud,
+                                                                      latency * 1000))
+    print('faults: {:.1f} ms jitter, {:.1f}% dropped, {:.1f}% out of sequence'.format(
+          jitter * 1000, drop * 100, reorder * 100))
+    print('{:8} {:8} {:>5} {:>10} {:>10} {:>8} {:>8} {:>7}'.format('mode', 'requests',
+          'depth', 'ms/update', 'max ms', 'req/upd', 'b/upd', 'failed'))
+    for stream in (False, True):
+        for name in requests:
+            for depth in (1, 2, 4, 8):
+                ms, worst, count, sent, failed = run(capture, cycles, faults, stream, depth,
+                                                     requests[name])
+                print('{:8} {:8} {:5d} {:10.1f} {:10.1f} {:8.1f} {:8d} {:7d}'.format(
+                      'stream' if stream else 'line', name, depth, ms, worst, count,
+                      sent, failed))
@@ -0,0 +1,57 @@
+'''
+    CPython benchmark: serialOM update cycles replayed from a capture.
+
+    Replays a recorded session (see recordRRF.py) to serialOM with
+    replayRRF, in line and stream mode, and reports the update time
+    (mean, median and worst), the peak traced allocation per update and
+    the requests per update. Replaying the same capture gives the same
+    responses in the same order, so field captures can be used as
+    regression benchmarks.
+
+    usage: python3 benchReplay.py [capture.log] [cycles] [speed]
+'''
+
+from sys import argv, path
+from os.path import dirname, join
+from time import perf_counter
+import tracemalloc
+
+path.insert(0, join(dirname(__file__), '..', 'microPython'))
+from serialOM import serialOM
+from replayRRF import replayRRF
+
+omKeys = {'FFF':['heat','tools','job','network']}
+
+def run(capture, cycles, speed, stream):
+    rrf = replayRRF(capture, speed=speed)
+    OM = serialOM(rrf, omKeys, quiet=True, noCheck=True, stream=stream)
+    requests = rrf.requests
+    times = []
+    peaks = []
+    for trace in (False, True):
+        for _ in range(cycles):
+            if trace:
+                tracemalloc.start()
+                base = tracemalloc.get_traced_memory()[0]
+                OM.update()
+                peaks.append(tracemalloc.get_traced_memory()[1] - base)
+                tracemalloc.stop()
+            else:
+                start = perf_counter()
+                OM.update()
+                times.append(perf_counter() - start)
+    times.sort()
+    return (sum(times) / cycles * 1000, times[cycles // 2] * 1000, times[-1] * 1000,
+            max(peaks), (rrf.requests - requests) / (cycles * 2), rrf.unmatched)
+
+if __name__ == '__main__':
+    capture = argv[1] if len(argv) > 1 else join(dirname(__file__), 'captures', 'fff-printing-timed.log')
+    cycles = int(argv[2]) if len(argv) > 2 else 20
+    speed = float(argv[3]) if len(argv) > 3 else 1
+    print('capture: {}, {} cycles, speed {}'.format(capture, cycles, speed))
+    print('{:8} {:>10} {:>10} {:>10} {:>10} {:>8} {:>9}'.format('mode', 'ms/update',
+          'median ms', 'max ms', 'peak b', 'req/upd', 'unmatched'))
+    for stream in (False, True):
+        mean, median, worst, peak, count, unmatched = run(capture, cycles, speed, stream)
+        print('{:8} {:10.1f} {:10.1f} {:10.1f} {:10d} {:8.1f} {:9d}'.format(
+              'stream' if stream else 'line', mean, median, worst, peak, count, unmatched))
@@ -0,0 +1,88 @@
+'''
+    CPython benchmark: G-code streaming through serialOM with gcodeStream.
+
+    Streams a generated G-code file (short G1 moves) to fakeRRF.fakeRRF,
+    which takes 'gcode ms' to process each line and has an input buffer of
+    'rx buffer' bytes, while running serialOM update cycles between each
+    pump() as the main loop would. Each window size is compared with
+    sending every line at once with sendGcode().
+
+    Reports the lines processed by the controller and lines per second, the
+    update cycles made during the transfer, the longest pump() (it should
+    stay close to the budget) and the longest time between two updates (how
+    stale the display could get; a pump() plus an update), the lines lost
+    to input buffer overruns and the unanswered markers.
+
+    usage: python3 benchStream.py [capture.log] [lines] [gcode ms] [rx buffer] [budget ms]
+'''
+
+from sys import argv, path
+from os.path import dirname, join
+from time import perf_counter
+
+path.insert(0, join(dirname(__file__), '..', 'microPython'))
+from serialOM import serialOM
+from gcodeStream import gcodeStream
+from fakeRRF import fakeRRF
+
+omKeys = {'FFF':['heat','tools','job','network']}
+
+def gcode(lines):
+    # A print-like G-code file; short extruding moves around a square
+    code = ['; generated by benchStream', 'G90', 'M83']
+    for n in range(lines - len(code) + 1):
+        x = 100 + 50 * ((n // 50) % 2) + n % 50
+        code.append('G1 X{:.3f} Y{:.3f} E0.04210 F3000'.format(x, 100 + (n % 7) * 0.412))
+    return code
+
+def run(capture, code, faults, window, budget, lineNumbers=False):
+    rrf = fakeRRF(capture, **faults)
+    OM = serialOM(rrf, omKeys, quiet=True, noCheck=True)
+    updates = 0
+    gap = 0
+    longest = 0
+    start = last = perf_counter()
+    if window == 0:
+        # no flow control
+        for line in code:
+            OM.sendGcode(line)
+        lost = 0
+    else:
+        gs = gcodeStream(OM, window=window, sync=max(1, window // 2),
+                         buffer=faults['rxBuffer'], lineNumbers=lineNumbers)
+        gs.load(code)
+        while not gs.done:
+            pumped = perf_counter()
+            gs.pump(budget)
+            longest = max(longest, perf_counter() - pumped)
+            OM.update()
+            updates += 1
+            now = perf_counter()
+            gap = max(gap, now - last)
+            last = now
+        lost = gs.lost
+    # wait for the controller to process every line
+    OM.getResponse('M409 F"f" K"state.upTime"', json=True, timeout=5000000)
+    elapsed = perf_counter() - start
+    return (rrf.gcodes, rrf.gcodes / elapsed, updates, longest * 1000, gap * 1000,
+            rrf.overruns, lost)
+
+if __name__ == '__main__':
+    capture = argv[1] if len(argv) > 1 else join(dirname(__file__), 'captures', 'fff-printing.log')
+    lines = int(argv[2]) if len(argv) > 2 else 500
+    gcodeTime = float(argv[3]) / 1000 if len(argv) > 3 else 0.002
+    rxBuffer = int(argv[4]) if len(argv) > 4 else 256
+    budget = int(argv[5]) if len(argv) > 5 else 250
+    code = gcode(lines)
+    faults = {'gcode':gcodeTime, 'rxBuffer':rxBuffer}
+    print('capture: {}, {} lines, {:.1f} ms per line, {} byte input buffer, {} ms budget'.format(
+          capture, len(code), gcodeTime * 1000, rxBuffer, budget))
+    print('{:12} {:>9} {:>8} {:>8} {:>9} {:>9} {:>9} {:>6}'.format('window', 'processed',
+          'lines/s', 'updates', 'max pump', 'max gap', 'overruns', 'lost'))
+    for window in (0, 1, 2, 4, 8, 16):
+        for lineNumbers in ((False, True) if window == 8 else (False,)):
+            done, rate, updates, pump, gap, overruns, lost = run(capture, code, faults, window,
+                                                                 budget, lineNumbers)
+            name = (str(window) if window else 'none') + (' numbered' if lineNumbers else '')
+            print('{:12} {:9d} {:8.1f} {:8d} {:7.0f}ms {:7.0f}ms {:9d} {:6d}'.format(name, done,
+                  rate, updates, pump, gap, overruns, lost))
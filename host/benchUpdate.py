@@ -0,0 +1,142 @@
+'''
+    CPython benchmark suite: serialOM update() per scenario.
+
+    Runs serialOM update cycles, in line and stream mode, against a fakeRRF
+    simulating the controller in each scenario capture; timed, and then
+    again with allocation tracing. Reports, per update:
+        cycle time percentiles (50, 90, 99 and worst)
+        bytes sent to, and recieved from, the controller
+        number of M409 requests
+        peak traced memory; the transient high water mark during the update
+        objects allocated; approximated by the change in the number of traced
+        memory blocks over the traced updates, per update
+    CPython has no count of every object allocated, the block count only
+    shows the objects allocated during the updates that are still allocated
+    at the end (mostly the new values merged into the model), so the
+    transient allocation is measured by the peak memory; count allocations
+    on the device with gc.mem_alloc().
+
+    Scenarios:
+        idle:           FFF machine, heaters off and no job; nothing changes
+        printing:       FFF machine printing a job, one tool
+        toolchanger:    FFF machine printing with four tools, changing tool
+                        every five updates
+        mode-change:    FFF machine printing, switched to CNC half way through
+
+    The results can be written to a JSON file, and compared with an earlier
+    results file, to check a change between commits.
+
+    usage: python3 benchUpdate.py [cycles] [results.json] [compare.json]
+'''
+
+from sys import argv, path, version
+from os.path import dirname, join
+from time import perf_counter
+from json import dump, load
+from subprocess import run as shell
+import tracemalloc
+
+path.insert(0, join(dirname(__file__), '..', 'microPython'))
+from serialOM import serialOM
+from fakeRRF import fakeRRF
+
+omKeys = {'FFF':['heat','tools','job','network'],
+          'CNC':['spindles','tools','move','job','network']}
+
+# scenarios: capture
+scenarios = {'idle':'fff-idle.log',
+             'printing':'fff-printing.log',
+             'toolchanger':'fff-toolchanger.log',
+             'mode-change':'mode-change.log'}
+
+def percentile(values, p):
+    # nearest rank percentile of a sorted list
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def blockCount():
+    # the number of traced memory blocks, not counting tracemalloc's own
+    snapshot = tracemalloc.take_snapshot()
+    return len(snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)]).traces)
+
+def run(capture, cycles, stream):
+    rrf = fakeRRF(join(dirname(__file__), 'captures', capture))
+    write = rrf.write
+    written = [0]
+    def counted(data):
+        written[0] += len(data)
+        return write(data)
+    rrf.write = counted
+    OM = serialOM(rrf, omKeys, quiet=True, noCheck=True, stream=stream)
+    written[0] = 0
+    requests = rrf.requests
+    recieved = rrf.sent
+    times = []
+    peaks = []
+    failed = 0
+    for _ in range(cycles):
+        start = perf_counter()
+        if not OM.update():
+            failed += 1
+        times.append(perf_counter() - start)
+    # a second run of cycles, traced, for the allocations
+    tracemalloc.start()
+    blocks = blockCount()
+    for _ in range(cycles):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        if not OM.update():
+            failed += 1
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    blocks = blockCount() - blocks
+    tracemalloc.stop()
+    times = sorted(t * 1000 for t in times)
+    return {'p50 ms':round(percentile(times, 50), 2),
+            'p90 ms':round(percentile(times, 90), 2),
+            'p99 ms':round(percentile(times, 99), 2),
+            'max ms':round(times[-1], 2),
+            'sent b':written[0] // (cycles * 2),
+            'recieved b':(rrf.sent - recieved) // (cycles * 2),
+            'requests':round((rrf.requests - requests) / (cycles * 2), 2),
+            'peak b':max(peaks),
+            'objects':round(blocks / cycles, 1),
+            'failed':failed}
+
+def commit():
+    # the current git commit, if there is one
+    try:
+        return shell(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                     text=True, cwd=dirname(__file__)).stdout.strip()
+    except Exception:
+        return None
+
+columns = ('p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'sent b', 'recieved b', 'requests',
+           'peak b', 'objects', 'failed')
+
+if __name__ == '__main__':
+    cycles = int(argv[1]) if len(argv) > 1 else 40
+    output = argv[2] if len(argv) > 2 else None
+    compare = None
+    if len(argv) > 3:
+        with open(argv[3]) as f:
+            compare = load(f)['results']
+    results = {}
+    print('{} cycles per scenario'.format(cycles))
+    print('{:12} {:6}'.format('scenario', 'mode') +
+          ''.join(' {:>10}'.format(c) for c in columns))
+    for name in scenarios:
+        for stream in (False, True):
+            key = name + (' stream' if stream else ' line')
+            result = run(scenarios[name], cycles, stream)
+            results[key] = result
+            print('{:12} {:6}'.format(name, 'stream' if stream else 'line') +
+                  ''.join(' {:>10}'.format(result[c]) for c in columns))
+            if compare and key in compare:
+                # change from the earlier results
+                print('{:19}'.format('') + ''.join(' {:>10}'.format('{:+.0%}'.format(
+                      (result[c] - compare[key][c]) / compare[key][c]) if compare[key].get(c)
+                      else '-') for c in columns))
+    if output:
+        with open(output, 'w') as f:
+            dump({'commit':commit(), 'python':version.split()[0], 'cycles':cycles,
+                  'results':results}, f, indent=2)
+        print('results written to {}'.format(output))
@@ -0,0 +1,296 @@
+'''
+    A simulated RRF controller for benchmarking serialOM on CPython.
+
+    fakeRRF is a stand-in for the controller serial port with the PySerial
+    methods used by serialOM, and the read timeouts of a microPython UART;
+    reads wait up to 'timeout' for the first byte and then return when no
+    further byte arrives within 'timeout' of the last one.
+
+    It answers M115 with a firmware banner and M409 requests (verbose,
+    frequent, 'seqs' and the whole model) from an object model loaded from
+    a serialOM rawLog capture: the first verbose response for each key is
+    the initial model, and the frequent responses recorded for each key are
+    replayed in order, one step for each 'seqs' or whole model (K"")
+    request, and merged into it. The depth flag (d2) is honoured as RRF
+    does; the result is level 0 and objects and lists at the depth limit are
+    sent empty, 'd1' gives the values of the result itself and empty lists
+    and objects. Other commands get no response, they take
+    'gcode' seconds each to be taken from the input and processed.
+    Line numbers and checksums (N12 G1 X10*97) are checked and removed.
+
+    Timing is simulated in real time; commands are processed in the order
+    they are recieved, one at a time, each response starts 'latency' (plus
+    up to 'jitter') seconds after the controller gets the command, and any
+    other commands sent before it are processed, and is then sent at the
+    baud rate. If 'rxBuffer' is set, commands that arrive when the input
+    buffer has no room for them (an overrun) are lost.
+
+    Faults are injected at random, with a fixed seed so that runs repeat:
+        drop:       the response is never sent
+        reorder:    the response is held back and sent after the response
+                    to the next command, or after 10 * 'latency' if no
+                    further command arrives
+
+    init arguments:
+        capture:    rawLog capture file, required
+        baud:       int; serial baud rate, default 230400
+        latency:    float; controller processing time per request, seconds,
+                    default 0.005
+        jitter:     float; maximum random extra latency, seconds, default 0
+        drop:       float; probability of a response being dropped, default 0
+        reorder:    float; probability of a response being sent out of
+                    sequence, default 0
+        seed:       random seed, default 0
+        gcode:      float; time taken to process each command that is not
+                    M115 or M409, seconds, default 0
+        rxBuffer:   int; size of the controller input buffer, bytes, default
+                    0 (unlimited)
+
+    properties:
+        timeout:    read timeout, seconds, default 0.025; the serialOM UART setting
+        requests:   count of the M115 and M409 requests answered
+        sent:       count of the bytes sent to the host
+        dropped:    count of the responses dropped
+        reordered:  count of the responses sent out of sequence
+        gcodes:     count of the other commands processed
+        overruns:   count of the commands lost to input buffer overruns
+        errors:     count of the commands with bad checksums, ignored
+'''
+
+from time import perf_counter, sleep
+from json import loads, dumps
+from random import Random
+from sys import path
+from os.path import dirname, join
+
+path.insert(0, join(dirname(__file__), '..', 'microPython'))
+from serialOM import mergeKey
+from gcodeStream import checksum
+
+FIRMWARE = ('FIRMWARE_NAME: RepRapFirmware for Duet 2 WiFi/Ethernet FIRMWARE_VERSION: 3.5.4 '
+            'ELECTRONICS: Duet WiFi 1.02 or later FIRMWARE_DATE: 2024-11-24 10:43:42\n')
+
+def limit(value, depth):
+    # A copy of value with the objects and lists 'depth' levels down sent empty
+    if isinstance(value, dict):
+        return {k:limit(v, depth - 1) for k, v in value.items()} if depth > 0 else {}
+    if isinstance(value, list):
+        return [limit(v, depth - 1) for v in value] if depth > 0 else []
+    return value
+
+class fakeRRF:
+    def __init__(self, capture, baud=230400, latency=0.005, jitter=0, drop=0, reorder=0,
+                 seed=0, gcode=0, rxBuffer=0):
+        self._byteTime = 10 / baud  # 8N1
+        self._latency = latency
+        self._jitter = jitter
+        self._drop = drop
+        self._reorder = reorder
+        self._random = Random(seed)
+        self._gcode = gcode
+        self._rxBuffer = rxBuffer
+        self._queued = []           # (start time, size) of the commands in the input buffer
+        self._free = 0              # when the controller has processed the other commands
+        self.model = {}
+        self._frequent = {}
+        self._step = {}
+        with open(capture) as log:
+            for line in log:
+                if not line.startswith('{'):
+                    continue
+                payload = loads(line)
+                if 'key' not in payload or payload['result'] is None:
+                    continue
+                if 'f' in payload['flags']:
+                    self._frequent.setdefault(payload['key'], []).append(payload['result'])
+                elif payload['key'] not in self.model:
+                    self.model[payload['key']] = payload['result']
+        for key in self._frequent:
+            self._step[key] = -1
+        self._rx = bytearray()      # bytes recieved by the host, not yet read
+        self._tx = []               # (start time, response) being sent
+        self._held = None           # (due time, response) held back
+        self._busy = perf_counter() # when the controller is next free
+        self.timeout = 0.025
+        self.requests = 0
+        self.sent = 0
+        self.dropped = 0
+        self.reordered = 0
+        self.gcodes = 0
+        self.overruns = 0
+        self.errors = 0
+
+    def _tick(self):
+        # advance the model to the next recorded frequent values
+        for key in self._frequent:
+            self._step[key] = (self._step[key] + 1) % len(self._frequent[key])
+            mergeKey(self.model, key, loads(dumps(self._frequent[key][self._step[key]])))
+
+    def _answer(self, cmd):
+        # Returns the response line to a command
+        if cmd.startswith('M115'):
+            self.requests += 1
+            return FIRMWARE
+        if not cmd.startswith('M409'):
+            return ''
+        flags = cmd.split('F"')[1].split('"')[0] if 'F"' in cmd else ''
+        OMkey = cmd.split('K"')[1].split('"')[0] if 'K"' in cmd else ''
+        keys = OMkey.split('.')
+        if keys[0] in ('seqs', ''):
+            self._tick()
+        if keys[0] == '':
+            # the whole model, a frequent snapshot includes seqs
+            result = self.model
+            if 'f' in flags:
+                result = {'seqs':self.model.get('seqs', None)}
+                for key in self._frequent:
+                    result[key] = self._frequent[key][self._step[key]]
+        elif 'f' in flags and keys[0] in self._frequent:
+            result = self._frequent[keys[0]][max(0, self._step[keys[0]])]
+        else:
+            result = self.model.get(keys[0], None)
+        for key in keys[1:]:
+            result = result.get(key, None) if isinstance(result, dict) else None
+        if 'd' in flags:
+            depth = ''
+            for c in flags[flags.index('d') + 1:]:
+                if not c.isdigit():
+                    break
+                depth += c
+            if depth:
+                result = limit(result, int(depth))
+        self.requests += 1
+        return dumps({'key':OMkey, 'flags':flags, 'result':result},
+                     separators=(',', ':')) + '\n'
+
+    def _send(self, ready, response):
+        # queue a response, it is sent once it is ready and the line is free
+        start = max(ready, self._busy)
+        self._busy = start + len(response) * self._byteTime
+        self._tx.append((start, response))
+        self.sent += len(response)
+
+    def _release(self, now):
+        # send a held back response once it is due
+        if self._held is not None and now >= self._held[0]:
+            self._send(*self._held)
+            self._held = None
+
+    def _pump(self):
+        # move the bytes that have arrived by now into the recieve buffer
+        now = perf_counter()
+        self._release(now)
+        while self._tx:
+            start, data = self._tx[0]
+            n = min(len(data), int((now - start) / self._byteTime))
+            if n <= 0:
+                return
+            self._rx += data[:n]
+            if n < len(data):
+                self._tx[0] = (start + n * self._byteTime, data[n:])
+                return
+            self._tx.pop(0)
+
+    def _wait(self):
+        # wait for the next byte, False if none arrive before the timeout
+        waiting = len(self._rx)
+        self._pump()
+        now = perf_counter()
+        if len(self._rx) > waiting:
+            self._deadline = now + self.timeout
+            return True
+        if now >= self._deadline:
+            return False
+        if not self._tx and self._held is None:
+            # nothing is coming, a real port blocks until the timeout
+            sleep(self._deadline - now)
+            return False
+        sleep(min(self._byteTime * 8, self._deadline - now))
+        return True
+
+    def _unnumber(self, cmd):
+        # Check and remove a line number and checksum, None if the checksum is bad
+        if not cmd.startswith('N') or ' ' not in cmd:
+            return cmd
+        if '*' in cmd:
+            cmd, cs = cmd.rsplit('*', 1)
+            if not cs.strip().isdigit() or checksum(cmd) != int(cs):
+                self.errors += 1
+                return None
+        return cmd.split(' ', 1)[1].strip()
+
+    def _take(self, arrived, size):
+        # Put a command in the input buffer, returns when it will be processed,
+        # or None if there is no room for it
+        while self._queued and self._queued[0][0] <= arrived:
+            self._queued.pop(0)
+        if self._rxBuffer and sum(q[1] for q in self._queued) + size > self._rxBuffer:
+            self.overruns += 1
+            return None
+        start = max(arrived, self._free)
+        self._queued.append((start, size))
+        return start
+
+    def write(self, data):
+        now = perf_counter()
+        self._release(now)
+        arrived = now
+        for cmd in bytes(data).decode().splitlines():
+            arrived += (len(cmd) + 2) * self._byteTime
+            if not cmd.strip():
+                continue
+            start = self._take(arrived, len(cmd) + 2)
+            cmd = self._unnumber(cmd.strip())
+            if start is None or cmd is None:
+                continue
+            response = self._answer(cmd).encode('ascii')
+            if not response:
+                self._free = start + self._gcode
+                self.gcodes += 1
+                continue
+            ready = start + self._latency + self._random.uniform(0, self._jitter)
+            if self._random.random() < self._drop:
+                self.dropped += 1
+                continue
+            held = self._held
+            if held is None and self._random.random() < self._reorder:
+                self._held = (ready + self._latency * 10, response)
+                self.reordered += 1
+                continue
+            self._send(ready, response)
+            if held is not None:
+                # the held back response follows this one
+                self._send(ready, held[1])
+                self._held = None
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        self._pump()
+        return len(self._rx)
+
+    def readline(self):
+        self._deadline = perf_counter() + self.timeout
+        while b'\n' not in self._rx and self._wait():
+            pass
+        self._pump()
+        n = self._rx.find(b'\n') + 1
+        if n == 0:
+            n = len(self._rx)
+        line = bytes(self._rx[:n])
+        del self._rx[:n]
+        return line
+
+    def readinto(self, buf):
+        self._deadline = perf_counter() + self.timeout
+        while len(self._rx) < len(buf) and self._wait():
+            pass
+        self._pump()
+        n = min(len(buf), len(self._rx))
+        buf[:n] = self._rx[:n]
+        del self._rx[:n]
+        return n
+
+    def read(self, size=1):
+        buf = bytearray(size)
+        return bytes(buf[:self.readinto(buf)])
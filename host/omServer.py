@@ -0,0 +1,289 @@
+'''
+    omServer: share one controller's object model with many local readers.
+
+    Only one process can own the controller serial port, and every extra
+    M409 poll costs controller time. omServer owns the port, runs the
+    serialOM update cycles and serves the merged model over HTTP on
+    localhost; any number of clients can read it at no extra serial cost.
+
+    Each update that changes the model is a new 'generation'; the model is
+    encoded once per generation and the paths changed by the last 'history'
+    generations are kept for the change feed.
+
+    requests:
+        GET /model              {"generation":n, "mode":machineMode, "updated":time,
+                                 "model":{..}}
+        GET /model/<path>       {"generation":n, "path":path, "value":..}, eg:
+                                /model/heat.heaters[1].current, 404 if not in the model
+        GET /changes?since=n&timeout=s
+                                Long poll; waits up to 'timeout' seconds (default 30)
+                                for a generation after 'since' (default the current
+                                one), then {"generation":n, "changed":{path:value, ..}}
+                                with every path changed since 'since'. If 'since' is
+                                older than the history "resync":true is returned, and
+                                the client should fetch /model.
+        GET /events             A Server-Sent Events stream, one 'data:' event per
+                                generation with the same content as /changes
+        GET /health             The update state and timing, serialOM.stats() and
+                                the number of requests served, and the last update error
+        A 'since' or 'timeout' that is not a number is answered with a 400.
+
+    usage: python3 omServer.py <port|capture.log> [http port] [baud] [interval ms]
+        Given a rawLog capture instead of a serial port (needs PySerial) the
+        model is served from a fakeRRF simulating the controller in it.
+
+    init arguments:
+        OM:         serialOM; started, it is only used by the update thread
+        interval:   float; minimum time between update cycles, seconds, default 1
+        history:    int; number of generations kept for the change feed, default 100
+
+    methods:
+        serve(port, host):  Start the update thread and serve requests until
+                            interrupted, default localhost:8409
+'''
+
+from sys import argv, path
+from os.path import dirname, join, isfile
+from time import time, perf_counter, sleep
+from json import loads, dumps
+from threading import Thread, Condition
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+
+path.insert(0, join(dirname(__file__), '..', 'microPython'))
+from serialOM import serialOM, serialOMError
+
+omKeys = {'FFF':['heat','tools','job','network'],
+          'CNC':['spindles','tools','move','job','network'],
+          'Laser':['move','job','network']}
+
+def lookup(model, path):
+    # The value at a model path, raises KeyError if it is not in the model
+    value = model
+    for part in path.replace(']', '').split('.'):
+        key, *indexes = part.split('[')
+        try:
+            value = value[key] if key else value
+            for index in indexes:
+                value = value[int(index)]
+        except (KeyError, IndexError, TypeError, ValueError):
+            raise KeyError(path) from None
+    return value
+
+class omServer:
+    def __init__(self, OM, interval=1, history=100):
+        self._OM = OM
+        self._interval = interval
+        self._history = deque(maxlen=history)   # (generation, changed paths)
+        self._ready = Condition()
+        self.generation = 0
+        self.model = None
+        self._body = b''
+        self.updated = None
+        self.updates = 0
+        self.failures = 0
+        self.error = None
+        self.requests = 0
+        self._total = 0
+        self._worst = 0
+        self._stats = self._OM.stats()
+        self._publish(None)     # generation 1 is the initial model
+
+    def _publish(self, changed):
+        # Publish a new generation; a copy of the model and it's encoding
+        body = dumps(self._OM.model, separators=(',', ':'))
+        model = loads(body)
+        updated = time()
+        with self._ready:
+            self.generation += 1
+            self.model = model
+            self.updated = updated
+            self._body = '{{"generation":{},"mode":{},"updated":{},"model":{}}}'.format(
+                         self.generation, dumps(self._OM.machineMode), updated,
+                         body).encode()
+            self._history.append((self.generation, changed))
+            self._ready.notify_all()
+
+    def _update(self):
+        # The update loop, runs in it's own thread
+        while True:
+            start = perf_counter()
+            try:
+                updated = self._OM.update()
+                error = None if updated else 'update failed'
+                if updated and self._OM.changed:
+                    self._publish(sorted(self._OM.changed))
+            except serialOMError as e:
+                updated = False
+                error = str(e)
+            except Exception as e:
+                # anything else is a bug, but keep polling and report it
+                updated = False
+                error = repr(e)
+            took = (perf_counter() - start) * 1000
+            # the stats are copied here, the request threads never see serialOM
+            stats = self._OM.stats()
+            with self._ready:
+                self.updates += 1
+                self._total += took
+                self._worst = max(self._worst, took)
+                self._stats = stats
+                if not updated:
+                    self.failures += 1
+                    self.error = error
+            sleep(max(0, self._interval - (perf_counter() - start)))
+
+    def changes(self, since):
+        # The paths (and their values) changed since a generation, or None if
+        # it is older than the history
+        with self._ready:
+            generation = self.generation
+            model = self.model
+            history = list(self._history)
+        if since == generation:
+            return generation, {}
+        first, changed = history[0]
+        if since > generation or since < first - 1 or changed is None and since < first:
+            # gone from the history, before the initial model, or from another server
+            return generation, None
+        paths = set()
+        for n, changed in history:
+            if n > since:
+                paths.update(changed)
+        values = {}
+        for p in sorted(paths):
+            try:
+                values[p] = lookup(model, p)
+            except KeyError:
+                values[p] = None
+        return generation, values
+
+    def wait(self, since, timeout):
+        # Wait for a generation after 'since', True if there is one
+        with self._ready:
+            return self._ready.wait_for(lambda: self.generation > since, timeout)
+
+    def health(self):
+        with self._ready:
+            return {'generation':self.generation, 'mode':self._OM.machineMode,
+                    'updated':self.updated, 'updates':self.updates,
+                    'failures':self.failures, 'error':self.error,
+                    'requests':self.requests,
+                    'mean ms':round(self._total / self.updates, 1) if self.updates else 0,
+                    'max ms':round(self._worst, 1), 'keys':self._stats}
+
+    def serve(self, port=8409, host='localhost'):
+        Thread(target=self._update, daemon=True).start()
+        server = ThreadingHTTPServer((host, port), _handler)
+        server.daemon_threads = True
+        server.om = self
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        server.server_close()
+
+class _handler(BaseHTTPRequestHandler):
+    # Serves the requests for server.om
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status, data):
+        self._send(status, dumps(data, separators=(',', ':')).encode())
+
+    def do_GET(self):
+        om = self.server.om
+        om.requests += 1
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        try:
+            since = int(query['since'][0]) if 'since' in query else om.generation
+            timeout = float(query['timeout'][0]) if 'timeout' in query else 30
+        except ValueError:
+            self._json(400, {'error':'bad query', 'query':url.query})
+            return
+        try:
+            if url.path == '/model':
+                self._send(200, om._body)
+            elif url.path.startswith('/model/'):
+                modelPath = unquote(url.path[7:])
+                with om._ready:
+                    generation = om.generation
+                    model = om.model
+                try:
+                    value = lookup(model, modelPath)
+                except KeyError:
+                    self._json(404, {'error':'not in the model', 'path':modelPath})
+                    return
+                self._json(200, {'generation':generation, 'path':modelPath, 'value':value})
+            elif url.path == '/changes':
+                om.wait(since, timeout)
+                self._changes(since)
+            elif url.path == '/events':
+                self._events(since, timeout)
+            elif url.path == '/health':
+                self._json(200, om.health())
+            else:
+                self._json(404, {'error':'unknown request', 'path':url.path})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _changes(self, since):
+        # The /changes response
+        generation, changed = self.server.om.changes(since)
+        if changed is None:
+            self._json(200, {'generation':generation, 'resync':True})
+        else:
+            self._json(200, {'generation':generation, 'changed':changed})
+
+    def _events(self, since, timeout):
+        # Stream the changes as Server-Sent Events until the client goes away
+        om = self.server.om
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        while True:
+            if om.wait(since, timeout):
+                generation, changed = om.changes(since)
+                event = {'generation':generation}
+                if changed is None:
+                    event['resync'] = True
+                else:
+                    event['changed'] = changed
+                self.wfile.write('data: {}\n\n'.format(
+                                 dumps(event, separators=(',', ':'))).encode())
+                since = generation
+            else:
+                # keep the connection alive
+                self.wfile.write(b': \n\n')
+            self.wfile.flush()
+
+if __name__ == '__main__':
+    if len(argv) < 2:
+        print(__doc__)
+        exit(1)
+    port = int(argv[2]) if len(argv) > 2 else 8409
+    baud = int(argv[3]) if len(argv) > 3 else 230400
+    interval = float(argv[4]) / 1000 if len(argv) > 4 else 1
+    if isfile(argv[1]):
+        from fakeRRF import fakeRRF
+        rrf = fakeRRF(argv[1], baud=baud)
+    else:
+        from serial import Serial
+        rrf = Serial(argv[1], baud)
+    OM = serialOM(rrf, omKeys, quiet=True)
+    if OM.machineMode == '':
+        print('failed to connect to controller, or unknown controller mode')
+        exit(1)
+    print('serving the {} object model on http://localhost:{}/'.format(OM.machineMode, port))
+    omServer(OM, interval).serve(port)
@@ -0,0 +1,47 @@
+'''
+    Record a timestamped serialOM session for replayRRF.
+
+    Runs serialOM update cycles against a controller and writes everything
+    sent and recieved to a timedLog capture. The controller is either a
+    real serial port (needs PySerial) or, given a rawLog capture instead of
+    a port, a fakeRRF simulating the controller in that capture.
+
+    usage: python3 recordRRF.py <port|capture.log> <output.log> [cycles] [baud] [interval ms]
+'''
+
+from sys import argv, path
+from os.path import dirname, join, isfile
+from time import sleep
+
+path.insert(0, join(dirname(__file__), '..', 'microPython'))
+from serialOM import serialOM
+from timedLog import timedLog
+from fakeRRF import fakeRRF
+
+omKeys = {'FFF':['heat','tools','job','network'],
+          'CNC':['spindles','tools','move','job','network'],
+          'Laser':['move','job','network']}
+
+def record(rrf, output, cycles, interval):
+    with open(output, 'w') as log:
+        rawLog = timedLog(log)
+        OM = serialOM(rrf, omKeys, rawLog=rawLog, quiet=True)
+        for _ in range(cycles):
+            OM.update()
+            sleep(interval)
+        rawLog.flush()
+
+if __name__ == '__main__':
+    if len(argv) < 3:
+        print(__doc__)
+        exit(1)
+    cycles = int(argv[3]) if len(argv) > 3 else 20
+    baud = int(argv[4]) if len(argv) > 4 else 230400
+    interval = float(argv[5]) / 1000 if len(argv) > 5 else 0
+    if isfile(argv[1]):
+        rrf = fakeRRF(argv[1], baud=baud)
+    else:
+        from serial import Serial
+        rrf = Serial(argv[1], baud)
+    record(rrf, argv[2], cycles, interval)
+    print('recorded {} update cycles to {}'.format(cycles, argv[2]))
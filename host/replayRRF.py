@@ -0,0 +1,148 @@
+'''
+    A replay device for recorded serialOM sessions.
+
+    replayRRF is a stand-in for the controller serial port, with the same
+    PySerial methods and microPython UART read timeouts as fakeRRF, that
+    plays back a capture made with microPython/timedLog.py:
+    when a command is written the next recording of that command is found
+    in the capture, and the lines recorded after it are sent with their
+    original delays, divided by 'speed'. The capture is searched in order
+    from the last command matched, wrapping around at the end, so a replay
+    is deterministic and can run for longer than the recording.
+
+    Plain (untimed) rawLog captures can be replayed too; their responses
+    are sent immediately, as can be done with any capture using speed=0.
+    Commands that are not in the capture get no response.
+
+    init arguments:
+        capture:    timedLog or rawLog capture file, required
+        speed:      float; replay speed, 1 is the original timing, 0 sends
+                    responses immediately, default 1
+
+    properties:
+        timeout:    read timeout, seconds, default 0.025; the serialOM UART setting
+        requests:   count of the commands answered
+        unmatched:  count of the commands not found in the capture
+        loops:      count of the times the replay has wrapped round the capture
+        sent:       count of the bytes sent to the host
+'''
+
+from time import perf_counter, sleep
+
+def loadCapture(capture):
+    '''
+        Returns the commands recorded in a capture as a list of
+        (command, [(delay, response line), ..]) tuples, delays are in
+        seconds from the command being sent.
+    '''
+    commands = []
+    sent = 0
+    with open(capture) as log:
+        for line in log:
+            stamp = 0
+            if line.startswith('@') and ' ' in line:
+                stamp, line = line[1:].split(' ', 1)
+                stamp = int(stamp) / 1000000
+            if line.startswith('> '):
+                sent = stamp
+                commands.append((line[2:].strip(), []))
+            elif commands and line.strip():
+                commands[-1][1].append((max(0, stamp - sent), line.encode('ascii')))
+    return commands
+
+class replayRRF:
+    def __init__(self, capture, speed=1):
+        self._commands = loadCapture(capture)
+        self._speed = speed
+        self._next = 0              # where to start looking for the next command
+        self._rx = bytearray()      # bytes recieved by the host, not yet read
+        self._tx = []               # (due time, line) waiting to be sent
+        self.timeout = 0.025
+        self.requests = 0
+        self.unmatched = 0
+        self.loops = 0
+        self.sent = 0
+
+    def _find(self, cmd):
+        # the index of the next recording of cmd, or None
+        count = len(self._commands)
+        for n in range(count):
+            i = (self._next + n) % count
+            if self._commands[i][0] == cmd:
+                if i < self._next:
+                    self.loops += 1
+                self._next = i + 1
+                return i
+        return None
+
+    def _pump(self):
+        # move the lines that are due into the recieve buffer
+        now = perf_counter()
+        while self._tx and self._tx[0][0] <= now:
+            self._rx += self._tx.pop(0)[1]
+
+    def _wait(self):
+        # wait for the next line, False if none arrive before the timeout
+        waiting = len(self._rx)
+        self._pump()
+        now = perf_counter()
+        if len(self._rx) > waiting:
+            self._deadline = now + self.timeout
+            return True
+        if now >= self._deadline:
+            return False
+        if not self._tx:
+            # nothing is coming, a real port blocks until the timeout
+            sleep(self._deadline - now)
+            return False
+        sleep(max(0, min(self._tx[0][0], self._deadline) - now))
+        return True
+
+    def write(self, data):
+        now = perf_counter()
+        for cmd in bytes(data).decode().splitlines():
+            if not cmd.strip():
+                continue
+            i = self._find(cmd.strip())
+            if i is None:
+                self.unmatched += 1
+                continue
+            self.requests += 1
+            due = self._tx[-1][0] if self._tx else now
+            for delay, line in self._commands[i][1]:
+                # lines are sent in order, never before the previous one
+                due = max(due, now + delay / self._speed if self._speed else now)
+                self._tx.append((due, line))
+                self.sent += len(line)
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        self._pump()
+        return len(self._rx)
+
+    def readline(self):
+        self._deadline = perf_counter() + self.timeout
+        while b'\n' not in self._rx and self._wait():
+            pass
+        self._pump()
+        n = self._rx.find(b'\n') + 1
+        if n == 0:
+            n = len(self._rx)
+        line = bytes(self._rx[:n])
+        del self._rx[:n]
+        return line
+
+    def readinto(self, buf):
+        self._deadline = perf_counter() + self.timeout
+        while len(self._rx) < len(buf) and self._wait():
+            pass
+        self._pump()
+        n = min(len(buf), len(self._rx))
+        buf[:n] = self._rx[:n]
+        del self._rx[:n]
+        return n
+
+    def read(self, size=1):
+        buf = bytearray(size)
+        return bytes(buf[:self.readinto(buf)])
@@ -0,0 +1,237 @@
+'''
+    serialOMPool: monitor several RRF controllers from one CPython host.
+
+    Each printer gets it's own serial port, omKeys and serialOM, and it's own
+    thread running update cycles; a slow or dead controller only delays it's
+    own updates. After each update a copy of the model is published, so
+    snapshot() never waits for an update in progress.
+
+    A printer whose updates fail 'failLimit' times in a row, that raises an
+    unexpected exception (shown as it's 'error'), or that cannot be
+    connected, is marked 'dead'; it's serialOM is discarded and a new
+    connection is tried every 'retry' seconds.
+
+    usage:
+        pool = serialOMPool(interval=1)
+        pool.add('voron', '/dev/ttyACM0', {'FFF':['heat','tools','job']}, baud=230400)
+        pool.add('prusa', Serial('/dev/ttyUSB0', 115200), {'FFF':['heat','job']}, stream=True)
+        pool.start()
+        ...
+        models = pool.snapshot()
+        health = pool.health()
+        pool.stop()
+
+    init arguments:
+        interval:   float; minimum time between update cycles for each printer, seconds
+        failLimit:  int; consecutive failed updates before a printer is 'dead'
+        retry:      float; time between connection attempts for a dead printer, seconds
+
+    methods:
+        add(name, port, omKeys, baud, **options):
+                    Add a printer; 'port' is a PySerial (or compatible) object or a
+                    device name to open with PySerial at 'baud'. Any other options
+                    are passed to serialOM.
+        start():    Start the update threads
+        stop():     Stop the update threads and wait for them to finish
+        snapshot(): {name: {'mode':machineMode, 'model':model copy, 'age':seconds
+                    since the last successful update, or None}, ..}
+        health():   {name: {'state':'starting'|'ok'|'failing'|'dead', 'updates':n,
+                    'failures':n, 'failing':n (consecutive), 'connects':n,
+                    'error':last error or None, 'mean ms':n, 'max ms':n,
+                    'last ms':n, 'keys':serialOM.stats()}, ..}
+'''
+
+from sys import path
+from os.path import dirname, join
+from time import perf_counter
+from json import loads, dumps
+from threading import Thread, Lock, Event
+
+path.insert(0, join(dirname(__file__), '..', 'microPython'))
+from serialOM import serialOM, serialOMError
+
+class _printer:
+    # The state of one printer in the pool
+    def __init__(self, name, port, omKeys, baud, options):
+        self.name = name
+        self.port = port
+        self.omKeys = omKeys
+        self.baud = baud
+        self.options = options
+        self.OM = None
+        self.lock = Lock()
+        self.mode = ''
+        self.model = None
+        self.updated = None     # perf_counter() of the last successful update
+        self.state = 'starting'
+        self.updates = 0
+        self.failures = 0
+        self.failing = 0
+        self.connects = 0
+        self.error = None
+        self.total = 0
+        self.worst = 0
+        self.last = 0
+        self.keys = {}
+
+class serialOMPool:
+    def __init__(self, interval=1, failLimit=5, retry=10):
+        self._interval = interval
+        self._failLimit = failLimit
+        self._retry = retry
+        self._printers = {}
+        self._threads = []
+        self._stop = Event()
+
+    def add(self, name, port, omKeys, baud=230400, **options):
+        if name in self._printers:
+            raise ValueError('printer "{}" is already in the pool'.format(name))
+        options.setdefault('quiet', True)
+        self._printers[name] = _printer(name, port, omKeys, baud, options)
+
+    def start(self):
+        self._stop.clear()
+        for printer in self._printers.values():
+            thread = Thread(target=self._run, args=(printer,), name=printer.name, daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _connect(self, printer):
+        # Open the port if needed and start a serialOM, True if it connected
+        printer.connects += 1
+        try:
+            if isinstance(printer.port, str):
+                from serial import Serial
+                printer.port = Serial(printer.port, printer.baud)
+            OM = serialOM(printer.port, printer.omKeys, **printer.options)
+        except Exception as e:
+            printer.error = repr(e)
+            return False
+        if OM.machineMode == '':
+            printer.error = 'failed to connect to controller, or unknown controller mode'
+            return False
+        printer.OM = OM
+        self._publish(printer)
+        return True
+
+    def _publish(self, printer):
+        # Publish a copy of the model
+        model = loads(dumps(printer.OM.model))
+        with printer.lock:
+            printer.model = model
+            printer.mode = printer.OM.machineMode
+            printer.updated = perf_counter()
+            printer.keys = printer.OM.stats()
+
+    def _update(self, printer):
+        # One timed update cycle
+        start = perf_counter()
+        broken = False
+        try:
+            updated = printer.OM.update()
+            error = None if updated else 'update failed'
+            if updated:
+                self._publish(printer)
+        except serialOMError as e:
+            updated = False
+            error = str(e)
+        except Exception as e:
+            # anything else leaves the serialOM in an unknown state; reconnect
+            updated = False
+            broken = True
+            error = repr(e)
+        took = (perf_counter() - start) * 1000
+        with printer.lock:
+            printer.updates += 1
+            printer.last = took
+            printer.total += took
+            printer.worst = max(printer.worst, took)
+            if updated:
+                printer.failing = 0
+                printer.state = 'ok'
+            else:
+                printer.failures += 1
+                printer.failing += 1
+                printer.error = error
+                printer.state = 'failing'
+        if not updated and (broken or printer.failing >= self._failLimit):
+            with printer.lock:
+                printer.state = 'dead'
+            printer.OM = None
+
+    def _run(self, printer):
+        # The update loop for a printer
+        while not self._stop.is_set():
+            if printer.OM is None:
+                if not self._connect(printer):
+                    with printer.lock:
+                        printer.state = 'dead'
+                    self._stop.wait(self._retry)
+                    continue
+            start = perf_counter()
+            self._update(printer)
+            if printer.OM is None:
+                # it died, reconnect after the retry time
+                self._stop.wait(self._retry)
+            else:
+                self._stop.wait(max(0, self._interval - (perf_counter() - start)))
+
+    def snapshot(self):
+        # The last published model for every printer
+        now = perf_counter()
+        models = {}
+        for name, printer in self._printers.items():
+            with printer.lock:
+                models[name] = {'mode':printer.mode, 'model':printer.model,
+                                'age':None if printer.updated is None
+                                      else round(now - printer.updated, 3)}
+        return models
+
+    def health(self):
+        # The health and timing of every printer
+        health = {}
+        for name, printer in self._printers.items():
+            with printer.lock:
+                health[name] = {'state':printer.state, 'updates':printer.updates,
+                                'failures':printer.failures, 'failing':printer.failing,
+                                'connects':printer.connects, 'error':printer.error,
+                                'mean ms':round(printer.total / printer.updates, 1)
+                                          if printer.updates else 0,
+                                'max ms':round(printer.worst, 1),
+                                'last ms':round(printer.last, 1),
+                                'keys':printer.keys}
+        return health
+
+if __name__ == '__main__':
+    # A demonstration with simulated controllers; a normal, a slow, a lossy and
+    # a dead one, monitored for a few seconds.
+    from time import sleep
+    from fakeRRF import fakeRRF
+    capture = join(dirname(__file__), 'captures', 'fff-printing.log')
+    omKeys = {'FFF':['heat','tools','job','network']}
+    pool = serialOMPool(interval=0.5, failLimit=3, retry=2)
+    pool.add('normal', fakeRRF(capture), omKeys)
+    pool.add('slow', fakeRRF(capture, baud=57600, latency=0.02), omKeys, stream=True)
+    pool.add('lossy', fakeRRF(capture, jitter=0.01, drop=0.1, seed=1), omKeys)
+    pool.add('dead', fakeRRF(capture, drop=1), omKeys, noCheck=True)
+    pool.start()
+    for _ in range(5):
+        sleep(1)
+        health = pool.health()
+        models = pool.snapshot()
+        for name in health:
+            h = health[name]
+            m = models[name]
+            temps = ([heater['current'] for heater in m['model']['heat']['heaters']]
+                     if m['model'] else '-')
+            print('{:8} {:8} {:3d} updates {:3d} failed {:7.1f} mean ms {:7.1f} max ms'
+                  '  age {}  temps {}'.format(name, h['state'], h['updates'], h['failures'],
+                                             h['mean ms'], h['max ms'], m['age'], temps))
+        print()
+    pool.stop()
@@ -0,0 +1,80 @@
+'''
+    asyncSerialOM tests, run with pytest from the host directory:
+        python3 -m pytest tests
+'''
+
+from os.path import dirname, join
+from sys import path
+from json import load, dump
+import asyncio
+
+path.insert(0, join(dirname(__file__), '..'))
+path.insert(0, join(dirname(__file__), '..', '..', 'microPython'))
+from asyncSerialOM import asyncSerialOM
+from fakeRRF import fakeRRF
+
+CAPTURE = join(dirname(__file__), '..', 'captures', 'fff-printing.log')
+omKeys = {'FFF':['heat','tools','job','network']}
+
+class streamWriter:
+    # the asyncio StreamWriter methods used by asyncSerialOM
+    def __init__(self, rrf):
+        self._rrf = rrf
+
+    def write(self, data):
+        self._rrf.write(data)
+
+    async def drain(self):
+        pass
+
+async def started(rrf, **kwargs):
+    # Start an asyncSerialOM on asyncio streams fed from a fakeRRF, returns
+    # it, the result of start() and the task feeding the reader
+    reader = asyncio.StreamReader()
+    async def pump():
+        while True:
+            waiting = rrf.in_waiting
+            if waiting:
+                reader.feed_data(rrf.read(waiting))
+            await asyncio.sleep(0.0005)
+    task = asyncio.get_running_loop().create_task(pump())
+    OM = asyncSerialOM((reader, streamWriter(rrf)), omKeys, quiet=True, **kwargs)
+    return OM, await OM.start(), task
+
+def test_update():
+    async def run():
+        OM, ok, task = await started(fakeRRF(CAPTURE))
+        assert ok
+        assert await OM.update()
+        task.cancel()
+        return OM
+    OM = asyncio.run(run())
+    assert OM.machineMode == 'FFF'
+    assert OM.model['heat']['heaters'][1]['current'] > 0
+
+def test_warm_start(tmp_path):
+    # The snapshot identifies the controller and is used for a warm start in
+    # the same session, but not when the seqs have gone back
+    snapshot = str(tmp_path / 'snapshot.json')
+    rrf = fakeRRF(CAPTURE)
+    async def run():
+        OM, ok, task = await started(rrf, warmStart=snapshot)
+        task.cancel()
+        assert ok
+        with open(snapshot) as f:
+            saved = load(f)
+        assert 'RepRapFirmware' in saved['firmware']
+        saved['model']['marker'] = True
+        with open(snapshot, 'w') as f:
+            dump(saved, f)
+        OM, ok, task = await started(rrf, warmStart=snapshot)
+        task.cancel()
+        assert ok and OM.model.get('marker', False)
+        for key in saved['seqs']:
+            saved['seqs'][key] += 1000
+        with open(snapshot, 'w') as f:
+            dump(saved, f)
+        OM, ok, task = await started(rrf, warmStart=snapshot)
+        task.cancel()
+        assert ok and 'marker' not in OM.model
+    asyncio.run(run())
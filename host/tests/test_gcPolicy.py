@@ -0,0 +1,45 @@
+'''
+    gcPolicy tests, run with pytest from the host directory:
+        python3 -m pytest tests
+'''
+
+from os.path import dirname, join
+from sys import path
+
+path.insert(0, join(dirname(__file__), '..', '..', 'microPython'))
+import gcPolicy
+
+def heap(monkeypatch):
+    # A simulated microPython heap, returns it's [allocated, free] bytes
+    memory = [50000, 150000]
+    monkeypatch.setattr(gcPolicy, 'mem_alloc', lambda: memory[0])
+    monkeypatch.setattr(gcPolicy, 'mem_free', lambda: memory[1])
+    def collect():
+        memory[1] += memory[0] - 50000
+        memory[0] = 50000
+    monkeypatch.setattr(gcPolicy, 'collect', collect)
+    return memory
+
+def test_budget(monkeypatch):
+    # Collects once the budget has been allocated, or free memory is low
+    memory = heap(monkeypatch)
+    gcp = gcPolicy.gcPolicy(minFree=32768, budget=16384)
+    memory[0] += 16000
+    assert not gcp.check()
+    memory[0] += 1000
+    assert gcp.check()
+    assert memory[0] == 50000
+    memory[1] = 30000
+    assert gcp.check()
+    assert gcp.collections == 2 and gcp.checks == 3
+
+def test_automatic_collection(monkeypatch):
+    # After an automatic collection the budget counts from the new low mark
+    memory = heap(monkeypatch)
+    gcp = gcPolicy.gcPolicy(minFree=32768, budget=16384)
+    memory[0] += 12000
+    assert not gcp.check()
+    memory[0] = 30000   # collected automatically
+    assert not gcp.check()
+    memory[0] += 17000
+    assert gcp.check()
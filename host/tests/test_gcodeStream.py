@@ -0,0 +1,35 @@
+'''
+    gcodeStream tests, against a fakeRRF that is slow to process G-code
+'''
+
+from os.path import dirname, join
+from sys import path
+from time import perf_counter
+
+path.insert(0, join(dirname(__file__), '..'))
+path.insert(0, join(dirname(__file__), '..', '..', 'microPython'))
+from serialOM import serialOM
+from gcodeStream import gcodeStream
+from fakeRRF import fakeRRF
+
+CAPTURE = join(dirname(__file__), '..', 'captures', 'fff-printing.log')
+omKeys = {'FFF':['heat','job']}
+
+def test_pump_keeps_to_budget():
+    # A busy controller answers the markers late; pump() must not wait for them
+    rrf = fakeRRF(CAPTURE, gcode=0.03, rxBuffer=256)
+    OM = serialOM(rrf, omKeys, quiet=True, noCheck=True)
+    gs = gcodeStream(OM, window=8, sync=4, timeout=5000)
+    gs.load(['G1 X{} Y10 F3000'.format(n) for n in range(40)])
+    longest = 0
+    while not gs.done:
+        start = perf_counter()
+        gs.pump(100)
+        longest = max(longest, perf_counter() - start)
+        OM.update()
+    # the budget, plus a read timeout
+    assert longest < 0.2
+    assert gs.acked == 40
+    assert gs.lost == 0
+    assert rrf.gcodes == 40
+    assert OM.stats()['state.upTime']['outOfSequence'] == 0
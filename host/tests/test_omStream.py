@@ -0,0 +1,86 @@
+'''
+    omStream tests, corrupted bytes must be discarded like any malformed line
+'''
+
+from os.path import dirname, join
+from sys import path
+
+path.insert(0, join(dirname(__file__), '..', '..', 'microPython'))
+from omStream import omStream
+
+GOOD = b'{"key":"job","flags":"v","result":{"layer":3,"name":"cube"}}\n'
+
+def parse(data):
+    # Feed data to a new parser, returns the model and the parser
+    model = {}
+    parser = omStream(lambda envelope: (model, envelope['key'], False, True))
+    i = 0
+    while i < len(data):
+        i = parser.feed(data, i, len(data))
+        if parser.envelope is not None:
+            parser.reset()
+    return model, parser
+
+def corrupt(line):
+    # A corrupted line followed by a good one; the first is discarded, the second parsed
+    model, parser = parse(line + GOOD)
+    assert parser.errors == 1
+    assert model == {'job':{'layer':3, 'name':'cube'}}
+
+def test_good():
+    model, parser = parse(GOOD)
+    assert parser.errors == 0
+    assert model == {'job':{'layer':3, 'name':'cube'}}
+
+def test_bad_escape():
+    corrupt(b'{"key":"job","flags":"v","result":{"name":"a\\uZZZZb"}}\n')
+
+def test_malformed_number():
+    corrupt(b'{"key":"job","flags":"v","result":{"layer":1-2}}\n')
+
+def test_not_utf8():
+    corrupt(b'{"key":"job","flags":"v","result":{"name":"a\xffb"}}\n')
+
+def test_bad_key():
+    corrupt(b'{"key":"job","flags":"v","result":{"na\xc3me":1}}\n')
+
+def merge(data):
+    # Feed frequent responses to a parser merging into a model with a heater, returns
+    # the model, the parser and the changed paths
+    model = {'heat':{'heaters':[{'current':215.3, 'state':'active'}]}}
+    changed = []
+    parser = omStream(lambda envelope: (model, envelope['key'], True, True),
+                      changed=lambda path, value: changed.append(path))
+    i = 0
+    while i < len(data):
+        i = parser.feed(data, i, len(data))
+        if parser.envelope is not None:
+            parser.reset()
+    return model, parser, changed
+
+def test_merge():
+    model, parser, changed = merge(b'{"key":"heat","flags":"f","result":'
+                                   b'{"heaters":[{"current":216.1},{"current":20.5}]}}\n')
+    assert parser.errors == 0
+    assert model == {'heat':{'heaters':[{'current':216.1, 'state':'active'},
+                                        {'current':20.5}]}}
+    assert changed == [['heat', 'heaters', 0, 'current'], ['heat', 'heaters', 1]]
+
+def test_merge_truncated_number():
+    # A frequent response cut off in a number must not change the model
+    model, parser, changed = merge(b'{"key":"heat","flags":"f","result":'
+                                   b'{"heaters":[{"current":2\n')
+    assert parser.errors == 1
+    assert model['heat']['heaters'][0]['current'] == 215.3
+    assert changed == []
+
+def test_merge_truncated_object():
+    # Values before the truncation are not written either
+    model, parser, changed = merge(b'{"key":"heat","flags":"f","result":'
+                                   b'{"heaters":[{"current":216.1,"state":"off"},{"curr\n')
+    assert parser.errors == 1
+    assert model == {'heat':{'heaters':[{'current':215.3, 'state':'active'}]}}
+    assert changed == []
+
+def test_bad_literal():
+    corrupt(b'{"key":"job","flags":"v","result":{"layer":txyz}}\n')
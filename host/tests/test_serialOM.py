@@ -0,0 +1,335 @@
+'''
+    serialOM tests, run with pytest from the host directory:
+        python3 -m pytest tests
+'''
+
+from os.path import dirname, join
+from json import load, dump, dumps
+from pytest import approx
+from sys import path
+from time import perf_counter
+
+path.insert(0, join(dirname(__file__), '..'))
+path.insert(0, join(dirname(__file__), '..', '..', 'microPython'))
+from serialOM import serialOM, ticks_us, ticks_add
+from fakeRRF import fakeRRF
+
+CAPTURE = join(dirname(__file__), '..', 'captures', 'fff-printing.log')
+omKeys = {'FFF':['heat','tools','job','network']}
+
+class fakeUART:
+    # A stand-in for machine.UART; any() instead of in_waiting, timeouts set by init()
+    def __init__(self, capture):
+        self._rrf = fakeRRF(capture)
+
+    def init(self, baudrate=None, timeout=None, timeout_char=None, rxbuf=None):
+        if timeout is not None:
+            self._rrf.timeout = timeout / 1000
+
+    def any(self):
+        return self._rrf.in_waiting
+
+    def write(self, data):
+        return self._rrf.write(data)
+
+    def readline(self):
+        return self._rrf.readline()
+
+    def readinto(self, buf):
+        return self._rrf.readinto(buf)
+
+    def read(self, size=1):
+        return self._rrf.read(size)
+
+def test_uart_can_wait():
+    # A UART reports what is waiting with any(); it must be used for reads and timeouts
+    OM = serialOM(fakeUART(CAPTURE), omKeys, quiet=True, noCheck=True)
+    assert OM._uart
+    assert OM._canWait
+    assert OM.update()
+
+def warmSnapshot(rrf, snapshot, change=None):
+    # Start with warmStart to save a snapshot, mark it's model and apply 'change' to it
+    OM = serialOM(rrf, omKeys, quiet=True, warmStart=snapshot)
+    assert OM.update()
+    with open(snapshot) as f:
+        saved = load(f)
+    saved['model']['marker'] = True
+    if change:
+        change(saved)
+    with open(snapshot, 'w') as f:
+        dump(saved, f)
+
+def test_warm_start_same_session(tmp_path):
+    # The snapshot from this controller session is used
+    rrf = fakeRRF(CAPTURE)
+    snapshot = str(tmp_path / 'snapshot.json')
+    warmSnapshot(rrf, snapshot)
+    OM = serialOM(rrf, omKeys, quiet=True, warmStart=snapshot)
+    assert OM.model.get('marker', False)
+
+def test_warm_start_seqs_gone_back(tmp_path):
+    # A snapshot with seqs ahead of the controller is from an earlier session
+    rrf = fakeRRF(CAPTURE)
+    snapshot = str(tmp_path / 'snapshot.json')
+    def ahead(saved):
+        for key in saved['seqs']:
+            saved['seqs'][key] += 1000
+    warmSnapshot(rrf, snapshot, ahead)
+    OM = serialOM(rrf, omKeys, quiet=True, warmStart=snapshot)
+    assert 'marker' not in OM.model
+    assert OM.model['heat'] is not None
+
+def test_warm_start_other_firmware(tmp_path):
+    # A snapshot from a different controller is not used
+    rrf = fakeRRF(CAPTURE)
+    snapshot = str(tmp_path / 'snapshot.json')
+    def other(saved):
+        saved['firmware'] = saved['firmware'].replace('3.5.4', '3.4.6')
+    warmSnapshot(rrf, snapshot, other)
+    OM = serialOM(rrf, omKeys, quiet=True, warmStart=snapshot)
+    assert 'marker' not in OM.model
+    assert OM.model['heat'] is not None
+
+PATHS = {'FFF':['heat.heaters[].current','heat.heaters[].state','heat.bedHeaters[]',
+                'tools[].heaters[]','job.build.currentObject','job.filePosition',
+                'job.file.size','network.interfaces[].actualIP']}
+
+def test_projection():
+    # Each key is requested from the longest common prefix, with just enough depth
+    OM = serialOM(fakeRRF(CAPTURE), PATHS, quiet=True, noCheck=True)
+    keys, views = OM._projection(PATHS['FFF'])
+    assert keys == ['heat', 'tools', 'job', 'network']
+    assert views['heat'] == ('heat', 3, {'heaters':{'[]':{'current':True, 'state':True}},
+                                         'bedHeaters':{'[]':True}})
+    assert views['tools'] == ('tools', 3, {'[]':{'heaters':{'[]':True}}})
+    assert views['job'] == ('job', 2, {'build':{'currentObject':True},
+                                       'filePosition':True, 'file':{'size':True}})
+    assert views['network'] == ('network.interfaces', 2, {'[]':{'actualIP':True}})
+    assert views[''][2]['network'] == {'interfaces':{'[]':{'actualIP':True}}}
+    assert OM._projection(['job.file.size'])[1]['job'] == ('job.file', 1, {'size':True})
+    assert OM._keyQuery('network') == ('network.interfaces', 'fnd2')
+
+def projected(model):
+    # The PATHS from a complete model
+    return {'heat':{'heaters':[{'current':h['current'], 'state':h['state']}
+                               for h in model['heat']['heaters']],
+                    'bedHeaters':model['heat']['bedHeaters']},
+            'tools':[{'heaters':t['heaters']} for t in model['tools']],
+            'job':{'build':{'currentObject':model['job']['build']['currentObject']},
+                   'filePosition':model['job']['filePosition'],
+                   'file':{'size':model['job']['file']['size']}},
+            'network':{'interfaces':[{'actualIP':i['actualIP']}
+                                     for i in model['network']['interfaces']]}}
+
+def test_depth_limited_update():
+    # The depth limited responses hold everything in the paths, and nothing else is kept
+    for stream in (False, True):
+        rrf = fakeRRF(CAPTURE)
+        OM = serialOM(rrf, PATHS, quiet=True, noCheck=True, stream=stream)
+        assert OM.update()
+        expected = projected(rrf.model)
+        for key in expected:
+            assert OM.model[key] == expected[key]
+
+def test_ingest_prunes():
+    # A full (not depth limited) response is pruned to the paths, in both parsers
+    rrf = fakeRRF(CAPTURE)
+    line = dumps({'key':'heat', 'flags':'vnd99', 'result':rrf.model['heat']}) + '\n'
+    expected = projected(rrf.model)['heat']
+    OM = serialOM(fakeRRF(CAPTURE), PATHS, quiet=True, noCheck=True)
+    OM._seqs['heat'] = -1
+    assert OM._ingestLine(line.encode(), ('heat',)) == 'heat'
+    assert OM.model['heat'] == expected
+    OM = serialOM(fakeRRF(CAPTURE), PATHS, quiet=True, noCheck=True, stream=True)
+    OM.model['heat'] = None
+    parser = OM._parser
+    data = ('\n' + line).encode()
+    parser.feed(data, 0, len(data))
+    assert OM._ingest(parser.envelope, ('heat',), stored=True) == 'heat'
+    assert OM.model['heat'] == expected
+
+def updated(capture, cycles, omKeys=omKeys, rrfOptions={}, **options):
+    # A serialOM after a number of update cycles against a fakeRRF, the fakeRRF
+    # and the number of requests made in each cycle
+    rrf = fakeRRF(capture, **rrfOptions)
+    OM = serialOM(rrf, omKeys, quiet=True, noCheck=True, **options)
+    requests = []
+    for _ in range(cycles):
+        before = rrf.requests
+        assert OM.update()
+        requests.append(rrf.requests - before)
+    return OM, rrf, requests
+
+def test_pipeline():
+    # Pipelined requests give the same model as one at a time, in both parsers,
+    # and the round trips overlap
+    OM, rrf, requests = updated(CAPTURE, 4)
+    for options in ({'pipeline':4}, {'pipeline':4, 'stream':True}):
+        piped, rrf, pipedRequests = updated(CAPTURE, 4, **options)
+        assert pipedRequests == requests
+        assert piped.model == OM.model
+        assert piped.stats()['heat']['timeouts'] == 0
+    slow = {'latency':0.05}
+    start = perf_counter()
+    updated(CAPTURE, 2, rrfOptions=slow)
+    serial = perf_counter() - start
+    start = perf_counter()
+    updated(CAPTURE, 2, rrfOptions=slow, pipeline=4)
+    assert perf_counter() - start < serial * 0.7
+
+def test_snapshot():
+    # Snapshot mode gives the same model as per key requests with one request
+    # per update, plus verbose requests for the keys whose seqs moved
+    capture = join(dirname(__file__), '..', 'captures', 'fff-toolchanger.log')
+    OM, rrf, requests = updated(capture, 12)
+    snapped, rrf, snapRequests = updated(capture, 12, snapshot=['FFF'])
+    assert snapped.model == OM.model
+    assert requests == [6] * 12
+    assert snapRequests.count(1) >= 8
+    assert max(snapRequests) < 6
+    assert snapped.stats()['']['frequent'] == 12
+    # only for the modes given
+    perKey = updated(capture, 2, snapshot=['CNC'])[0]
+    assert '' not in perKey.stats()
+
+def test_adaptive_schedule():
+    # Unchanged keys double their interval from _pollStep up to the ceiling for
+    # the status, changed keys go back to _pollMin, a status change resets all
+    OM = updated(CAPTURE, 1, adaptive=True)[0]
+    OM.model['state']['status'] = 'processing'
+    OM._poll = {}
+    OM.changed = set()
+    intervals = []
+    for _ in range(5):
+        OM._schedule(['network'])
+        intervals.append(OM._poll['network'][0])
+    assert intervals == [250000, 500000, 1000000, 2000000, 2000000]
+    OM.model['state']['status'] = 'idle'
+    for _ in range(3):
+        OM._schedule(['network'])
+        intervals.append(OM._poll['network'][0])
+    assert intervals[5:] == [4000000, 8000000, 10000000]
+    OM.changed = {'network.interfaces[0].state'}
+    OM._schedule(['network'])
+    assert OM._poll['network'][0] == OM._pollMin
+    OM._schedule(['network'])
+    OM._schedule(['network'])
+    OM.changed = {'state.status'}
+    OM._schedule(['heat'])
+    assert list(OM._poll.keys()) == ['heat']
+
+def test_adaptive_due():
+    # Keys are polled when due, when new, or when their seqs moved
+    OM = updated(CAPTURE, 1, adaptive=True)[0]
+    now = ticks_us()
+    OM._poll = {'network':(1000000, ticks_add(now, 1000000)),
+                'job':(1000000, ticks_add(now, 1000000)),
+                'tools':(1000000, ticks_add(now, -1))}
+    OM._seqs['job'] = -1
+    assert OM._pollKeys(['heat', 'tools', 'job', 'network']) == ['heat', 'tools', 'job']
+
+def test_adaptive_update():
+    # Unchanging keys are polled less often than changing ones
+    OM, rrf, requests = updated(CAPTURE, 12, adaptive=True)
+    stats = OM.stats()
+    assert stats['network']['requests'] < stats['heat']['requests']
+    assert stats['heat']['requests'] == 13
+    assert sum(requests) < 12 * 6
+
+def test_rtt():
+    # SRTT/RTTVAR as RFC 6298, the timeout bounded by _rtoMin and _requestTimeout
+    OM = updated(CAPTURE, 1)[0]
+    OM.rttStats = {}
+    OM._rtt('heat', 8000)
+    assert OM.rttStats['heat'] == [8000, 4000, 24000]
+    OM._rtt('heat', 4000)
+    assert OM.rttStats['heat'] == [7500, 4000, 23500]
+    for _ in range(50):
+        OM._rtt('heat', 1000)
+    assert OM.rttStats['heat'][2] == OM._rtoMin
+    OM._rtt('heat', 10 * OM._requestTimeout)
+    assert OM.rttStats['heat'][2] == OM._requestTimeout
+    OM._rtt('heat', None)
+    assert 'heat' not in OM.rttStats
+
+def test_timeouts():
+    # Frequent requests with an estimate wait for it's timeout, with a quiet time
+    # of 2 * rttvar within bounds; verbose requests and keys without an
+    # estimate wait for the request timeout
+    OM = updated(CAPTURE, 1)[0]
+    OM.rttStats = {'heat':[7500, 4000, 23500], 'job':[900, 100, 10000],
+                   'tools':[200000, 80000, 250000]}
+    assert OM._timeouts('heat', 'fnd99') == (23500, 8000)
+    assert OM._timeouts('job', 'fnd99') == (10000, OM._quietMin)
+    assert OM._timeouts('tools', 'fnd99') == (250000, OM._requestTimeout // 10)
+    assert OM._timeouts('heat', 'vnd99') == (OM._requestTimeout, None)
+    assert OM._timeouts('network', 'fnd99') == (OM._requestTimeout, None)
+    OM._canWait = False
+    assert OM._timeouts('heat', 'fnd99') == (23500, None)
+
+def test_rtt_update():
+    # Estimates are kept for the frequent requests to each key
+    OM = updated(CAPTURE, 5)[0]
+    assert set(OM.rttStats.keys()) == {'heat', 'tools', 'job', 'network', 'state'}
+    for srtt, rttvar, timeout in OM.rttStats.values():
+        assert 0 < srtt < OM._requestTimeout
+        assert OM._rtoMin <= timeout <= OM._requestTimeout
+
+HOT = {'heat.heaters[].current':'f', 'job.filePosition':'i', 'job.file.size':'i'}
+
+def test_hot():
+    # The hot arrays hold the model values after every update, in both parsers
+    # and with whole keys or paths; slots beyond the list read 0
+    for keys in (omKeys, PATHS):
+        for stream in (False, True):
+            rrf = fakeRRF(CAPTURE)
+            OM = serialOM(rrf, keys, quiet=True, noCheck=True, stream=stream, hot=HOT)
+            for _ in range(4):
+                assert OM.update()
+                heaters = OM.model['heat']['heaters']
+                current = OM.hot['heat.heaters[].current']
+                assert len(current) == OM._hotSize
+                for i, heater in enumerate(heaters):
+                    assert current[i] == approx(heater['current'], rel=1e-6)
+                assert list(current[len(heaters):]) == [0] * (OM._hotSize - len(heaters))
+                assert OM.hot['job.filePosition'][0] == OM.model['job']['filePosition']
+                assert OM.hot['job.file.size'][0] == OM.model['job']['file']['size']
+            assert OM.hot['heat.heaters[].current'].typecode == 'f'
+            assert OM.hot['job.filePosition'].typecode == 'i'
+
+def test_stats_saturate():
+    # The counters stop at their limit instead of overflowing, and reset to zero
+    OM = updated(CAPTURE, 1)[0]
+    stat = OM._keyStat('heat')
+    for i in range(len(stat)):
+        stat[i] = 0xFFFFFFFF - 1
+    for _ in range(3):
+        assert OM.update()
+    stats = OM.stats(True)['heat']
+    assert stats['requests'] == stats['frequent'] == stats['bytes'] == 0xFFFFFFFF
+    assert stats['parse'] == stats['merge'] == 0xFFFFFFFF
+    assert max(stats['latency']) == max(stats['size']) == 0xFFFFFFFF
+    assert OM.stats()['heat']['requests'] == 0
+    assert OM.update()
+    assert OM.stats()['heat']['requests'] == 1
+
+def test_warm_start_no_check(tmp_path):
+    # With noCheck M115 is never sent, the seqs still decide if the snapshot is used
+    rrf = fakeRRF(CAPTURE)
+    sent = []
+    write = rrf.write
+    def logged(data):
+        sent.append(bytes(data))
+        return write(data)
+    rrf.write = logged
+    snapshot = str(tmp_path / 'snapshot.json')
+    serialOM(rrf, omKeys, quiet=True, noCheck=True, warmStart=snapshot)
+    with open(snapshot) as f:
+        saved = load(f)
+    saved['model']['marker'] = True
+    with open(snapshot, 'w') as f:
+        dump(saved, f)
+    OM = serialOM(rrf, omKeys, quiet=True, noCheck=True, warmStart=snapshot)
+    assert OM.model.get('marker', False)
+    assert not [cmd for cmd in sent if cmd.startswith(b'M115')]
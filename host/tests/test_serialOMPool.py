@@ -0,0 +1,119 @@
+'''
+    serialOMPool tests, run with pytest from the host directory:
+        python3 -m pytest tests
+'''
+
+from os.path import dirname, join
+from sys import path
+from time import perf_counter, sleep
+
+path.insert(0, join(dirname(__file__), '..'))
+path.insert(0, join(dirname(__file__), '..', '..', 'microPython'))
+from serialOMPool import serialOMPool
+from fakeRRF import fakeRRF
+
+CAPTURE = join(dirname(__file__), '..', 'captures', 'fff-printing.log')
+omKeys = {'FFF':['heat','tools','job']}
+
+class cable:
+    # A fakeRRF that can be unplugged; commands written while unplugged are lost
+    def __init__(self, capture):
+        self._rrf = fakeRRF(capture)
+        self.unplugged = False
+
+    def write(self, data):
+        if self.unplugged:
+            return len(data)
+        return self._rrf.write(data)
+
+    @property
+    def in_waiting(self):
+        return self._rrf.in_waiting
+
+    def readline(self):
+        return self._rrf.readline()
+
+    def readinto(self, buf):
+        return self._rrf.readinto(buf)
+
+    def read(self, size=1):
+        return self._rrf.read(size)
+
+def waitFor(pool, name, state, timeout=10):
+    # Wait for a printer to reach a state, returns the states seen on the way
+    seen = []
+    end = perf_counter() + timeout
+    while perf_counter() < end:
+        now = pool.health()[name]['state']
+        if not seen or seen[-1] != now:
+            seen.append(now)
+        if now == state:
+            return seen
+        sleep(0.01)
+    raise AssertionError('{} never reached {}, seen {}'.format(name, state, seen))
+
+def test_isolation():
+    # A dead and a slow printer do not delay the updates of a normal one
+    pool = serialOMPool(interval=0.05, failLimit=2, retry=1)
+    pool.add('normal', fakeRRF(CAPTURE), omKeys, noCheck=True)
+    pool.add('slow', fakeRRF(CAPTURE, latency=0.2), omKeys, noCheck=True)
+    pool.add('dead', fakeRRF(CAPTURE, drop=1), omKeys, noCheck=True)
+    pool.start()
+    sleep(3)
+    pool.stop()
+    health = pool.health()
+    normal = health['normal']
+    assert normal['state'] == 'ok'
+    assert normal['failures'] == 0
+    assert normal['updates'] > 2 * health['slow']['updates']
+    assert normal['max ms'] < health['slow']['mean ms']
+    assert health['dead']['state'] == 'dead'
+    assert health['dead']['updates'] == 0
+    assert pool.snapshot()['normal']['model']['heat']['heaters'][1]['current'] > 0
+
+def test_states_and_reconnect():
+    # starting, ok, failing then dead while unplugged, and ok again once
+    # plugged back in and reconnected after 'retry'
+    port = cable(CAPTURE)
+    pool = serialOMPool(interval=0.05, failLimit=3, retry=0.5)
+    pool.add('printer', port, omKeys, noCheck=True)
+    assert pool.health()['printer']['state'] == 'starting'
+    pool.start()
+    try:
+        assert waitFor(pool, 'printer', 'ok') == ['starting', 'ok']
+        port.unplugged = True
+        assert waitFor(pool, 'printer', 'dead') == ['ok', 'failing', 'dead']
+        health = pool.health()['printer']
+        assert health['failing'] == 3
+        assert health['connects'] == 1
+        died = perf_counter()
+        port.unplugged = False
+        waitFor(pool, 'printer', 'ok')
+        assert perf_counter() - died >= 0.5
+        health = pool.health()['printer']
+        assert health['connects'] == 2
+        assert health['failing'] == 0
+    finally:
+        pool.stop()
+
+def test_unexpected_error():
+    # An exception that is not a serialOMError marks the printer dead at once,
+    # it is then reconnected
+    pool = serialOMPool(interval=0.05, failLimit=5, retry=0.5)
+    pool.add('printer', fakeRRF(CAPTURE), omKeys, noCheck=True)
+    pool.start()
+    try:
+        waitFor(pool, 'printer', 'ok')
+        def broken():
+            raise TypeError('broken')
+        pool._printers['printer'].OM.update = broken
+        waitFor(pool, 'printer', 'dead')
+        died = perf_counter()
+        health = pool.health()['printer']
+        assert health['failing'] == 1
+        assert 'TypeError' in health['error']
+        waitFor(pool, 'printer', 'ok')
+        assert perf_counter() - died >= 0.4
+        assert pool.health()['printer']['connects'] == 2
+    finally:
+        pool.stop()
@@ -0,0 +1,31 @@
+'''
+    timedLog tests, run with pytest from the host directory:
+        python3 -m pytest tests
+'''
+
+from os.path import dirname, join
+from sys import path
+from io import StringIO
+
+path.insert(0, join(dirname(__file__), '..', '..', 'microPython'))
+import timedLog
+
+_PERIOD = 1 << 30   # microPython ticks_us() wraps at this
+
+def test_ticks_wrap(monkeypatch):
+    # Timestamps keep counting up when the microPython ticks wrap
+    clock = [_PERIOD - 5000000]
+    monkeypatch.setattr(timedLog, 'ticks_us', lambda: clock[0] % _PERIOD)
+    monkeypatch.setattr(timedLog, 'ticks_diff', lambda a, b:
+                        ((a - b + _PERIOD // 2) % _PERIOD) - _PERIOD // 2)
+    out = StringIO()
+    log = timedLog.timedLog(out)
+    stamps = []
+    for _ in range(6):
+        clock[0] += 200000000   # 200 s between lines, 20 minutes in all
+        log.write('> M409 F"fnd99" K"heat"\n')
+        log.write('{"key":"heat"')
+        log.write(',"flags":"fnd99","result":{}}\n')
+    for line in out.getvalue().splitlines():
+        stamps.append(int(line.split(' ')[0][1:]))
+    assert stamps == [n * 200000000 for n in range(1, 7) for _ in (0, 1)]
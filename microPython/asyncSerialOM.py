@@ -0,0 +1,314 @@
+'''
+    asyncSerialOM: an asyncio (CPython) / uasyncio (microPython) serialOM.
+
+    serialOM blocks while it waits for each response, for up to the request
+    timeout per key. asyncSerialOM awaits the responses instead, so that other
+    tasks (button, LEDs, display animation) keep running during an update().
+
+    It is a serialOM; the projection, parsing (line and stream), merging,
+    change tracking, adaptive polling, snapshot requests, hot values, warm
+    start and statistics are all shared. Only the serial I/O and the update
+    sequence are replaced with coroutines:
+        OM = asyncSerialOM(rrf, omKeys, ...)
+        await OM.start()
+        while True:
+            await OM.update()
+
+    arguments:
+        As serialOM, except:
+        rrf:        microPython; UART object, it's timeouts are set to 0 and it
+                        is wrapped in asyncio streams.
+                    CPython; a (StreamReader, StreamWriter) tuple, eg from
+                        serial_asyncio.open_serial_connection() (pySerial-asyncio)
+                        or asyncio.open_connection()
+        pipeline:   not supported, requests are sent one at a time
+
+    methods:
+        start():                        Coroutine; check the controller and make
+                                        the initial update, returns True on success
+        update():                       Coroutine; as serialOM.update()
+        sendGcode(code):                Coroutine; as serialOM.sendGcode()
+        getResponse(code,json,timeout,quiet):
+                                        Coroutine; as serialOM.getResponse()
+        hasChanged(paths), stats(reset):  as serialOM
+'''
+
+from serialOM import serialOM, serialOMError, ticks_us, ticks_diff, ticks_add
+
+# CPython / MicroPython compatibility:
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio  # older microPython
+
+class asyncSerialOM(serialOM):
+    def __init__(self, rrf, omKeys, **kwargs):
+        kwargs['pipeline'] = 1
+        super().__init__(rrf, omKeys, **kwargs)
+        # waiting no longer blocks anything else, but the other tasks add jitter
+        # to the round trip times; use a longer minimum response timeout
+        self._rtoMin = 50000  # μs
+
+    def _setDevice(self, rrf):
+        # Set up the asyncio streams, reads can always wait for a quiet time
+        self._canWait = True
+        if isinstance(rrf, tuple):
+            self._reader, self._writer = rrf
+        else:
+            # microPython UART; never block, asyncio waits for the data
+            self._uart = True
+            rrf.init(timeout=0, timeout_char=1, rxbuf=self._uartRxBuf)
+            self._reader = asyncio.StreamReader(rrf)
+            self._writer = asyncio.StreamWriter(rrf, {})
+
+    def _start(self):
+        # started by start()
+        pass
+
+    async def start(self):
+        # Start the serialOM comms, as serialOM._start()
+        if self._warmStart is not None and not self._noCheck:
+            self._firmware = self._firmwareId(await self.getResponse('M115'))
+        if self._warmStart is not None and self._restore():
+            self._print('restored model snapshot, making update request')
+            if await self._seqRequest() and self._sameSession() and await self.update():
+                self._print('connected to ObjectModel')
+                return True
+            self._print('cannot use restored model, starting cold')
+            self._coldModel()
+        if self._noCheck:
+            self._print('skipping controller check')
+        else:
+            retries = 10
+            while not await self._firmwareRequest():
+                retries -= 1
+                if retries == 0:
+                    self._print('failed to get a sensible M115 response from controller')
+                    return False
+                self._print('failed..retrying (' + str(retries) + ' left)')
+                await asyncio.sleep(self._requestTimeout / 1000000)
+            self._print('controller is connected')
+        await asyncio.sleep(0.1)
+        self._print('making initial data set request')
+        if await self.update():
+            self._print('connected to ObjectModel')
+            return True
+        self._coldModel()
+        self._print('failed to obtain initial machine state')
+        return False
+
+    async def _firmwareRequest(self):
+        # Send the M115 info request and look for a sensible reply
+        self._print('> M115')
+        return self._firmwareCheck(await self.getResponse('M115'))
+
+    async def sendGcode(self, code):
+        # send a gcode
+        try:
+            self._writer.write(bytearray(code + "\r\n",'utf-8'))
+            await self._writer.drain()
+        except Exception as e:
+            raise serialOMError('Gcode serial write failed : ' + repr(e)) from None
+        # log what we sent
+        if self._rawLog:
+            self._rawLog.write("> " + code + "\n")
+
+    async def _read(self, readLine, timeout):
+        # Read a line, or whatever is waiting, within timeout (μs)
+        # returns None if nothing arrived
+        try:
+            if readLine:
+                data = await asyncio.wait_for(self._reader.readline(), timeout / 1000000)
+            else:
+                data = await asyncio.wait_for(self._reader.read(self._rxChunk),
+                                              timeout / 1000000)
+        except asyncio.TimeoutError:
+            return None
+        except Exception as e:
+            raise serialOMError('Serial read from controller failed : ' + repr(e)) from None
+        if not data:
+            return None
+        if self._rawLog:
+            try:
+                self._rawLog.write(data.decode('ascii'))
+            except:
+                self._print('ascii decode failure')
+        return data
+
+    def _waitTime(self, until, seen):
+        # How long to wait for the next data; until the deadline for the
+        # first, then the quiet (device) timeout
+        if seen:
+            return self._requestTimeout // 10
+        return max(0, ticks_diff(until, ticks_us()))
+
+    async def getResponse(self, cmd, json=False, timeout=None, quiet=None):
+        # Sends a query and returns the list of response lines, see serialOM
+        await self.sendGcode(cmd)
+        if timeout is None:
+            timeout = self._requestTimeout
+        requestTime = ticks_add(ticks_us(), timeout)
+        expireTime = ticks_add(ticks_us(), self._requestTimeout * 5)
+        response = []
+        seen = False
+        while True:
+            line = await self._read(True, quiet if seen and quiet is not None
+                                              else self._waitTime(requestTime, seen))
+            if line is None:
+                break
+            if not seen:
+                self._rxTime = ticks_us()
+                seen = True
+            try:
+                line = line.decode('ascii')
+            except:
+                self._print('ascii decode failure')
+                continue
+            if not json:
+                response.append(line)
+            elif (line[:1] == '{') and (line[-2:] == '}\n'):
+                response.append(line)
+            if ticks_diff(ticks_us(),expireTime) > 0:
+                raise serialOMError('Runaway communications; controller in error state?')
+        if len(response) == 0:
+            self._print('timed out waiting for a response')
+        self._gc.check()
+        return response
+
+    async def _omRequest(self, OMkey, OMflags):
+        # Send a OM key request and ingest the response, see serialOM
+        cmd = 'M409 F"' + OMflags + '" K"' + OMkey + '"'
+        timeout, quiet = self._timeouts(OMkey, OMflags)
+        self._countRequest(OMkey, OMflags)
+        sent = ticks_us()
+        if self._stream:
+            ownKey = await self._streamResponse(cmd, OMkey, timeout)
+        else:
+            ownKey = await self._lineResponse(cmd, OMkey, timeout, quiet)
+        self._countResponse(OMkey, ticks_diff(self._rxTime, sent) if ownKey else None)
+        if 'f' in OMflags:
+            self._rtt(OMkey, ticks_diff(self._rxTime, sent) if ownKey else None)
+        return ownKey
+
+    async def _lineResponse(self, cmd, OMkey, timeout, quiet):
+        # Send a M409 query and ingest the response lines
+        await self.sendGcode(cmd)
+        requestTime = ticks_add(ticks_us(), timeout)
+        expireTime = ticks_add(ticks_us(), self._requestTimeout * 5)
+        ownKey = False
+        seen = False
+        while True:
+            line = await self._read(True, quiet if seen and quiet is not None
+                                              else self._waitTime(requestTime, seen))
+            if line is None:
+                break
+            seen = True
+            if self._ingestLine(line, (OMkey,)) is not None:
+                ownKey = True
+                self._rxTime = ticks_us()
+            if ticks_diff(ticks_us(),expireTime) > 0:
+                raise serialOMError('Runaway communications; controller in error state?')
+        if not ownKey:
+            self._print('timed out waiting for a json response')
+        self._gc.check()
+        return ownKey
+
+    async def _streamResponse(self, cmd, OMkey, timeout):
+        # Send a M409 query and parse the response from the stream as it arrives
+        await self.sendGcode(cmd)
+        requestTime = ticks_add(ticks_us(), timeout)
+        expireTime = ticks_add(ticks_us(), self._requestTimeout * 5)
+        parser = self._parser
+        ownKey = False
+        seen = False
+        while not ownKey:
+            if self._rxPos == self._rxEnd:
+                chunk = await self._read(False, self._waitTime(requestTime, seen))
+                if chunk is None:
+                    break
+                seen = True
+                self._rxBuf = chunk
+                self._rxPos = 0
+                self._rxEnd = len(chunk)
+            self._feed()
+            if parser.envelope is not None:
+                if self._ingest(parser.envelope, (OMkey,), stored=True) is not None:
+                    ownKey = True
+                    self._rxTime = ticks_us()
+                self.touched += parser.touched
+                parser.reset()
+                self._rxBytes = self._parseTime = 0
+            if ticks_diff(ticks_us(),expireTime) > 0:
+                raise serialOMError('Runaway communications; controller in error state?')
+        if not ownKey:
+            parser.abort()
+            self._rxBytes = self._parseTime = 0
+            self._print('timed out waiting for a json response')
+        self._gc.check()
+        return ownKey
+
+    async def _keyRequest(self, key):
+        # Do an individual key request using the correct verbosity
+        OMkey, OMflags = self._keyQuery(key)
+        return await self._omRequest(OMkey, OMflags)
+
+    async def update(self):
+        # Do an update cycle; get new data and update local OM
+        self._beginUpdate()
+        if self.machineMode in self._snapshot:
+            updated = await self._snapshotUpdate()
+        else:
+            updated = await self._update()
+        return self._endUpdate(updated)
+
+    async def _seqRequest(self):
+        # Send a 'seqs' request to the OM
+        if not await self._omRequest('seqs','vnd99'):
+            self._print('sequence key request failed')
+            return False
+        return True
+
+    async def _stateRequest(self):
+        # Send a state request, handles machine mode and uptime changes
+        if not await self._keyRequest('state'):
+            self._print('state key request failed')
+            return False
+        self._stateCheck()
+        return True
+
+    async def _update(self):
+        # seqs, state (handles restart and mode changes) then the mode keys
+        if not await self._seqRequest():
+            return False
+        if not await self._stateRequest():
+            return False
+        if not self._modeCheck():
+            return False
+        success = True
+        polled = []
+        for key in self._pollKeys(self._omKeys[self.machineMode]):
+            if await self._keyRequest(key):
+                polled.append(key)
+            else:
+                success = False
+        self._schedule(polled)
+        return success
+
+    async def _snapshotUpdate(self):
+        # the whole model frequent values, then verbose requests for the
+        # keys where the sequence number has changed
+        if not await self._omRequest('', 'fnd' + str(self._depth)):
+            self._print('snapshot request failed')
+            return False
+        if self._seqs['state'] != self.model['seqs']['state']:
+            if not await self._keyRequest('state'):
+                self._print('state key request failed')
+                return False
+        self._stateCheck()
+        if not self._modeCheck():
+            return False
+        success = True
+        for key in self._seqsChanged():
+            if not await self._keyRequest(key):
+                success = False
+        return success
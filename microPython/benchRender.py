@@ -0,0 +1,93 @@
+'''
+    Device benchmark: drawing the FFF heater panels, with the ezFBfont
+    glyph and line caches on and off.
+
+    Draws the left (extruder) and right (bed and chamber) panels with
+    outputRRF._drawHeaters(), as _putModel() does with the results of
+    _getFFF(), for a sequence of readings:
+        steady:  temperatures wandering around their targets, as when printing;
+                 the same few strings are drawn again and again
+        ramp:    heating up, every reading is new
+    Each sequence is drawn with no caches, with the glyph cache only and
+    with both caches. Reports the mean and longest time to draw both panels,
+    the memory allocated per draw (between collections) and the cache
+    hits out of the lookups.
+
+    Run it on the device, with the displays connected, eg:
+        mpremote run benchRender.py
+    The displays are initialised but not updated.
+'''
+
+from time import ticks_us, ticks_diff
+from gc import collect, mem_alloc, disable, enable
+from config import config
+from outputI2Cx2 import outputRRF, C_TOOL, C_BED, C_ENCL
+from ezFBfont import cache_size, cache_stats
+
+READINGS = 100
+
+def heater(name, icon, target, temp, position):
+    # A heater, as returned by _getFFF()
+    val = int(temp)
+    decimal = -9 <= temp <= 90
+    dec = abs(int((temp - val) * 10)) if decimal else 0
+    return ('heater', name, icon, '{}°'.format(target), val, dec, decimal, position)
+
+def readings(ramp):
+    # The (left, right) panels for each reading
+    frames = []
+    for n in range(READINGS):
+        if ramp:
+            e0, bed, enc = 20 + n * 1.95, 20 + n * 0.41, 20 + n * 0.17
+        else:
+            wander = ((n * 7) % 5 - 2) / 10
+            e0, bed, enc = 215 + wander * 10, 60 + wander, 35.2 + wander
+        frames.append(((heater('E0', C_TOOL, 215, e0, 'full'),),
+                       (heater('bed', C_BED, 60, bed, 'upper'),
+                        heater('enc', C_ENCL, 35, enc, 'lower'))))
+    return frames
+
+def run(out, frames):
+    # Returns the mean and longest draw time (ms) and the bytes allocated per draw
+    total = worst = allocated = 0
+    for left, right in frames:
+        collect()
+        disable()
+        before = mem_alloc()
+        start = ticks_us()
+        out._lpanel.fill(0)
+        out._drawHeaters(out._lpanel_fonts, left)
+        out._rpanel.fill(0)
+        out._drawHeaters(out._rpanel_fonts, right)
+        took = ticks_diff(ticks_us(), start)
+        allocated += mem_alloc() - before
+        enable()
+        total += took
+        worst = max(worst, took)
+    return total / len(frames) / 1000, worst / 1000, allocated // len(frames)
+
+out = outputRRF()
+if not out.running:
+    print('Failed to start output device')
+else:
+    print('{} readings, glyph cache {} b, line cache {} b'.format(READINGS,
+          config.font_cache, config.string_cache))
+    print('{:8} {:8} {:>8} {:>8} {:>8} {:>8} {:>8}'.format('readings', 'caches',
+          'mean', 'max', 'alloc', 'glyphs', 'lines'))
+    for ramp in (False, True):
+        frames = readings(ramp)
+        for name, glyphs, lines in (('none', 0, 0), ('glyphs', config.font_cache, 0),
+                                    ('both', config.font_cache, config.string_cache)):
+            # start each run with empty caches
+            cache_size(0, 0)
+            cache_size(glyphs, lines)
+            cache_stats(True)
+            mean, longest, allocated = run(out, frames)
+            stats = cache_stats()
+            print('{:8} {:8} {:6.2f}ms {:6.2f}ms {:7d}b {:>8} {:>8}'.format(
+                  'ramp' if ramp else 'steady', name, mean, longest, allocated,
+                  '{}/{}'.format(stats['glyphs']['hits'],
+                                 stats['glyphs']['hits'] + stats['glyphs']['misses']),
+                  '{}/{}'.format(stats['lines']['hits'],
+                                 stats['lines']['hits'] + stats['lines']['misses'])))
+    cache_size(config.font_cache, config.string_cache)
@@ -56,6 +56,17 @@ class config():
     device = UART(0)
     baud   = 230400
 
+    '''
+        Warm start:
+        warm_start: (str) File where a snapshot of the ObjectModel is saved, so that
+                    real data is shown straight away after a reset, if the controller
+                    has not restarted since the snapshot was taken.
+                    The snapshot is rewritten (at most once a minute) whenever new
+                    verbose data arrives, this wears the flash; eg: 'warmstart.json'
+                    (default None, disabled)
+    '''
+    warm_start = None
+
     '''
         Network Config:
 
@@ -119,11 +130,17 @@ class config():
         marquee_pause:      (int) Number of step cycles to pause before starting to scroll
         display_watchdog:   (float) If the main loop stops (eg error/crash) for longer than this;
                                   kill the animator thread, seconds
+        font_cache:         (int) Memory for the cache of ready to draw font glyphs, bytes,
+                                  0 disables it
+        string_cache:       (int) Memory for the cache of pre-drawn lines of text, bytes,
+                                  0 disables it
     '''
     animation_interval = 0.1
     marquee_step       = 3
     marquee_pause      = 8
     display_watchdog   = 10
+    font_cache         = 8192
+    string_cache       = 8192
 
 
     '''
@@ -143,7 +160,7 @@ class config():
                           if 0 start immediately
                           if None drop immediately to REPL (debug)
         info:      (bool) Show machine status lines in REPL console
-        stats:     (bool) Show printPy fetch speed and memory stats when info=True
+        stats:     (bool) Show printPy fetch speed, memory and display stats when info=True
         verbose:   (bool) Show init and serialOM comms info messages
     '''
     autostart = 3
@@ -9,6 +9,87 @@
 
 import framebuf
 
+# Caches
+# - Glyphs are cached as ready to blit framebuffers, shared by every writer
+#   using the same font, so they are only copied out of the font once.
+# - Lines of text (two or more characters, with no hgap) are cached as one
+#   pre-composed framebuffer, so writing a line already drawn is one blit.
+#   Alignment is applied when the line is blitted; it is not part of the key.
+# - Each cache is limited to 'size' bytes (the buffers plus an estimate of
+#   the object overhead) over all fonts; the least recently used entries are
+#   dropped to make room. A size of 0 disables the cache, see cache_size().
+# - Palettes are shared by all writers, one for each fg/bg colour pair.
+# - cache_stats() returns the hit, miss and eviction counts and the memory used.
+_GLYPH_OVERHEAD = 48  # estimated bytes per cached glyph, for the objects
+_LINE_OVERHEAD = 64   # estimated bytes per cached line, for the objects
+# font name: {char or line: [framebuffer, width, height, bytes, last used]}
+_glyphs = {'fonts': {}, 'size': 8192, 'used': 0, 'hits': 0, 'misses': 0, 'evictions': 0}
+_lines = {'fonts': {}, 'size': 8192, 'used': 0, 'hits': 0, 'misses': 0, 'evictions': 0}
+_palettes = {}  # (fg << 16) | bg: palette framebuffer
+_tick = 0       # use counter
+
+def _lookup(cache, entries, key):
+    # returns a cached entry, marked as used, or None
+    global _tick
+    _tick += 1
+    if _tick > 0x1FFFFFFF:
+        _retick()
+    entry = entries.get(key)
+    if entry is None:
+        cache['misses'] += 1
+        return None
+    cache['hits'] += 1
+    entry[4] = _tick
+    return entry
+
+def _store(cache, entries, key, entry):
+    # add a new entry if it fits in the cache
+    entry[4] = _tick
+    if entry[3] <= cache['size']:
+        _evict(cache, entry[3])
+        entries[key] = entry
+        cache['used'] += entry[3]
+
+def _evict(cache, need):
+    # drop the least recently used entries until there is room for 'need' bytes
+    while cache['used'] + need > cache['size'] and cache['used'] > 0:
+        oldest = None
+        for entries in cache['fonts'].values():
+            for key, entry in entries.items():
+                if oldest is None or entry[4] < oldest[2][4]:
+                    oldest = (entries, key, entry)
+        del oldest[0][oldest[1]]
+        cache['used'] -= oldest[2][3]
+        cache['evictions'] += 1
+
+def _retick():
+    # restart the use counter before it overflows a small int, keeping the order
+    global _tick
+    entries = sorted((e for cache in (_glyphs, _lines) for font in cache['fonts'].values()
+                      for e in font.values()), key=lambda e: e[4])
+    for tick, entry in enumerate(entries):
+        entry[4] = tick
+    _tick = len(entries)
+
+def cache_size(glyphs=None, lines=None):
+    # Set the glyph and line cache sizes in bytes, 0 disables a cache
+    for cache, size in ((_glyphs, glyphs), (_lines, lines)):
+        if size is not None:
+            cache['size'] = size
+            _evict(cache, 0)
+
+def cache_stats(reset=False):
+    # Returns the glyph and line cache statistics, optionally resetting the counts
+    stats = {'palettes': len(_palettes)}
+    for name, cache in (('glyphs', _glyphs), ('lines', _lines)):
+        stats[name] = {'size': cache['size'], 'used': cache['used'],
+                       'entries': sum(len(font) for font in cache['fonts'].values()),
+                       'hits': cache['hits'], 'misses': cache['misses'],
+                       'evictions': cache['evictions']}
+        if reset:
+            cache['hits'] = cache['misses'] = cache['evictions'] = 0
+    return stats
+
 # Basic string writing class
 class ezFBfont():
 
@@ -28,6 +109,8 @@ class ezFBfont():
         self._device = device
         self._font = font
         self.name = self._font.__name__
+        self._glyphs = _glyphs['fonts'].setdefault(self.name, {})
+        self._lines = _lines['fonts'].setdefault(self.name, {})
 
         # font and color; only monochrome HLSB fonts are supported
         self._font_format = framebuf.MONO_HLSB
@@ -55,9 +138,13 @@ class ezFBfont():
         return v
 
     def _line_size(self, string):
+        line = self._lines.get(string)
+        if line is not None and self.hgap == 0:
+            return line[1], line[2]
         x = 0
         for char in string:
-            _, _, char_width = self._font.get_ch(char)
+            glyph = self._glyph(char)
+            char_width = 0 if glyph is None else glyph[1]
             x += char_width + self.hgap if char_width > 0 else 0
         x = x - self.hgap if x != 0 else x   # remove any trailing hgap
         return x, self._font.height()
@@ -66,22 +153,69 @@ class ezFBfont():
         # flip the left and right bytes in a 16 bit color word if required
         return ((color & 255) << 8) + (color >> 8) if self._cswap else color
 
+    def _glyph(self, char):
+        # returns the cached [framebuffer, width, height, ..] for a char, or None
+        entry = _lookup(_glyphs, self._glyphs, char)
+        if entry is not None:
+            return entry
+        glyph, char_height, char_width = self._font.get_ch(char)
+        if glyph is None:
+            return None
+        charbuf = framebuf.FrameBuffer(bytearray(glyph), char_width, char_height,
+                                       self._font_format)
+        entry = [charbuf, char_width, char_height, len(glyph) + _GLYPH_OVERHEAD, 0]
+        _store(_glyphs, self._glyphs, char, entry)
+        return entry
+
+    def _line(self, line):
+        # returns the cached [framebuffer, width, height, ..] for a line of text,
+        # composed from the glyphs, or None if it is not cached
+        if len(line) < 2 or self.hgap != 0 or _lines['size'] == 0:
+            return None
+        entry = _lookup(_lines, self._lines, line)
+        if entry is not None:
+            return entry
+        high = self._font.height()
+        glyphs = []
+        wide = 0
+        for char in line:
+            glyph = self._glyph(char)
+            if glyph is None or glyph[2] != high:
+                return None  # draw it char by char
+            glyphs.append(glyph)
+            wide += glyph[1]
+        buf = bytearray(((wide + 7) // 8) * high)
+        linebuf = framebuf.FrameBuffer(buf, wide, high, self._font_format)
+        x = 0
+        for glyph in glyphs:
+            linebuf.blit(glyph[0], x, 0)
+            x += glyph[1]
+        entry = [linebuf, wide, high, len(buf) + len(line) + _LINE_OVERHEAD, 0]
+        _store(_lines, self._lines, line, entry)
+        return entry
+
+    def _palette(self, fg, bg):
+        # returns the shared color map for fg and bg
+        fg = self._swap_bytes(fg)
+        bg = self._swap_bytes(bg)
+        key = (fg << 16) | bg
+        palette = _palettes.get(key)
+        if palette is None:
+            palette = framebuf.FrameBuffer(bytearray(self._font_colors * 2),
+                                           self._font_colors, 1, self._palette_format)
+            palette.pixel(0, 0, bg)
+            palette.pixel(self._font_colors -1, 0, fg)
+            _palettes[key] = palette
+        return palette
+
     def _put_char(self, char, x, y, fg, bg, tkey):
         # fetch the glyph
-        glyph, char_height, char_width = self._font.get_ch(char)
+        glyph = self._glyph(char)
         if glyph is None:
             return None, None  # Nothing to write
-        # buffers
-        palette_buf = bytearray(self._font_colors * 2)
-        buf = bytearray(glyph)
-        # assemble color map
-        palette = framebuf.FrameBuffer(palette_buf, self._font_colors, 1, self._palette_format)
-        palette.pixel(0, 0, self._swap_bytes(bg))
-        palette.pixel(self._font_colors -1, 0, self._swap_bytes(fg))
-        # fetch and blit the glyph
-        charbuf = framebuf.FrameBuffer(buf, char_width, char_height, self._font_format)
-        self._device.blit(charbuf, x, y, tkey, palette)
-        return char_width, char_height
+        # blit the glyph
+        self._device.blit(glyph[0], x, y, tkey, self._palette(fg, bg))
+        return glyph[1], glyph[2]
 
     def set_default(self, fg=None, bg=None, tkey=None,
                     halign=None, valign=None, hgap=None, vgap=None, split=None, verbose=None):
@@ -158,7 +292,11 @@ class ezFBfont():
         elif valign == 'bottom':
             ypos = y - high
         for line in lines:
-            wide, high = self._line_size(line)
+            cached = self._line(line)
+            if cached is None:
+                wide, high = self._line_size(line)
+            else:
+                wide, high = cached[1], cached[2]
             # horizontal alignment
             if halign == 'left':
                 xpos = x
@@ -166,6 +304,11 @@ class ezFBfont():
                 xpos = x - wide
             else:
                 xpos = int(x - (wide / 2))
+            if cached is not None:
+                # write the pre-composed line
+                self._device.blit(cached[0], xpos, ypos, tkey, self._palette(fg, bg))
+                ypos += high + self.vgap
+                continue
             # write the line
             for char in line:
                 cx, _ = self._put_char(char, xpos, ypos, fg, bg, tkey)
@@ -0,0 +1,87 @@
+'''
+    gcPolicy: garbage collection on an allocation budget.
+
+    Calling gc.collect() unconditionally after every response and display
+    update costs several milliseconds each time on the RP2040. Instead the
+    code calls check() at the points where a collection would be sensible,
+    and a collection is only done when it is actually needed:
+      - free memory has fallen below 'minFree', or
+      - more than 'budget' bytes have been allocated since the last collection
+        (automatic collections, seen as mem_alloc() going down, count too)
+    The number and duration of the collections are recorded.
+
+    One policy object is shared by serialOM, outputRRF and the main loop.
+
+    On CPython (which has automatic garbage collection and no mem_free() or
+    mem_alloc()) check() never collects.
+'''
+
+from gc import collect
+
+# CPython / MicroPython compatibility:
+try:
+    from gc import mem_free, mem_alloc  # microPython
+except:
+    def mem_free():
+        return 0x7fffffff
+    def mem_alloc():
+        return 0
+try:
+    from time import ticks_us, ticks_diff  # microPython
+except:
+    from time import time
+    def ticks_us():
+        return int(time() * 1000000)
+    def ticks_diff(first,second):
+        return int(first-second)
+
+class gcPolicy:
+    '''
+        arguments:
+            minFree:    int; collect when free memory falls below this (bytes),
+                            default: 32768
+            budget:     int; collect when this many bytes have been allocated
+                            since the last collection, default: 16384
+
+        methods:
+            check():    Collects if either limit is exceeded, returns True if
+                        a collection was done.
+            collect():  Collect now.
+
+        properties:
+            checks:         Number of calls to check()
+            collections:    Number of collections done
+            collectTime:    Total time spent collecting, int(μs)
+            maxTime:        Longest single collection, int(μs)
+    '''
+
+    def __init__(self, minFree=32768, budget=16384):
+        self.minFree = minFree
+        self.budget = budget
+        self.checks = 0
+        self.collections = 0
+        self.collectTime = 0
+        self.maxTime = 0
+        self._mark = mem_alloc()
+
+    def check(self):
+        # Collect only if we are short of memory or over budget
+        self.checks += 1
+        used = mem_alloc()
+        if used < self._mark:
+            # an automatic collection freed memory, the budget starts from there
+            self._mark = used
+        if used - self._mark < self.budget and mem_free() > self.minFree:
+            return False
+        self.collect()
+        return True
+
+    def collect(self):
+        # Timed collection, resets the allocation budget
+        start = ticks_us()
+        collect()
+        took = ticks_diff(ticks_us(), start)
+        self.collections += 1
+        self.collectTime += took
+        self.maxTime = max(self.maxTime, took)
+        self._mark = mem_alloc()
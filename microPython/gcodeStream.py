@@ -0,0 +1,190 @@
+'''
+    gcodeStream: send G-code files and macros over the serialOM link.
+
+    sendGcode() writes one line and returns, getResponse() waits for a reply
+    to each one; neither is any use for pushing a large batch of G-code to
+    the controller through the port that serialOM is monitoring it with.
+
+    In PanelDue mode (M575 S0/S1) RRF does not acknowledge G-code lines, but
+    it does process the commands from a port strictly in order. So after
+    every 'sync' lines a marker request (a frequent M409 for state.upTime)
+    is sent, and the response to a marker acknowledges all the lines sent
+    before it. At most 'window' lines, and 'buffer' bytes, are sent that
+    have not been acknowledged; when the controller is busy (eg. the move
+    queue is full) it stops reading commands, the markers are answered
+    later and the stream waits, rather than overrunning the controller's
+    input buffer (there is no flow control on the UART).
+
+    The stream is pumped from the main loop, between serialOM updates, so
+    the model (and the display) keep updating during a transfer:
+        gs = gcodeStream(OM, window=8, sync=4)
+        gs.load(open('macro.g'))
+        while not gs.done:
+            gs.pump(250)
+            OM.update()
+    pump() returns when it's budget is spent, even if markers are still
+    unanswered (eg. the controller's move queue is full); serialOM routes
+    the late marker responses to the stream (see serialOM.listen()) when
+    they arrive during update(), or the next pump().
+
+    With 'lineNumbers' set every line (and marker) is sent with a line
+    number and checksum, starting from 'N0 M110 N0'; needed if the port is
+    set to require checksums (M575 S1).
+
+    arguments:
+        OM:             serialOM; started, in line or stream mode
+        window:         int; maximum number of lines sent but not acknowledged
+        sync:           int; lines sent between markers, at most 'window'
+        buffer:         int; maximum bytes sent but not acknowledged, at most
+                        the size of the controller's input buffer
+        lineNumbers:    bool; send line numbers and checksums
+        timeout:        int; ms to wait for a marker response before it is 'lost'
+        collector:      gcPolicy object, shared with serialOM, default: a new gcPolicy()
+
+    methods:
+        load(lines):    Start streaming; 'lines' is any iterable of G-code lines,
+                        eg. a list or an open file. Comments (after ';') and
+                        blank lines are skipped.
+        pump(budget):   Send lines and collect acknowledgements for up to
+                        'budget' ms, then mark the lines sent so far. Returns
+                        the number of lines acknowledged.
+
+    properties:
+        done:       True when every line has been sent and acknowledged
+        sent:       lines sent since load()
+        acked:      lines acknowledged since load()
+        markers:    marker requests sent since load()
+        lost:       markers not answered within 'timeout', the lines before
+                    them were sent but are unconfirmed
+'''
+
+from serialOM import ticks_us, ticks_diff, ticks_add
+from gcPolicy import gcPolicy
+
+_MARKER = 'state.upTime'
+
+def checksum(line):
+    # The RRF/Marlin line checksum; all the bytes in the line XORed together
+    cs = 0
+    for c in bytes(line, 'ascii'):
+        cs ^= c
+    return cs
+
+class gcodeStream:
+    def __init__(self, OM, window=8, sync=4, buffer=256, lineNumbers=False,
+                 timeout=1250, collector=None):
+        self._OM = OM
+        self._gc = gcPolicy() if collector is None else collector
+        self._timeout = timeout * 1000
+        self._window = window
+        self._sync = max(1, min(sync, window))
+        self._buffer = buffer
+        self._lineNumbers = lineNumbers
+        # room kept for the marker that may follow a line
+        self._reserve = len(_MARKER) + (40 if lineNumbers else 30)
+        self._source = iter(())
+        self._next = None       # the next line to send
+        self._number = 0        # the next line number
+        self._markers = []      # (lines, bytes, time) sent for each unanswered marker
+        self._unmarked = 0      # lines sent since the last marker
+        self._bytes = 0         # bytes sent
+        self._ackedBytes = 0    # bytes acknowledged
+        self.done = True
+        self.sent = 0
+        self.acked = 0
+        self.markers = 0
+        self.lost = 0
+        OM.listen(_MARKER, self._ack)
+
+    def _line(self):
+        # The next line from the source, or None at the end
+        for line in self._source:
+            line = line.split(';')[0].strip()
+            if line:
+                return line
+        return None
+
+    def _send(self, code):
+        # Send a line, numbered if needed
+        if self._lineNumbers:
+            code = 'N' + str(self._number) + ' ' + code
+            code += '*' + str(checksum(code))
+            self._number += 1
+        self._OM.sendGcode(code)
+        self._bytes += len(code) + 2
+
+    def _room(self):
+        # True if the next line can be sent
+        if self.sent - self.acked >= self._window:
+            return False
+        inFlight = self._bytes - self._ackedBytes
+        return inFlight == 0 or inFlight + len(self._next) + self._reserve <= self._buffer
+
+    def _mark(self):
+        # Send a marker for the lines sent so far
+        self._send('M409 F"f" K"' + _MARKER + '"')
+        self._OM.expect(_MARKER, 'f')
+        self._markers.append((self.sent, self._bytes, ticks_us()))
+        self._unmarked = 0
+        self.markers += 1
+
+    def _ack(self, OMkey):
+        # serialOM passes each marker response here, acknowledging the lines before it
+        if self._markers:
+            self.acked, self._ackedBytes, _ = self._markers.pop(0)
+
+    def _expire(self):
+        # Give up on markers not answered within the timeout
+        while self._markers and ticks_diff(ticks_us(), self._markers[0][2]) > self._timeout:
+            self.acked, self._ackedBytes, _ = self._markers.pop(0)
+            self._OM.cancel(_MARKER)
+            self.lost += 1
+
+    def load(self, lines):
+        # markers still unanswered from an earlier stream are not expected any more
+        for _ in self._markers:
+            self._OM.cancel(_MARKER)
+        self._source = iter(lines)
+        self._next = self._line()
+        self._markers = []
+        self._unmarked = 0
+        self._bytes = 0
+        self._ackedBytes = 0
+        self.done = self._next is None
+        self.sent = 0
+        self.acked = 0
+        self.markers = 0
+        self.lost = 0
+        if self._lineNumbers:
+            self._number = 0
+            self._send('M110 N0')
+
+    def pump(self, budget=250):
+        if self.done:
+            return 0
+        acked = self.acked
+        until = ticks_add(ticks_us(), budget * 1000)
+        while True:
+            self._expire()
+            # fill the window
+            while self._next is not None and self._room():
+                self._send(self._next)
+                self.sent += 1
+                self._unmarked += 1
+                if self._unmarked == self._sync:
+                    self._mark()
+                self._next = self._line()
+            if self._unmarked and (self._next is None or not self._markers):
+                # the end, or the window is full of unmarked lines
+                self._mark()
+            left = ticks_diff(until, ticks_us())
+            if not self._markers or left <= 0:
+                break
+            # wait for a marker response; other responses are ingested as usual
+            self._OM.read(left)
+        # mark every line sent, the responses may arrive during update()
+        if self._unmarked:
+            self._mark()
+        self._gc.check()
+        self.done = self._next is None and not self._markers
+        return self.acked - acked
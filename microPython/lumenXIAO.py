@@ -14,6 +14,10 @@ from time import sleep_ms
 BITSTREAM_PAUSE = 10
 
 class lumen:
+    # ObjectModel paths used by emote(); a class attribute, printXIAO only
+    # calls emote() again when serialOM.hasChanged(omPaths)
+    omPaths = ['state.status','state.machineMode','network.interfaces']
+
     def __init__(self, bright, standby, flash):
         '''
             start led/neopixel etc
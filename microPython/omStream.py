@@ -0,0 +1,428 @@
+'''
+    omStream: an incremental (push) JSON parser for RRF M409 responses.
+
+    Designed to run on either CPython or microPython, it is fed raw bytes
+    straight from the serial stream as they arrive and writes the 'result'
+    of each response directly into the local object model.
+
+    There is no line buffer, no decoded string and no intermediate dict for
+    the response; memory used while parsing is bounded by the nesting depth
+    of the JSON, the length of the longest single string/number in it and
+    the number of leaves a merge changes.
+
+    The response envelope is parsed normally, when the 'result' key is
+    reached the 'target' function is called with the envelope so far:
+        target(envelope) : returns a (container, key, merge, spec) tuple giving
+                           where to write the result, whether to merge
+                           (frequent) or replace (verbose) the existing data,
+                           and the spec of what to keep (see serialOM.project())
+                           Return None to parse and discard the result.
+    Values that are not in the spec are parsed but never decoded or stored.
+
+    Replaced data is built off-model, merged data is compared with the model
+    as it is parsed using the same rules as serialOM.merge(); only changed
+    leaves are written, 'None' never overwrites an existing value and lists
+    are merged by index. Nothing is written to the model until the whole
+    response object is complete, a truncated or malformed response leaves
+    the model untouched.
+
+    Optional functions:
+        store(container, key, value) : stores a complete replacement value and
+                                       returns the number of leaves changed,
+                                       default is to assign it.
+        changed(path, value) :         called with the list of keys and indexes
+                                       to every leaf changed while merging, and
+                                       it's new value, once the response is
+                                       complete.
+
+    methods:
+        reset():                   Discard any partial parse and wait for a new object
+        abort():                   Discard any partial parse and skip to the next line
+        feed(buf, start, end):     Parse buf[start:end], returns the index of the
+                                   next unconsumed byte. Parsing stops after each
+                                   complete object, which is placed in 'envelope'.
+    properties:
+        envelope:   The last complete response object, with the 'result' replaced
+                    by a reference to the stored data, None while parsing.
+        errors:     Count of malformed or truncated objects discarded.
+        touched:    Number of model leaves changed by the current object, an added
+                    or replaced container counts as a single leaf.
+'''
+
+# Parser states
+_IDLE = 0       # outside of any object, waiting for a '{' at the start of a line
+_VALUE = 1      # expecting a value
+_KEY = 2        # expecting a key string, or the end of an object
+_COLON = 3      # expecting the ':' after a key
+_NEXT = 4       # expecting a ',' or the end of a container
+_STRING = 5     # in a string
+_ESCAPE = 6     # in a string, after a backslash
+_UNICODE = 7    # in a \uXXXX escape
+_NUMBER = 8     # in a number
+_LITERAL = 9    # in true/false/null
+_SKIPLINE = 10  # discarding a bad line
+
+# Frame modes
+_SKIP = 0       # parse and discard
+_NEW = 1        # building new data
+_MERGE = 2      # merging into existing data
+_ENV = 3        # the response envelope
+
+# Simple escapes
+_ESCAPES = {98:8, 102:12, 110:10, 114:13, 116:9}   # b f n r t
+
+class omStream:
+    def __init__(self, target, store=None, changed=None, tokenSize=64):
+        self._target = target
+        self._store = store
+        self._changed = changed
+        self._tok = bytearray(tokenSize)
+        self._bol = True
+        self.errors = 0
+        self.reset()
+
+    def reset(self):
+        self._state = _IDLE
+        # stacks for the open containers; data, is-dict, slot (key/index), mode and spec
+        self._c = []
+        self._d = []
+        self._k = []
+        self._m = []
+        self._f = []
+        self._tlen = 0
+        self._isKey = False
+        self._root = None
+        self._rootDepth = 0
+        # merged leaves (container, slot, value, path) and the replacement
+        # (parent, key, value) held until the response is complete
+        self._held = []
+        self._heldRoot = None
+        self.envelope = None
+        self.touched = 0
+
+    def abort(self):
+        # Discard any partial object and skip the rest of the line
+        if self._state in (_IDLE, _SKIPLINE):
+            return
+        self.errors += 1
+        self.reset()
+        self._state = _SKIPLINE
+
+    def _addByte(self, b):
+        if self._tlen == len(self._tok):
+            self._tok.extend(bytearray(len(self._tok)))
+        self._tok[self._tlen] = b
+        self._tlen += 1
+
+    def _token(self):
+        t = self._tok[:self._tlen].decode()
+        self._tlen = 0
+        return t
+
+    def _open(self, isDict):
+        # A new container begins; decide where it goes
+        if not self._m:
+            # The envelope
+            self._push({}, True, _ENV, True)
+            return
+        c = self._c[-1]
+        k = self._k[-1]
+        m = self._m[-1]
+        if m == _ENV:
+            if k != 'result':
+                self._push(None, isDict, _SKIP, None)
+                return
+            target = self._target(c)
+            if target is None:
+                self._push(None, isDict, _SKIP, None)
+                return
+            parent, key, merge, spec = target
+            existing = parent.get(key, None)
+            if merge and isinstance(existing, dict if isDict else list):
+                self._push(existing, isDict, _MERGE, spec)
+            else:
+                # Built off-model, stored when complete
+                self._push({} if isDict else [], isDict, _NEW, spec)
+                self._root = (parent, key)
+                self._rootDepth = len(self._m)
+            return
+        f = self._spec()
+        if f is None:
+            self._push(None, isDict, _SKIP, None)
+            return
+        new = {} if isDict else []
+        if m == _MERGE:
+            if self._d[-1]:
+                existing = c.get(k, None)
+            else:
+                existing = c[k] if k < len(c) else None
+            if isinstance(existing, dict if isDict else list):
+                self._push(existing, isDict, _MERGE, f)
+                return
+            self._change(new)
+        else:
+            if self._d[-1]:
+                c[k] = new
+            else:
+                c.append(new)
+        self._push(new, isDict, _NEW, f)
+
+    def _push(self, c, isDict, mode, spec):
+        self._c.append(c)
+        self._d.append(isDict)
+        self._k.append(None if isDict else 0)
+        self._m.append(mode)
+        self._f.append(spec)
+        self._state = _KEY if isDict else _VALUE
+
+    def _spec(self):
+        # The spec for the value in the current slot, None if it is not wanted
+        f = self._f[-1]
+        if f is True or f is None:
+            return f
+        return f.get(self._k[-1] if self._d[-1] else '[]', None)
+
+    def _close(self):
+        # The current container has ended
+        depth = len(self._m)
+        c = self._c.pop()
+        self._d.pop()
+        self._k.pop()
+        m = self._m.pop()
+        self._f.pop()
+        if depth == self._rootDepth:
+            self._heldRoot = (self._root[0], self._root[1], c)
+            self._root = None
+            self._rootDepth = 0
+        if not self._m:
+            # Envelope complete
+            self._commit()
+            self.envelope = c
+            self._state = _IDLE
+            self._bol = False
+            return
+        if self._m[-1] == _ENV and self._k[-1] == 'result':
+            self._c[-1]['result'] = c if m != _SKIP else None
+        self._next()
+
+    def _storeRoot(self, parent, key, value):
+        # Store a complete replacement result
+        if self._store is None:
+            parent[key] = value
+            self.touched += 1
+        else:
+            self.touched += self._store(parent, key, value)
+
+    def _change(self, value):
+        # The value in the current slot of the current container has changed,
+        # hold it until the response is complete
+        self.touched += 1
+        path = None
+        if self._changed is not None:
+            path = [self._c[0]['key']]
+            path.extend(self._k[1:])
+        self._held.append((self._c[-1], self._k[-1], value, path))
+
+    def _commit(self):
+        # The response is complete, write the held values to the model
+        for c, k, value, path in self._held:
+            if isinstance(c, list) and k == len(c):
+                c.append(value)
+            else:
+                c[k] = value
+            if path is not None:
+                self._changed(path, value)
+        self._held = []
+        if self._heldRoot is not None:
+            self._storeRoot(*self._heldRoot)
+            self._heldRoot = None
+
+    def _next(self):
+        # A value has been stored, advance list index
+        if not self._d[-1]:
+            self._k[-1] += 1
+        self._state = _NEXT
+
+    def _value(self, v):
+        # Store a scalar value in the current container
+        c = self._c[-1]
+        k = self._k[-1]
+        m = self._m[-1]
+        if m != _ENV and self._spec() is None:
+            pass
+        elif m == _NEW:
+            if self._d[-1]:
+                c[k] = v
+            else:
+                c.append(v)
+        elif m == _MERGE:
+            if self._d[-1] and k not in c:
+                self._change(v)
+            elif self._d[-1] or k < len(c):
+                if v is not None:
+                    old = c[k]
+                    if v != old or type(v) is not type(old):
+                        self._change(v)
+            else:
+                self._change(v)
+        elif m == _ENV:
+            if k == 'result':
+                target = self._target(c) if v is not None else None
+                if target is not None:
+                    self._heldRoot = (target[0], target[1], v)
+                    c[k] = v
+                else:
+                    c[k] = None
+            else:
+                c[k] = v
+        self._next()
+
+    def _wanted(self):
+        # Is the value being parsed going to be stored?
+        if self._spec() is None:
+            self._tlen = 0
+            self._next()
+            return False
+        return True
+
+    def _endString(self):
+        if self._isKey:
+            self._isKey = False
+            self._k[-1] = self._token()
+            self._state = _COLON
+        elif self._wanted():
+            self._value(self._token())
+
+    def _endNumber(self):
+        if self._wanted():
+            t = self._token()
+            self._value(float(t) if self._float else int(t))
+
+    def feed(self, buf, start, end):
+        '''
+            Parse the bytes in buf[start:end]; returns the index of the first
+            byte not consumed, parsing stops when an object is complete.
+        '''
+        i = start
+        while True:
+            try:
+                while i < end:
+                    b = buf[i]
+                    s = self._state
+                    if s == _STRING:
+                        if b == 34:                     # "
+                            self._endString()
+                        elif b == 92:                   # \
+                            self._state = _ESCAPE
+                        elif b == 10:
+                            self.abort()
+                            continue
+                        else:
+                            self._addByte(b)
+                    elif s == _NUMBER:
+                        if 48 <= b <= 57 or b == 45 or b == 43:
+                            self._addByte(b)
+                        elif b == 46 or b == 101 or b == 69:    # . e E
+                            self._float = True
+                            self._addByte(b)
+                        else:
+                            self._endNumber()
+                            continue                    # reprocess this byte
+                    elif s == _IDLE:
+                        if b == 123 and self._bol:      # {
+                            self._open(True)
+                        else:
+                            self._bol = (b == 10)
+                    elif s == _SKIPLINE:
+                        if b == 10:
+                            self._state = _IDLE
+                            self._bol = True
+                    elif b == 32 or b == 13 or b == 9:
+                        pass                            # whitespace
+                    elif b == 10:
+                        # JSON responses are always a single line
+                        self.abort()
+                        continue
+                    elif s == _VALUE:
+                        if b == 34:
+                            self._state = _STRING
+                        elif b == 123:
+                            self._open(True)
+                        elif b == 91:                   # [
+                            self._open(False)
+                        elif 48 <= b <= 57 or b == 45:
+                            self._float = False
+                            self._addByte(b)
+                            self._state = _NUMBER
+                        elif b == 116:                  # t
+                            self._lit, self._litWord = True, b'true'
+                            self._litPos = 1
+                            self._state = _LITERAL
+                        elif b == 102:                  # f
+                            self._lit, self._litWord = False, b'false'
+                            self._litPos = 1
+                            self._state = _LITERAL
+                        elif b == 110:                  # n
+                            self._lit, self._litWord = None, b'null'
+                            self._litPos = 1
+                            self._state = _LITERAL
+                        elif b == 93 and not self._d[-1]:   # ] (empty list)
+                            self._close()
+                        else:
+                            self.abort()
+                            continue
+                    elif s == _KEY:
+                        if b == 34:
+                            self._isKey = True
+                            self._state = _STRING
+                        elif b == 125:                  # } (empty dict)
+                            self._close()
+                            if self.envelope is not None:
+                                return i + 1
+                        else:
+                            self.abort()
+                            continue
+                    elif s == _COLON:
+                        if b == 58:
+                            self._state = _VALUE
+                        else:
+                            self.abort()
+                            continue
+                    elif s == _NEXT:
+                        if b == 44:                     # ,
+                            self._state = _KEY if self._d[-1] else _VALUE
+                        elif b == 125 or b == 93:       # } ]
+                            self._close()
+                            if self.envelope is not None:
+                                return i + 1
+                        else:
+                            self.abort()
+                            continue
+                    elif s == _LITERAL:
+                        if b != self._litWord[self._litPos]:
+                            self.abort()
+                            continue
+                        self._litPos += 1
+                        if self._litPos == len(self._litWord):
+                            self._value(self._lit)
+                    elif s == _ESCAPE:
+                        if b == 117:                    # u
+                            self._uni = 0
+                            self._uniLen = 4
+                            self._state = _UNICODE
+                        else:
+                            self._addByte(_ESCAPES.get(b, b))
+                            self._state = _STRING
+                    elif s == _UNICODE:
+                        self._uni = (self._uni << 4) + int(chr(b), 16)
+                        self._uniLen -= 1
+                        if self._uniLen == 0:
+                            for c in chr(self._uni).encode():
+                                self._addByte(c)
+                            self._state = _STRING
+                    i += 1
+                return i
+            except ValueError:
+                # A corrupted token (bad UTF-8, number or \u escape), the same
+                # as any other malformed line; discard it and resync
+                self.abort()
@@ -4,10 +4,11 @@ from time import sleep_ms, ticks_us, ticks_diff, ticks_add
 import _thread
 
 # Displays
+from gcPolicy import gcPolicy
 from ssd1306 import SSD1306_I2C
 from framebuf import FrameBuffer, MONO_VLSB
 path.append('fonts')
-from ezFBfont import ezFBfont
+from ezFBfont import ezFBfont, cache_size, cache_stats
 from ezFBmarquee import ezFBmarquee
 import ezFBfont_helvB10_ascii_15 as heading
 import ezFBfont_helvR08_ascii_11 as subhead
@@ -42,27 +43,44 @@ C_WRENCH = chr(282)
 
     Note: We use a seperate pair of 'Panel' framebuffers to draw the model
         data onto whenever we get an update.
-        This is then blitted onto the display framebuffers when it changes
-        and, with the marquee message panel, displayed by a fast animation
-        loop running on the second CPU
+        This is then blitted onto the display framebuffers when it changes.
+        The left display, with the marquee message panel, is displayed by a
+        fast animation loop running on the second CPU, the right display is
+        sent by the main loop as soon as the panels are drawn; the displays
+        are on seperate I2C buses so the two transfers overlap.
 '''
 
 
 class outputRRF:
     '''
         arguments:
-            None
+            collector : gcPolicy object, shared with serialOM, default: a new gcPolicy()
 
         methods:
-            update(model) : Updates the local model copy and
+            updatePanels(model, changed, hot) : Updates the local model copy and
                 returns a string with the human-readable machine state info.
-                Writes to logfile with timestamp if required.
+                The panels are only updated when 'changed' is True, eg when
+                serialOM.hasChanged(omPaths) shows something we display changed,
+                and each panel is only redrawn when what it shows (the rounded
+                values, icons and text) is different.
+                'hot' is the serialOM.hot arrays for the hotKeys, if used.
             showStatus(model) : Updates the local model copy and
                 returns a 'status' block.
                 Aimed at display devices to show extra info when triggered.
+            displayStats() : Returns a string with the average bytes sent to
+                the displays per animation frame, the average and longest
+                animation frame time, the time taken to send the right
+                display, the panels drawn out of those updated, and the
+                font glyph and line cache hits out of those drawn, since
+                the last call.
+
+        class attributes:
+            omKeys  : the ObjectModel keys to fetch for each mode, for serialOM
+            omPaths : the ObjectModel paths shown on the panels; printXIAO passes
+                      serialOM.hasChanged(omPaths) to updatePanels() as 'changed'
+            hotKeys : the numeric values read from the serialOM hot arrays
 
         properties:
-            omKeys  : see below
             running : (bool) set False if the output device fails
             standby : (bool) set True when the display is off
     '''
@@ -73,31 +91,64 @@ class outputRRF:
     #omKeys = {'FFF':['heat','tools','job','boards','network'],
     # CNC and Laser mode are not supported..but these are the
     # keys you would probably need (at present)
-    omKeys = {'FFF':['heat','tools','job','network'],
+    # FFF mode only fetches the values shown on the panels, see serialOM
+    omKeys = {'FFF':['heat.heaters[].current','heat.heaters[].active','heat.heaters[].standby',
+                     'heat.heaters[].state','heat.bedHeaters[]','heat.chamberHeaters[]',
+                     'tools[].heaters[]',
+                     'job.build.currentObject','job.filePosition','job.file.size',
+                     'network.interfaces[].type','network.interfaces[].state',
+                     'network.interfaces[].actualIP'],
               'CNC':['job','move','spindles','network'],
               'Laser':['job','move','network']}
 
-    def __init__(self):
+    # Numeric values that change constantly; serialOM keeps these in arrays
+    hotKeys = {'heat.heaters[].current':'f','heat.heaters[].active':'f',
+               'heat.heaters[].standby':'f','job.filePosition':'i','job.file.size':'i'}
+
+    # ObjectModel paths that are shown on the panels
+    omPaths = ['state.status','state.machineMode','state.displayMessage','state.messageBox',
+               'heat','tools','job.build','job.filePosition','job.file.size','network.interfaces']
+
+    def __init__(self, collector=None):
         self.standby = True
+        self._gc = gcPolicy() if collector is None else collector
         # internals
         self._OM = None
+        self._hot = {}
         self.running = False
         self.watchdog = ticks_us()
         self._sleep_delay = int(config.sleep_time * TIMESCALE)
         self._last_wakeup = ticks_us()
         self._state = ''
         self._message = ''
-        self._panels_updated = False
+        self._lpanel_updated = False
+        self._rpanel_updated = False
+        self._animating = False
+        self._redraw = True
+        self._text = ''
         self._show_decimal = {}
+        self._keys = {}       # what each panel shows, see _putModel()
+        self._renders = 0
+        self._skips = 0
         self._fail_count = 0
         self._notify = False
         # Init hardware
         self._initDisplays()
+        # display traffic and timing, for displayStats()
+        self._stat_frames = 0
+        self._stat_bytes = 0
+        self._frame_count = 0
+        self._frame_time = 0
+        self._frame_max = 0
+        self._right_time = 0
+        # Font glyph and line caches, shared by all the fonts
+        cache_size(config.font_cache, config.string_cache)
         # Marquee
         self._status_string = ''
         self._marquee = ezFBmarquee(self._left, heading, pause=config.marquee_pause)
-        # Threading lock for display
-        self._display_lock = _thread.allocate_lock()
+        # Threading locks for each display
+        self._left_lock = _thread.allocate_lock()
+        self._right_lock = _thread.allocate_lock()
         # Spare framebuffers used for on/off slide animation
         self._lbuf = FrameBuffer(bytearray(16 * 64), 128, 64, MONO_VLSB)
         self._rbuf = FrameBuffer(bytearray(16 * 64), 128, 64, MONO_VLSB)
@@ -167,6 +218,45 @@ class outputRRF:
         self._left.show()
         self._right.show()
 
+    def _flushRight(self):
+        # Blit the updated panels onto the right display and send it
+        start = ticks_us()
+        with self._right_lock:
+            if not self._rpanel_updated:
+                return
+            self._right.blit(self._rpanel,0,16)
+            self._right.blit(self._tpanel,0,0)
+            self._rpanel_updated = False
+            self._right.show()
+        self._right_time = ticks_diff(ticks_us(), start)
+
+    def displayStats(self):
+        # the displays only send the columns that changed, see ssd1306.show()
+        frames = self._left.frames
+        sent = self._left.total_bytes + self._right.total_bytes
+        count = frames - self._stat_frames
+        rate = (sent - self._stat_bytes) // count if count else 0
+        self._stat_frames = frames
+        self._stat_bytes = sent
+        count = self._frame_count
+        frame = self._frame_time / count / 1000 if count else 0
+        self._frame_count = 0
+        self._frame_time = 0
+        longest = self._frame_max / 1000
+        self._frame_max = 0
+        renders = self._renders
+        skips = self._skips
+        self._renders = 0
+        self._skips = 0
+        fonts = cache_stats(True)
+        glyphs = fonts['glyphs']
+        lines = fonts['lines']
+        return ('{} b/frame, {:.1f}/{:.1f} ms frame, {:.1f} ms right, {}/{} drawn, '
+                '{}/{} glyphs, {}/{} lines').format(
+                rate, frame, longest, self._right_time / 1000, renders, renders + skips,
+                glyphs['hits'], glyphs['hits'] + glyphs['misses'],
+                lines['hits'], lines['hits'] + lines['misses'])
+
     def _powerOn(self):
         self._left.poweron()
         self._right.poweron()
@@ -189,9 +279,23 @@ class outputRRF:
         self._lpanel.fill(0)
         self._rpanel.fill(0)
 
+    def _invalidate(self):
+        # The displays were blanked or overwritten outside updatePanels(),
+        # redraw every panel on the next update even if nothing has changed
+        self._keys = {}
+        self._redraw = True
+
     def _swipeOn(self):
-        with self._display_lock:
+        with self._left_lock, self._right_lock:
             self._powerOn()
+            # bring in any panels drawn since the displays were last sent
+            if self._lpanel_updated:
+                self._left.blit(self._lpanel,0,16)
+                self._lpanel_updated = False
+            if self._rpanel_updated:
+                self._right.blit(self._rpanel,0,16)
+                self._right.blit(self._tpanel,0,0)
+                self._rpanel_updated = False
             s = 32
             self._lbuf.blit(self._left,0,0)
             self._rbuf.blit(self._right,0,0)
@@ -205,7 +309,7 @@ class outputRRF:
             self._show()
 
     def _swipeOff(self):
-        with self._display_lock:
+        with self._left_lock, self._right_lock:
             s = 32
             for x in range(0, 129, 8):
                 self._left.scroll(s, 0)
@@ -236,13 +340,12 @@ class outputRRF:
         def panels():
             '''
                 Run by the animation loop (in a seperate thread on second CPU)
-                - blits the contents of the update panels onto the main display
+                - blits the contents of the left update panel onto the left display
+                - the right display is sent by the main loop, see _flushRight()
             '''
-            if self._panels_updated:
+            if self._lpanel_updated:
                 self._left.blit(self._lpanel,0,16)
-                self._right.blit(self._rpanel,0,16)
-                self._right.blit(self._tpanel,0,0)
-                self._panels_updated = False
+                self._lpanel_updated = False
 
         def status():
             '''
@@ -266,23 +369,32 @@ class outputRRF:
             '''
             if self._notify:
                 self._notify = False
-                self._left.invert(not config.display_invert)
-                self._right.invert(not config.display_invert)
-                sleep_ms(50)
-                self._left.invert(config.display_invert)
-                self._right.invert(config.display_invert)
-
+                with self._right_lock:
+                    self._left.invert(not config.display_invert)
+                    self._right.invert(not config.display_invert)
+                    sleep_ms(50)
+                    self._left.invert(config.display_invert)
+                    self._right.invert(config.display_invert)
+
+        # Send any panels drawn before the animator started
+        self._animating = True
+        self._flushRight()
         # Start the animation loop
         while ticks_diff(ticks_us(), self.watchdog) < int(config.display_watchdog * TIMESCALE):
             lastFrame = ticks_us()
-            with self._display_lock:
+            with self._left_lock:
                 panels()
                 status()
-                self._show()
+                self._left.show()
+                frame = ticks_diff(ticks_us(), lastFrame)
                 notify()
+            self._frame_count += 1
+            self._frame_time += frame
+            self._frame_max = max(self._frame_max, frame)
             while ticks_diff(ticks_us(), lastFrame) < int(config.animation_interval * TIMESCALE):
                 sleep_ms(1)
         # The loop exits if the watchdog timer is exceeded
+        self._animating = False
         self.running = False
         self.showError('Main Loop\nExited', 'Display\nStopped')
         print('Animator exiting due to watchdog')
@@ -295,11 +407,13 @@ class outputRRF:
         if self.standby or force:
             self._swipeOn()
             self.standby = False
+            self._invalidate()
 
     def off(self):
         if not self.standby:
             self._swipeOff()
             self.standby = True
+            self._invalidate()
 
     def awake(self, awake=config.sleep_time):
         # sets the delay until we go to sleep and notes when this was updated
@@ -315,15 +429,17 @@ class outputRRF:
         self._left_fonts['message'].write('PrintPy\n2040', 63, 16, halign='center')
         self._right_fonts['message'].write('by Owen    ', 63, 16, halign='center')
         self._right_fonts['heading'].write('easytarget.org', 0, 36)
+        self._invalidate()
         self.on(True)
 
     def showError(self, ltext, rtext):
-        with self._display_lock:
+        with self._left_lock, self._right_lock:
             self._clean()
             self._left_fonts['message'].write(ltext, 63, 16, halign='center')
             self._right_fonts['message'].write(rtext, 63, 16, halign='center')
             self._powerOn()
             self._show()
+        self._invalidate()
 
     def updateFail(self, count):
         ptext = 'Attempt: {:g}'.format(count)
@@ -331,29 +447,44 @@ class outputRRF:
         htext += 'is running correctly; and that all wiring is secure.'
         if self._marquee.string != htext:
             self._status_string = htext
+        # Clear the displays when first called, before the panels are sent
+        if count == config.fail_count:
+            with self._left_lock, self._right_lock:
+                self._clean()
+            self.awake(config.long_awake)
         self._cleanPanels()
         self._tpanel_fonts['subhead'].write(ptext, 63, 2, halign = 'center')
         self._lpanel_fonts['message'].write('Connection', 63, 8, halign='center')
         self._rpanel_fonts['message'].write('Failed', 63, 8, halign='center')
-        self._panels_updated = True
-        # Turn screen on when first called
-        if count == config.fail_count:
-            self._clean()
-            self.awake(config.long_awake)
+        self._lpanel_updated = True
+        self._rpanel_updated = True
+        self._invalidate()
+        if self._animating:
+            self._flushRight()
         self._awakeOnOff()
 
-    def updatePanels(self, model):
+    def updatePanels(self, model, changed=True, hot=None):
         # Update the local model
         self._OM = model
-        # Put the model data on panels
-        out = self._putModel()
-        self._panels_updated = True
-        # Set the string for the marquee
-        self._status_string = self._state + self._message
+        if hot is not None:
+            self._hot = hot
+        if changed or self._redraw:
+            # Put the model data on the panels that changed
+            self._text = self._putModel()
+            # send the right display now, the animator sends the left
+            if self._animating:
+                self._flushRight()
+            self._redraw = False
+            # Set the string for the marquee
+            self._status_string = self._state + self._message
+            # cleanup after drawing, if needed
+            self._gc.check()
         # Turn screen on/off as needed
         self._awakeOnOff()
-        # Return the last generated status line
-        return out + '\n'
+        # Return the last generated status line, with current uptime
+        if self._OM is None:
+            return self._text + '\n'
+        return 'Up: {}'.format(self._dhms(self._OM['state']["upTime"])) + self._text + '\n'
 
     '''
         All the routines below tediously walk/grok the OM and update the
@@ -368,25 +499,48 @@ class outputRRF:
         if self._OM is None:
             # No data == no viable output
             return('No data available')
-        # clean the panel display area
-        self._cleanPanels()
-        # Construct panels and the results string
-        r = 'Up: {}'.format(self._dhms(self._OM['state']["upTime"]))
-        r += self._getStatus()
-        if self._state in ['Halted','Updating','Starting']:
-            return r   # Nothing to output, model may be incomplete
-        r += self._putJob()
-        if self._OM['state']['machineMode'] == 'FFF':
-            self._putFFF()
-        else:
-            mode = self._OM['state']['machineMode']
-            self._lpanel_fonts['message'].write('\'{}\'\nmode'.format(mode), 63, 6, halign='center')
-            self._rpanel_fonts['message'].write('not yet\nsupported', 63, 6, halign='center')
-            r += ', Unsupported mode: {}'.format(mode)
-        m = self._putMessages()
-        r += self._putNetwork()
+        # Work out what each panel shows, and the results string
+        r = self._getStatus()
+        top = left = right = ()
+        if self._state not in ['Halted','Updating','Starting']:
+            # (otherwise there is nothing to output, model may be incomplete)
+            job, t = self._getJob()
+            r += t
+            if self._OM['state']['machineMode'] == 'FFF':
+                left, right = self._getFFF()
+            else:
+                mode = self._OM['state']['machineMode']
+                left = (('text', '\'{}\'\nmode'.format(mode)),)
+                right = (('text', 'not yet\nsupported'),)
+                r += ', Unsupported mode: {}'.format(mode)
+            m = self._putMessages()
+            net, t = self._getNetwork()
+            r += t + m
+            top = (job, net)
+        # Draw the panels that show something new
+        if self._newKey('top', top):
+            self._tpanel.fill(0)
+            self._drawTop(*top)
+            self._rpanel_updated = True
+        if self._newKey('left', left):
+            self._lpanel.fill(0)
+            self._drawHeaters(self._lpanel_fonts, left)
+            self._lpanel_updated = True
+        if self._newKey('right', right):
+            self._rpanel.fill(0)
+            self._drawHeaters(self._rpanel_fonts, right)
+            self._rpanel_updated = True
         # return the console text line
-        return r + m
+        return r
+
+    def _newKey(self, panel, key):
+        # The key is exactly what the panel shows, True if it needs redrawing
+        if self._keys.get(panel, None) == key:
+            self._skips += 1
+            return False
+        self._keys[panel] = key
+        self._renders += 1
+        return True
 
     def _getStatus(self):
         state = self._OM['state']["status"]
@@ -407,11 +561,12 @@ class outputRRF:
         self._message = r.replace('|',':')
         return r
 
-    def _putNetwork(self):
+    def _getNetwork(self):
+        # Returns the network (icon, text) to show, and the status text
         if config.net is None:
-            return ''
+            return None, ''
         if len(self._OM['network']['interfaces']) == 0:
-            return ' | Offline'
+            return None, ' | Offline'
         interface = self._OM['network']['interfaces'][config.net]
         net = '{}: {}'.format(interface['type'],
                              interface['state'])
@@ -425,64 +580,107 @@ class outputRRF:
             icon = C_STANDBY
         else:
             icon = C_WARN
-        self._tpanel_fonts['icons'].write(icon, 112, 0, halign = 'left')
-        if not self._OM['job']['build']:
-            self._tpanel_fonts['subhead'].write(net, 108, 2, halign = 'right')
-        return ' | {}'.format(net)
-
-    def _putJob(self):
-        # Job progress
+        return (icon, None if self._OM['job']['build'] else net), ' | {}'.format(net)
+
+    def _hotValue(self, path, index, *keys):
+        # A value from the hot arrays if we have it, otherwise from the model
+        if path in self._hot and index < len(self._hot[path]):
+            return self._hot[path][index]
+        value = self._OM
+        for key in keys:
+            value = value[key]
+        return value
+
+    def _getJob(self):
+        # Returns the job progress to show, and the status text
         if self._OM['job']['build']:
             try:
-                percent = self._OM['job']['filePosition'] / self._OM['job']['file']['size'] * 100
+                percent = self._hotValue('job.filePosition', 0, 'job', 'filePosition') / \
+                          self._hotValue('job.file.size', 0, 'job', 'file', 'size') * 100
             except ZeroDivisionError:  # file size can be reported as Zero during job start
                 percent = 0
             job_line = '{:.1f}'.format(percent) if percent < 100 else '100'
-            xoff, _ = self._tpanel_fonts['s_minor'].size(job_line)
-            self._tpanel_fonts['s_minor'].write(job_line, 0, 14)
+            return job_line, ' | Job: {}%'.format(job_line)
+        return None, ''
+
+    def _drawTop(self, job, net):
+        # Job progress and network status
+        if job is not None:
+            xoff, _ = self._tpanel_fonts['s_minor'].size(job)
+            self._tpanel_fonts['s_minor'].write(job, 0, 14)
             self._tpanel_fonts['heading'].write('%', xoff+2, 4)
-            return ' | Job: {}%'.format(job_line)
-        return ''
-
-    def _putFFF(self):
+        if net is not None:
+            icon, text = net
+            self._tpanel_fonts['icons'].write(icon, 112, 0, halign = 'left')
+            if text is not None:
+                self._tpanel_fonts['subhead'].write(text, 108, 2, halign = 'right')
+
+    def _getFFF(self):
+        # Returns what the left (extruder) and right (bed and chamber) panels show
         # a local function to return state and temperature details for a heater
-        def showHeater(number, name, icon, display, position):
+        def showHeater(number, name, icon, position):
             if name not in self._show_decimal.keys():
                 self._show_decimal[name] = False
             if self._OM['heat']['heaters'][number]['state'] == 'fault':
-                panelfault(name, display, position)
-                return
-            else:
-                temp = self._OM['heat']['heaters'][number]['current']
-                val = int(temp)
-                dec = abs(int((temp - val) * 10))
-                # Note the following, it builds hysterisys into turning decimal display on/off
-                if temp >= 100 or temp <= -10:
-                    self._show_decimal[name] = False
-                elif temp <= 90 and temp >= -9:
-                    self._show_decimal[name] = True
-                if self._OM['heat']['heaters'][number]['state'] == 'active':
-                    target = '{}°'.format(int(self._OM['heat']['heaters'][number]['active']))
-                elif self._OM['heat']['heaters'][number]['state'] == 'standby':
-                    target = '({}°)'.format(int(self._OM['heat']['heaters'][number]['standby']))
-                    icon = ''
-                else:  # heater is off
-                    target = ''
-                    icon = ''
-            # Display in correct position
-            if position == 'full':
-                panelfull(name, icon, target, val, dec, display)
-            elif position == 'upper':
-                panelhalf(name, icon, target, val, dec, display, True)
-            elif position == 'lower':
-                panelhalf(name, icon, target, val, dec, display, False)
-
-        def panelfull(name, icon, target, val, dec, panel_fonts):
+                return ('fault', name, position)
+            temp = self._hotValue('heat.heaters[].current', number,
+                                  'heat', 'heaters', number, 'current')
+            val = int(temp)
+            dec = abs(int((temp - val) * 10))
+            # Note the following, it builds hysterisys into turning decimal display on/off
+            if temp >= 100 or temp <= -10:
+                self._show_decimal[name] = False
+            elif temp <= 90 and temp >= -9:
+                self._show_decimal[name] = True
+            if self._OM['heat']['heaters'][number]['state'] == 'active':
+                target = '{}°'.format(int(self._hotValue('heat.heaters[].active', number,
+                                               'heat', 'heaters', number, 'active')))
+            elif self._OM['heat']['heaters'][number]['state'] == 'standby':
+                target = '({}°)'.format(int(self._hotValue('heat.heaters[].standby', number,
+                                                 'heat', 'heaters', number, 'standby')))
+                icon = ''
+            else:  # heater is off
+                target = ''
+                icon = ''
+            decimal = self._show_decimal[name]
+            return ('heater', name, icon, target, val, dec if decimal else 0, decimal, position)
+
+        extruders = []
+        heaters = []
+        # Extruders (tools)
+        if len(self._OM['tools']) > 0:
+            for index, tool in enumerate(self._OM['tools']):
+                if len(tool['heaters']) > 0:
+                    # only record the first heater for each tool
+                    extruders.append((tool['heaters'][0], 'E' + str(index), C_TOOL))
+        # Bed and Chamber, only take first of each!
+        if len(self._OM['heat']['bedHeaters']) > 0:
+            if self._OM['heat']['bedHeaters'][0] != -1:
+                heaters.append((self._OM['heat']['bedHeaters'][0], 'bed', C_BED))
+        if len(self._OM['heat']['chamberHeaters']) > 0:
+            if self._OM['heat']['chamberHeaters'][0] != -1:
+                heaters.append((self._OM['heat']['chamberHeaters'][0], 'enc', C_ENCL))
+        '''This is how to add fake devices for testing multi-panel stuff..
+        extruders.append((extruders[0][0],'E1',C_TOOL))
+        heaters.append((heaters[0][0],'encl',C_ENCL))'''
+        def panel(found, missing):
+            # Display the heaters (max 2)
+            if len(found) == 0:
+                return (('missing', missing),)
+            if len(found) == 1:
+                return (showHeater(*found[0], 'full'),)
+            return (showHeater(*found[0], 'upper'), showHeater(*found[1], 'lower'))
+
+        return panel(extruders, 'no extruders?'), panel(heaters, 'no heaters?')
+
+    def _drawHeaters(self, panel_fonts, items):
+        # Draws the heaters (or messages) for a panel, as returned by _getFFF()
+        def panelfull(name, icon, target, val, dec, decimal):
                 # Full panel heater display
                 panel_fonts['heading'].write(name, 0, 0)
                 panel_fonts['target'].write(target, 1, 17)
                 panel_fonts['icons'].write(icon,2,32)
-                if self._show_decimal[name]:
+                if decimal:
                     panel_fonts['s_minor'].write('°', 102, 16)
                     panel_fonts['s_major'].write('{}'.format(val), 106, 45)
                     panel_fonts['s_minor'].write('.{:01d}'.format(dec), 104, 45)
@@ -490,13 +688,13 @@ class outputRRF:
                     panel_fonts['s_minor'].write('°', 119, 15)
                     panel_fonts['s_major'].write('{}'.format(val), 127, 45)
 
-        def panelhalf(name, icon, target, val, dec, panel_fonts, top):
+        def panelhalf(name, icon, target, val, dec, decimal, top):
                 # Half panel heater display
                 y = 0 if top else 24
                 panel_fonts['heading'].write(name, 0, y)
                 panel_fonts['target'].write(target, 1, y + 14)
                 panel_fonts['icons'].write(icon, 38, y + 4)
-                if self._show_decimal[name]:
+                if decimal:
                     panel_fonts['d_minor'].write('°', 108, y + 10)
                     panel_fonts['d_major'].write('{}'.format(val), 108, y + 19)
                     panel_fonts['d_minor'].write('.{:01d}'.format(dec), 108, y + 19)
@@ -504,8 +702,7 @@ class outputRRF:
                     panel_fonts['d_minor'].write('°', 121, y + 10)
                     panel_fonts['d_major'].write('{}'.format(val), 121, y + 19)
 
-
-        def panelfault(name, panel_fonts, position):
+        def panelfault(name, position):
                 # Display 'fault!' in a heater panel
                 if position == 'upper':
                     panel_fonts['message'].write('{} FAULT'.format(name), 18, 2)
@@ -518,41 +715,17 @@ class outputRRF:
                     panel_fonts['icons'].write(C_BOLT, 0, 14)
                     panel_fonts['message'].write('FAULT', 21, 26)
 
-        extruders = []
-        heaters = []
-        # Extruders (tools)
-        if len(self._OM['tools']) > 0:
-            for tool in self._OM['tools']:
-                if len(tool['heaters']) > 0:
-                    # only record the first heater for each tool
-                    extruders.append((tool['heaters'][0],
-                                      'E' + str(self._OM['tools'].index(tool)), C_TOOL))
-        # Bed and Chamber, only take first of each!
-        if len(self._OM['heat']['bedHeaters']) > 0:
-            if self._OM['heat']['bedHeaters'][0] != -1:
-                heaters.append((self._OM['heat']['bedHeaters'][0], 'bed', C_BED))
-        if len(self._OM['heat']['chamberHeaters']) > 0:
-            if self._OM['heat']['chamberHeaters'][0] != -1:
-                heaters.append((self._OM['heat']['chamberHeaters'][0], 'enc', C_ENCL))
-        '''This is how to add fake devices for testing multi-panel stuff..
-        extruders.append((extruders[0][0],'E1',C_TOOL))
-        heaters.append((heaters[0][0],'encl',C_ENCL))'''
-        # Display extruder heaters (max 2)
-        if len(extruders) == 0:
-            self._lpanel_fonts['icons'].write(C_WARN, 64, 2, halign='center')
-            self._lpanel_fonts['message'].write('no extruders?', 64, 22, halign='center')
-        if len(extruders) == 1:
-            showHeater(*extruders[0], self._lpanel_fonts, 'full')
-        if len(extruders) >= 2:
-            showHeater(*extruders[0], self._lpanel_fonts, 'upper')
-            showHeater(*extruders[1], self._lpanel_fonts, 'lower')
-
-        # Display bed and chamber heaters
-        if len(heaters) == 0:
-            self._rpanel_fonts['icons'].write(C_WARN, 64, 2, halign='center')
-            self._rpanel_fonts['message'].write('no heaters?', 64, 22, halign='center')
-        if len(heaters) == 1:
-            showHeater(*heaters[0], self._rpanel_fonts, 'full')
-        if len(heaters) >= 2:
-            showHeater(*heaters[0], self._rpanel_fonts, 'upper')
-            showHeater(*heaters[1], self._rpanel_fonts, 'lower')
+        for item in items:
+            if item[0] == 'heater':
+                position = item[-1]
+                if position == 'full':
+                    panelfull(*item[1:-1])
+                else:
+                    panelhalf(*item[1:-1], position == 'upper')
+            elif item[0] == 'fault':
+                panelfault(*item[1:])
+            elif item[0] == 'missing':
+                panel_fonts['icons'].write(C_WARN, 64, 2, halign='center')
+                panel_fonts['message'].write(item[1], 64, 22, halign='center')
+            elif item[0] == 'text':
+                panel_fonts['message'].write(item[1], 63, 6, halign='center')
@@ -1,5 +1,6 @@
 # Import our local classes and config
 from serialOM import serialOM
+from gcPolicy import gcPolicy
 from outputI2Cx2 import outputRRF
 from lumenXIAO import lumen
 from heartbeatXIAO import heartbeat
@@ -7,7 +8,7 @@ from config import config
 
 # The microPython standard libs
 from sys import exit
-from gc import collect, mem_free
+from gc import mem_free
 from machine import reset
 from time import sleep_ms, ticks_us, ticks_diff, ticks_add, localtime
 
@@ -139,6 +140,9 @@ except:
 # Always log that we are starting to console.
 print('printXIAO is starting')
 
+# Garbage collection policy, shared by everything
+gcp = gcPolicy()
+
 # LEDs
 if config.mood:
     mood = lumen(config.mood_bright, config.mood_standby, config.mood_flash)
@@ -159,7 +163,7 @@ rrf.flush()
 
 # Get output/display device, hard fail if not available
 pp('starting output')
-out = outputRRF()
+out = outputRRF(gcp)
 if not out.running:
     hardFail('Failed to start output device')
 out.splash()
@@ -173,7 +177,8 @@ while rrf.any():
 
 # create the OM handler and get initial status
 try:
-    OM = serialOM(rrf, out.omKeys, quiet=config.verbose, noCheck=True)
+    OM = serialOM(rrf, out.omKeys, quiet=config.verbose, noCheck=True, collector=gcp,
+                  warmStart=config.warm_start, hot=out.hotKeys)
 except Exception as e:
     restartNow('Failed to start ObjectModel communications\n' + str(e),
                'Connection\nError')
@@ -194,10 +199,11 @@ if config.button is not None:
 
 # Show initial mood
 if config.mood:
-    mood.blink(mood.emote(OM.model, config.net), out.standby, True)
+    feeling = mood.emote(OM.model, config.net)
+    mood.blink(feeling, out.standby, True)
 
 # Put initial data into panels (it wont be displayed until splash ends)
-out.updatePanels(OM.model)
+out.updatePanels(OM.model, hot=OM.hot)
 
 # pause for splash timeout
 while ticks_diff(ticks_us(), splashend) < 0:
@@ -227,27 +233,32 @@ while True:
     if config.heart:
         heart.beat(out.standby)
     have_data = False
+    gc_count = gcp.collections
     om_start = ticks_us()
     try:
         have_data = OM.update()
     except Exception as e:
         restartNow('Error while fetching machine state\n' + str(e),'Communication\nError')
     om_end = ticks_us()
-    collect()
     # bump the marquee thread watchdog
     out.watchdog = ticks_us()
     # output the results if successful
     if have_data:
         fail_count = 0
         if config.mood:
-            mood.blink(mood.emote(OM.model, config.net), out.standby, True)
+            # only re-evaluate the mood when the model data it uses changes
+            if OM.hasChanged(mood.omPaths):
+                feeling = mood.emote(OM.model, config.net)
+            mood.blink(feeling, out.standby, True)
         # pass the results to the output module and recieve status line
-        outputText = out.updatePanels(OM.model)
-        # cleanup after output (display) loop
-        collect()
+        # - the panels are only redrawn if something they show has changed
+        outputText = out.updatePanels(OM.model, OM.hasChanged(out.omPaths), OM.hot)
         if config.stats:
             om_time = int(ticks_diff(om_end, om_start) / 1000)    # report in ms
-            stats = '[{} ms, {} b] '.format(om_time, str(mem_free()))
+            stats = '[{} ms, {} b, {} chg, {} gc, {}] '.format(om_time, str(mem_free()),
+                                                              len(OM.changed),
+                                                              gcp.collections - gc_count,
+                                                              out.displayStats())
             outputText = stats + outputText
         if config.info:
             print('{}'.format(outputText.strip()))
@@ -263,7 +274,9 @@ while True:
         restartNow('Output (display) device has failed','Output\nFailing')
     # is the button being long-pressed?
     button_time =  buttonLong(button_time)
-    ## Request cycle ended, wait for next whilst checking for long button press
+    ## Request cycle ended, collect if needed while we have time
+    gcp.check()
+    # wait for next whilst checking for long button press
     while ticks_diff(ticks_us(), next_update) < 0:
         button_time = buttonLong(button_time)
         sleep_ms(10)
@@ -1,6 +1,8 @@
 from sys import implementation
-from json import loads
-from gc import collect
+from json import loads, load, dump
+from os import rename
+from array import array
+from gcPolicy import gcPolicy
 
 # CPython / MicroPython compatibility:
 # Try to import fast native library, otherwise define a local version
@@ -23,35 +25,6 @@ except:
 
 # Standard CPython functions that are not native to Micropython.
 # - provided here for cross-compatibility
-def zip_longest(*args, fillvalue=None):
-    # Adapted from: https://docs.python.org/3/library/itertools.html#itertools.zip_longest
-    def repeat(object, times=None):
-        # repeat(10, 3) --> 10 10 10
-        if times is None:
-            while True:
-                yield object
-        else:
-            for i in range(times):
-                yield object
-    # zip_longest('ABCD', 'xy', fillvalue='-') --> Ax By C- D-
-    iterators = [iter(it) for it in args]
-    num_active = len(iterators)
-    if not num_active:
-        return
-    while True:
-        values = []
-        for i, it in enumerate(iterators):
-            try:
-                value = next(it)
-            except StopIteration:
-                num_active -= 1
-                if not num_active:
-                    return
-                iterators[i] = repeat(fillvalue)
-                value = fillvalue
-            values.append(value)
-        yield tuple(values)
-
 def reduce(function, iterable, initializer=None):
     it = iter(iterable)
     if initializer is None:
@@ -63,6 +36,178 @@ def reduce(function, iterable, initializer=None):
     return value
 
 
+# microPython json.loads() will load directly from any buffer (eg: a memoryview
+# of the line buffer), CPython needs a copy as bytes
+if implementation.name == 'micropython':
+    _loads = loads
+else:
+    def _loads(buf):
+        return loads(bytes(buf))
+
+
+# Per key statistics, a fixed size array of counters and histogram buckets
+# for each request key; see serialOM.stats()
+_REQUESTS = 0   # requests sent
+_VERBOSE = 1    # verbose requests
+_FREQUENT = 2   # frequent requests
+_BYTES = 3      # response bytes recieved
+_PARSE = 4      # time spent parsing responses, μs
+_MERGE = 5      # time spent merging responses into the model, μs
+_TIMEOUTS = 6   # requests that timed out
+_OUTOFSEQ = 7   # responses recieved when another key was expected
+_LATENCY = 8    # response time histogram, powers of two from 1024μs
+_SIZE = 18      # response size histogram, powers of two from 64 bytes
+_BUCKETS = 10
+_STATLEN = 28
+_COUNTERS = ('requests', 'verbose', 'frequent', 'bytes', 'parse', 'merge', 'timeouts',
+             'outOfSequence')
+_STATMAX = 0xFFFFFFFF   # the counters stop here, they never wrap
+
+def _count(stat, i, n=1):
+    # Add n to a statistics counter, saturating at _STATMAX
+    n += stat[i]
+    stat[i] = n if n < _STATMAX else _STATMAX
+
+def _bucket(value, shift):
+    # Histogram bucket for value; 0 is < (1 << shift), each bucket doubles
+    value >>= shift
+    i = 0
+    while value and i < _BUCKETS - 1:
+        value >>= 1
+        i += 1
+    return i
+
+
+# In-place merging of object model data
+def merge(a, b, prune=False, changed=None, path=None):
+    '''
+        Merge b into a, in place, where both are dicts or both are lists.
+        Only the leaves that differ are written, unchanged values cause no
+        allocations. 'None' never overwrites an existing value, lists are
+        merged by index and extended if b is longer.
+        If prune is True the result is an exact copy of b; None values are
+        written, keys that are not in b are removed and lists truncated.
+        If 'changed' is given it is called with the 'path' list of keys and
+        indexes to each leaf that is changed, and the new value (None if it
+        was removed).
+        Returns the number of leaves changed, an added or replaced
+        container counts as a single leaf.
+    '''
+    n = 0
+    if isinstance(b, dict):
+        for k in b:
+            n += mergeKey(a, k, b[k], prune, changed, path)
+        if prune and len(a) > len(b):
+            for k in [k for k in a if k not in b]:
+                del a[k]
+                n += _changed(k, changed, path, None)
+    else:
+        la = len(a)
+        for i in range(len(b)):
+            if i < la:
+                n += mergeKey(a, i, b[i], prune, changed, path)
+            else:
+                a.append(b[i])
+                n += _changed(i, changed, path, b[i])
+        if prune:
+            while len(a) > len(b):
+                a.pop()
+                n += _changed(len(a), changed, path, None)
+    return n
+
+def mergeKey(a, k, v, prune=False, changed=None, path=None):
+    # Merge the value v into a[k], returns the number of leaves changed
+    if isinstance(a, dict) and k not in a:
+        a[k] = v
+        return _changed(k, changed, path, v)
+    old = a[k]
+    if isinstance(v, dict):
+        if isinstance(old, dict):
+            return _mergeIn(old, v, k, prune, changed, path)
+    elif isinstance(v, list):
+        if isinstance(old, list):
+            return _mergeIn(old, v, k, prune, changed, path)
+    elif (v is None and not prune) or (v == old and type(v) is type(old)):
+        return 0
+    a[k] = v
+    return _changed(k, changed, path, v)
+
+def _mergeIn(a, b, k, prune, changed, path):
+    # merge() the container b into a, which is at 'k' in the path
+    if changed is None:
+        return merge(a, b, prune)
+    path.append(k)
+    n = merge(a, b, prune, changed, path)
+    path.pop()
+    return n
+
+def _changed(k, changed, path, value):
+    # Report the change of the leaf at 'k' in the path
+    if changed is not None:
+        path.append(k)
+        changed(path, value)
+        path.pop()
+    return 1
+
+def project(value, spec):
+    '''
+        Remove everything from value that is not in the (compiled) spec, in
+        place. The spec is True to keep everything, or a dict of the keys to
+        keep and their specs, '[]' is the spec for every item in a list.
+    '''
+    if spec is True or value is None:
+        return value
+    if isinstance(value, dict):
+        for k in [k for k in value if k not in spec]:
+            del value[k]
+        for k in value:
+            project(value[k], spec[k])
+    elif isinstance(value, list):
+        item = spec.get('[]', None)
+        if item is None:
+            del value[:]
+        else:
+            for v in value:
+                project(v, item)
+    return value
+
+def pathTokens(path):
+    # Splits a model path into keys: 'tools[].heaters[]' -> ['tools', '[]', 'heaters', '[]']
+    tokens = []
+    for part in path.split('.'):
+        items = 0
+        while part.endswith('[]'):
+            part = part[:-2]
+            items += 1
+        tokens.append(part)
+        tokens.extend(['[]'] * items)
+    return tokens
+
+def pathString(path):
+    # Converts a list of keys and indexes to a model path: 'heat.heaters[1].current'
+    p = ''
+    for k in path:
+        if isinstance(k, int):
+            p += '[' + str(k) + ']'
+        else:
+            p += '.' + k if p else k
+    return p
+
+def pathMatch(changed, paths):
+    '''
+        True if any of the model paths in 'changed' is the same as, inside,
+        or contains any of the model paths given in 'paths'
+    '''
+    for c in changed:
+        for p in paths:
+            if c.startswith(p):
+                if len(c) == len(p) or c[len(p)] in '.[':
+                    return True
+            elif p.startswith(c) and p[len(c)] in '.[':
+                return True
+    return False
+
+
 '''
     General note:
     This class is designd to run on either CPython (with PySerial) or on
@@ -118,29 +263,138 @@ class serialOM:
         init arguments:
             rrf :           PySerial or micropython UART object, required
             omKeys:         dict; per-mode lists of keys to sync, required, see below
-            rawLog:         file object; where to write the raw log, default: None
+            rawLog:         file object; where to write the raw log, wrap it in a
+                                timedLog (see timedLog.py) to timestamp it, default: None
             quiet:          bool; suppress messages on startup and when soft errors
                                 are encountered, default: True
             noCheck:        bool; skip firmware (M115) check, default: False
+            stream:         bool; parse M409 responses directly from the serial stream
+                                into the local model as they arrive (see omStream.py),
+                                instead of reading, decoding and loading whole lines.
+                                Requires a device with readinto() and any()/in_waiting,
+                                default: False
+            pipeline:       int; maximum number of M409 requests in flight during an
+                                update. The state and per-mode key requests are sent
+                                back-to-back and the responses matched by their key.
+                                1 sends each request and waits for it's response,
+                                default: 1
+            snapshot:       list; machine modes where update() fetches all the frequent
+                                values in a single M409 K"" request, followed by
+                                verbose requests for just the keys whose seqs changed.
+                                eg: ['FFF'], default: [] (per key requests in all modes)
+            collector:      gcPolicy object; decides when to garbage collect, share this
+                                with the rest of the program, default: a new gcPolicy()
+            adaptive:       bool; poll each key at it's own interval, keys that are not
+                                changing are polled less often, see below. Keys with
+                                new verbose data, seqs and state are fetched every
+                                update(), default: False
+            warmStart:      string; file where a snapshot of the model and seqs is saved,
+                                and restored from on start, see below. default: None
+            hot:            dict; numeric model values to keep in compact typed arrays
+                                as well as the model, see below. default: None
 
             Specifying the data to fetch:
                 omKeys = {'machineMode':['OMkey1','OMkey2',..],etc..}
                          Empty lists [] are allowed.
                          At least one machineMode must be specified.
 
+                Keys can be whole top level keys: 'heat', or paths to the
+                individual values needed: 'heat.heaters[].current', where '[]'
+                means 'every item in this list'. A path that ends in a list of
+                values (not objects) should end with '[]': 'heat.bedHeaters[]'.
+                All paths for a key are fetched with a single M409 request using
+                their longest common prefix as the key and just enough depth to
+                reach the values, everything else in the response is discarded.
+                eg: ['job.filePosition','job.file.size'] -> M409 K"job" F"..d2"
+                A path that ends at an object only reaches it's own values, the
+                lists and objects inside it are empty: 'job.build' gets the
+                currentObject but 'objects':[].
+                The 'state' key is always fetched in full.
+
         methods:
             sendGcode(code):         Sends a Gcode to controller and returns immediately.
-            getResponse(code,json):  Sends a Gcode and waits for a response.
+            getResponse(code,json,timeout,quiet):
+                                     Sends a Gcode and waits for a response.
                                      If 'json' is True it will exit as soon as a json
                                      line is seen, and only returns that line.
                                      Otherwise returns the response as a list of lines until
                                      the read timeout. No response returns an empty list
+                                     Optional 'timeout' is the time to wait for the first
+                                     line, and 'quiet' the time to wait for further lines,
+                                     int(μs), defaults are the request and device timeouts
             update():                Updates local model from the controller
                                      Returns True for success, False if timeouts occurred
+            hasChanged(paths):       Returns True if any of the listed model paths (or
+                                     anything inside or containing them) were changed
+                                     by the last update(), eg: ['heat', 'state.status']
+            stats(reset):            Returns a snapshot of the per key statistics, see
+                                     below. If 'reset' is True the counters are zeroed
+                                     in place afterwards.
+            listen(OMkey, handler):  Route the expected responses for OMkey to
+                                     handler(OMkey) whenever they are read; during
+                                     update() or read(). None stops listening.
+            expect(OMkey, OMflags):  Note that a M409 request for a listened to key
+                                     has been sent (with sendGcode()), it's response
+                                     is routed to the listener.
+            read(timeout):           Reads responses for up to 'timeout' μs, returns
+                                     True as soon as an expected response is handled.
+            cancel(OMkey):           Stop expecting the oldest response for a key, it
+                                     is counted as a timeout.
 
         properties:
             msdel:              Dictionary with the fetched model
             machineMode:        The current machine mode, string, or None if no response
+            touched:            Number of model leaves changed by the last update()
+            changed:            Set of the model paths changed by the last update(), eg:
+                                'heat.heaters[1].current', 'state.status' or 'job.build'
+                                (when a whole object was added, replaced or removed)
+                                Failed updates are included, these accumulate until
+                                the next successful update()
+            hot:                Dictionary of the hot value arrays, by path, see below
+            rttStats:           Dictionary of the round trip time estimates for frequent
+                                requests to each key; {key: [srtt, rttvar, timeout], ..}
+                                all int(μs)
+
+        Per key statistics:
+            Counters for each M409 request key ('' is the snapshot key) are kept in a
+            fixed size array (28 * 32 bit) and returned by stats() as:
+                {key: {'requests':n, 'verbose':n, 'frequent':n, 'bytes':n,
+                       'parse':μs, 'merge':μs, 'timeouts':n, 'outOfSequence':n,
+                       'latency':[10 buckets], 'size':[10 buckets]}, ..}
+            'latency' is a histogram of the response times; the first bucket is
+            < 1024μs and each bucket is double the previous, the last is >= 262ms.
+            'size' is a histogram of the response lengths; from < 64 bytes to >= 16k.
+            In stream mode responses are merged as they are parsed, this is all
+            counted as parse time.
+            The counters stop at 4294967295 (about 71 minutes of parse or merge
+            time in μs) rather than wrapping; reset them with stats(True) on
+            long runs.
+
+        Hot values:
+            hot = {'heat.heaters[].current':'f', 'job.filePosition':'i', ..}
+            Paths to frequently changing numeric values, with at most one '[]', and
+            the array typecode to store them as; 'f' (float) or 'i' (int). Each path
+            gets a fixed size array in self.hot, with self._hotSize slots for a list
+            ('[]') path, indexed by the list index, or a single slot. The arrays are
+            written in place as the values change, without allocating, and can be
+            read without walking the model; self.hot['heat.heaters[].current'][1]
+            Missing and removed values read as 0, list items beyond the end of the
+            array are only in the model.
+
+        Warm start:
+            When 'warmStart' is given the model, seqs and machine mode are saved to
+            that file after an update() when new verbose data has been fetched, at
+            most once every self._warmInterval to limit flash wear.
+            On start the snapshot is restored and checked against the controller;
+            it is only used if the M115 response is the same as when it was
+            saved (unless 'noCheck' is set, M115 is not sent then) and no
+            sequence number has gone back (the seqs only increase during a
+            controller session), otherwise the start is cold. Then an
+            update() is made straight away, without the firmware check; if the
+            controller has restarted (upTime went back) or the mode changed the
+            model is cleaned and fetched in full as normal, otherwise only the
+            keys whose seqs moved are fetched verbosely.
+            If this first update fails the normal (cold) start is done.
 
         There are a few defaults set below, of note are:
             self._requestTimeout : Absolute maximum time to wait for any response, int(μs)
@@ -148,22 +402,61 @@ class serialOM:
                                    total blocking time is the sum total of these
                                    - for a normal update() we always fetch the seqs and state
                                      keys, plus the per mode keys defined in omKeys
+                                   Frequent M409 requests wait for a time derived from a
+                                   running round trip time estimate for each key (as used
+                                   by TCP: srtt + 4 * rttvar), this is the upper limit.
+            self._rtoMin         : Minimum M409 response timeout, int(μs)
+            self._quietMin       : Minimum time to wait for further lines after a M409
+                                   response (2 * rttvar), int(μs), the device timeout
+                                   is the upper limit.
             self._depth          : the maximum depth specified for M409 requests, default = all
             self._uartRxBuf      : microPython specific: UART input buffer size, the default
                                    of 512 bytes is probably OK, but increasing is not a bad idea
+            self._rxChunk        : stream mode read buffer size (bytes)
+            self._lineBuf        : line buffer size (bytes), responses are read into this
+                                   and JSON loaded from it in place, it is enlarged if
+                                   a longer line is recieved
+            self._pollMin        : adaptive mode: polling interval for keys that are
+                                   changing, int(μs), default 0 = every update()
+            self._pollMax        : adaptive mode: maximum interval for keys that are not
+                                   changing, int(μs); the interval doubles each time
+                                   a key is polled and found unchanged, up to this
+            self._pollIdleMax    : adaptive mode: as _pollMax, while the state.status is
+                                   one of the self._pollIdle states
+            self._pollStep       : adaptive mode: the first step up from _pollMin, int(μs)
+            All intervals restart from _pollMin when the state.status changes.
+            self._warmInterval   : warm start: minimum time between snapshots, int(μs)
+            self._hotSize        : hot values: number of slots for list ('[]') paths
     '''
 
-    def __init__(self, rrf, omKeys, rawLog=None, quiet=False, noCheck=False):
+    def __init__(self, rrf, omKeys, rawLog=None, quiet=False, noCheck=False, stream=False,
+                 pipeline=1, snapshot=[], adaptive=False, collector=None, warmStart=None,
+                 hot=None):
         self._rrf = rrf
         self._uart = False
-        self._omKeys = omKeys
+        self._omKeys = {}
         self._rawLog = rawLog
         self._quiet = quiet
         self._noCheck = noCheck
         self._requestTimeout = 250000  # μs
+        self._rtoMin = 10000  # μs
+        self._quietMin = 2000  # μs
         self._depth = 99
         self._uartRxBuf = 2048
-        self._defaultModel = {'state':{'status':'unknown'},'seqs':None}
+        self._rxChunk = 256
+        self._lineBuf = 2048
+        self._pollMin = 0
+        self._pollMax = 2000000
+        self._pollIdleMax = 10000000
+        self._pollStep = 250000
+        self._pollIdle = ('idle', 'off', 'halted', 'disconnected')
+        self._warmInterval = 60000000
+        self._hotSize = 8
+        self._defaultModel = '{"state":{"status":"unknown"},"seqs":null}'  # json
+        # compile the requested keys and paths for each mode
+        self._views = {}
+        for mode in omKeys.keys():
+            self._omKeys[mode], self._views[mode] = self._projection(omKeys[mode])
         self._seqKeys = ['state']  # we always check 'state'
         for mode in self._omKeys.keys():  # all possible keys
             self._seqKeys = list(set(self._seqKeys) | set(self._omKeys[mode]))
@@ -171,14 +464,72 @@ class serialOM:
         for key in self._seqKeys:
             self._seqs[key] = -1
         self._upTime = -1
+        self._view = {}  # views for the current mode
+
+        # Streaming parser and read buffer
+        self._stream = stream
+        self._pipeline = max(1, pipeline)
+        self._snapshot = snapshot
+        self._adaptive = adaptive
+        self._gc = gcPolicy() if collector is None else collector
+        self._warmStart = warmStart
+        self._warmSaved = None  # when the last snapshot was saved
+        self._warmSeqs = None   # the seqs in the last snapshot
+        self._firmware = None   # the M115 response, saved with the snapshot
+        # hot value arrays, and a tree of their paths with (array, isInt) leaves
+        self.hot = {}
+        self._hotTree = {}
+        self._hotFill = []  # (node, index, container) to fill after the update
+        if hot is not None:
+            for path in hot.keys():
+                tokens = pathTokens(path)
+                self.hot[path] = array(hot[path],
+                                       [0] * (self._hotSize if '[]' in tokens else 1))
+                node = self._hotTree
+                for token in tokens[:-1]:
+                    node = node.setdefault(token, {})
+                node[tokens[-1]] = (self.hot[path], hot[path] == 'i')
+        self._poll = {}  # key: (interval, next poll)
+        self._snapRoot = {}
+        if self._stream:
+            from omStream import omStream
+            self._parser = omStream(self._streamTarget, self._storeResult, self._changedPath)
+            self._rxBuf = bytearray(self._rxChunk)
+            self._rxView = memoryview(self._rxBuf)
+            self._rxPos = 0
+            self._rxEnd = 0
+
+        # Line buffer
+        self._lnBuf = bytearray(self._lineBuf)
+        self._lnView = memoryview(self._lnBuf)
+        self._lnStart = 0   # start of the next line
+        self._lnScan = 0    # scanned for a newline up to here
+        self._lnEnd = 0     # end of the data
+        self._lnFind = hasattr(self._lnBuf, 'find')
 
         # public parameters
-        self.model = self._defaultModel
+        self.model = loads(self._defaultModel)
         self.machineMode = ''
+        self.touched = 0
+        self.changed = set()
+        self.rttStats = {}
+        self._keyStats = {}
+        self._rxBytes = 0
+        self._parseTime = 0
+        self._rxTime = 0
+        self._path = []
+        self._updated = True
+        self._listeners = {}    # OMkey: handler, see listen()
+        self._requested = {}    # OMkey: [send times] of the responses expected
+        self._heard = False
 
         # Main Init
         self._print('serialOM is starting')
+        self._setDevice(rrf)
+        # start the handler
+        self._start()
 
+    def _setDevice(self, rrf):
         # set a non blocking timeout on the serial device
         # default is 1/10 of the request time
         # values specified here are in mS, not μs)
@@ -195,8 +546,57 @@ class serialOM:
         else:
             self._print('Unable to determine serial stream type to enforce read timeouts!')
             self._print('please ensure these are set for your device to prevent serialOM blocking')
-        # start the handler
-        self._start()
+        # UART.any() or PySerial in_waiting tell us how much is ready to read
+        self._canWait = self._uart or hasattr(rrf, 'in_waiting')
+
+    def _projection(self, paths):
+        '''
+            Compiles the list of keys and paths for a mode, returns the list of
+            top level keys and a dict of the views for the keys given as paths:
+                {key: (request key, depth, spec), ..}
+        '''
+        keys = []
+        tails = {}
+        for path in paths:
+            tokens = pathTokens(path)
+            if tokens[0] not in keys:
+                keys.append(tokens[0])
+                tails[tokens[0]] = []
+            tails[tokens[0]].append(tokens[1:])
+        views = {}
+        for key in keys:
+            if key == 'state' or [] in tails[key]:
+                continue  # fetched whole
+            # longest common prefix, leaving at least one token in every path
+            common = min([len(t) for t in tails[key]]) - 1
+            n = 0
+            while n < common and tails[key][0][n] != '[]' and \
+                    len([t for t in tails[key] if t[n] != tails[key][0][n]]) == 0:
+                n += 1
+            spec = {}
+            depth = 0
+            for tail in tails[key]:
+                tail = tail[n:]
+                depth = max(depth, len(tail))
+                node = spec
+                for part in tail[:-1]:
+                    node = node.setdefault(part, {})
+                    if node is True:
+                        break
+                if node is not True:
+                    node[tail[-1]] = True
+            views[key] = ('.'.join([key] + tails[key][0][:n]), depth, spec)
+        # and a view of the whole model for snapshot requests
+        snapshot = {'seqs':True, 'state':True}
+        for key in keys:
+            spec = True
+            if key in views:
+                spec = views[key][2]
+                for part in reversed(views[key][0].split('.')[1:]):
+                    spec = {part:spec}
+            snapshot[key] = spec
+        views[''] = ('', self._depth, snapshot)
+        return keys, views
 
     def _print(self, *args, **kwargs):
         # To print, or not print, that is the question.
@@ -205,6 +605,15 @@ class serialOM:
 
     def _start(self):
         # Start the serialOM comms
+        if self._warmStart is not None and not self._noCheck:
+            self._firmware = self._firmwareId(self.getResponse('M115'))
+        if self._warmStart is not None and self._restore():
+            self._print('restored model snapshot, making update request')
+            if self._seqRequest() and self._sameSession() and self.update():
+                self._print('connected to ObjectModel')
+                return True
+            self._print('cannot use restored model, starting cold')
+            self._coldModel()
         if self._noCheck:
             self._print('skipping controller check')
         else:
@@ -215,7 +624,7 @@ class serialOM:
                     self._print('failed to get a sensible M115 response from controller')
                     return False
                 self._print('failed..retrying (' + str(retries) + ' left)')
-                sleep_ms(self._requestTimeout)
+                sleep_ms(self._requestTimeout // 1000)
             self._print('controller is connected')
         sleep_ms(100)
         # Do initial update to fill local model`
@@ -224,11 +633,91 @@ class serialOM:
             self._print('connected to ObjectModel')
             return True
         else:
-            self.model = self._defaultModel
-            self.machineMode = ''
+            self._coldModel()
             self._print('failed to obtain initial machine state')
             return False
 
+    def _coldModel(self):
+        # Discard the model, mode and seqs; the next update starts from scratch
+        self.model = loads(self._defaultModel)
+        self.machineMode = ''
+        self._view = {}
+        self._upTime = -1
+        for key in self._seqKeys:
+            self._seqs[key] = -1
+
+    def _restore(self):
+        # Restore the model, seqs and mode from the warm start snapshot
+        # returns True if a usable snapshot was loaded
+        try:
+            with open(self._warmStart) as f:
+                snapshot = load(f)
+            model = snapshot['model']
+            seqs = snapshot['seqs']
+            mode = snapshot['mode']
+            upTime = snapshot['upTime']
+            firmware = snapshot['firmware']
+        except Exception as e:
+            self._print('no model snapshot: ' + repr(e))
+            return False
+        if mode not in self._omKeys.keys() or not isinstance(model, dict) \
+                or 'state' not in model or 'seqs' not in model:
+            self._print('model snapshot is not usable')
+            return False
+        if not self._noCheck and (firmware is None or firmware != self._firmware):
+            self._print('model snapshot is from a different controller')
+            return False
+        self.model = model
+        self.machineMode = mode
+        self._view = self._views.get(mode, {})
+        self._upTime = upTime
+        for key in self._seqKeys:
+            self._seqs[key] = seqs.get(key, -1)
+        self._warmSeqs = dict(self._seqs)
+        if self._hotTree:
+            self._hotFill.append((self._hotTree, 0, self.model))
+        return True
+
+    def _firmwareId(self, response):
+        # The M115 response lines, to identify the controller, or None
+        response = [line.strip() for line in response]
+        if not self._firmwareCheck(response):
+            return None
+        return ' '.join(response)
+
+    def _sameSession(self):
+        # After a seqs request; True if the controller is still in the session
+        # the restored snapshot came from, the seqs only go up during a session
+        if not isinstance(self.model['seqs'], dict):
+            return False
+        for key in self._seqKeys:
+            seq = self.model['seqs'].get(key, None)
+            if seq is not None and self._seqs[key] != -1 and seq < self._seqs[key]:
+                self._print('model snapshot is from an earlier controller session')
+                return False
+        return True
+
+    def _save(self):
+        # Save a warm start snapshot, if new verbose data has been fetched
+        # since the last one and self._warmInterval has passed
+        if self._seqs == self._warmSeqs:
+            return
+        now = ticks_us()
+        if self._warmSaved is not None and \
+                ticks_diff(now, self._warmSaved) < self._warmInterval:
+            return
+        self._warmSaved = now
+        self._warmSeqs = dict(self._seqs)
+        try:
+            # write a new file and then replace the old one
+            with open(self._warmStart + '.new', 'w') as f:
+                dump({'mode':self.machineMode, 'upTime':self._upTime,
+                      'firmware':self._firmware, 'seqs':self._seqs,
+                      'model':self.model}, f)
+            rename(self._warmStart + '.new', self._warmStart)
+        except Exception as e:
+            self._print('failed to save model snapshot: ' + repr(e))
+
     def _omRequest(self, OMkey, OMflags):
         '''
             This is the main request send/recieve function, it sends a OM key request to the
@@ -236,99 +725,525 @@ class serialOM:
         '''
         # Construct the M409 command
         cmd = 'M409 F"' + OMflags + '" K"' + OMkey + '"'
-        queryResponse = self.getResponse(cmd, json=True)
-        if len(queryResponse) == 0:
+        timeout, quiet = self._timeouts(OMkey, OMflags)
+        self._countRequest(OMkey, OMflags)
+        sent = ticks_us()
+        if self._stream:
+            ownKey = self._streamResponse(cmd, OMkey, timeout)
+        else:
+            ownKey = self._lineResponse(cmd, OMkey, timeout, quiet)
+        self._countResponse(OMkey, ticks_diff(self._rxTime, sent) if ownKey else None)
+        if 'f' in OMflags:
+            self._rtt(OMkey, ticks_diff(self._rxTime, sent) if ownKey else None)
+        return ownKey
+
+    def _route(self, OMkey):
+        # Pass a response to it's listener if it is expected
+        sent = self._requested.get(OMkey, None)
+        if not sent:
             return False
+        self._countResponse(OMkey, ticks_diff(ticks_us(), sent.pop(0)))
+        self._heard = True
+        self._listeners[OMkey](OMkey)
+        return True
+
+    def listen(self, OMkey, handler):
+        # Route the expected responses for OMkey to handler(OMkey)
+        if handler is None:
+            self._listeners.pop(OMkey, None)
+            self._requested.pop(OMkey, None)
+        else:
+            self._listeners[OMkey] = handler
+            self._requested.setdefault(OMkey, [])
+
+    def expect(self, OMkey, OMflags):
+        # A M409 request for OMkey was sent, route the response to the listener
+        if OMkey not in self._listeners:
+            raise ValueError('no listener for: ' + OMkey)
+        self._countRequest(OMkey, OMflags)
+        self._requested[OMkey].append(ticks_us())
+
+    def read(self, timeout):
+        # Read responses for up to timeout (μs), True when an expected response is handled
+        self._heard = False
+        until = ticks_add(ticks_us(), timeout)
+        while ticks_diff(until, ticks_us()) > 0:
+            self._readResponse(())
+            if self._heard:
+                return True
+        return False
+
+    def cancel(self, OMkey):
+        # Stop expecting the oldest response for a key
+        sent = self._requested.get(OMkey, None)
+        if sent:
+            sent.pop(0)
+            self._countResponse(OMkey, None)
+
+    def _keyStat(self, OMkey):
+        # The statistics array for a request key
+        stat = self._keyStats.get(OMkey, None)
+        if stat is None:
+            stat = array('I', bytearray(_STATLEN * 4))
+            self._keyStats[OMkey] = stat
+        return stat
+
+    def _countRequest(self, OMkey, OMflags):
+        # Count a request being sent
+        stat = self._keyStat(OMkey)
+        _count(stat, _REQUESTS)
+        _count(stat, _FREQUENT if 'f' in OMflags else _VERBOSE)
+
+    def _countResponse(self, OMkey, latency):
+        # Count the response time (μs) for a request, or None if it timed out
+        stat = self._keyStat(OMkey)
+        if latency is None:
+            _count(stat, _TIMEOUTS)
+        else:
+            _count(stat, _LATENCY + _bucket(latency, 10))
+
+    def stats(self, reset=False):
+        '''
+            Returns a snapshot of the per key statistics, optionally resetting
+            them. Resetting zeroes the existing arrays, nothing is allocated.
+        '''
+        snapshot = {}
+        for key in self._keyStats:
+            stat = self._keyStats[key]
+            snapshot[key] = {}
+            for i in range(len(_COUNTERS)):
+                snapshot[key][_COUNTERS[i]] = stat[i]
+            snapshot[key]['latency'] = list(stat[_LATENCY:_LATENCY + _BUCKETS])
+            snapshot[key]['size'] = list(stat[_SIZE:_SIZE + _BUCKETS])
+            if reset:
+                for i in range(_STATLEN):
+                    stat[i] = 0
+        return snapshot
+
+    def _timeouts(self, OMkey, OMflags):
+        # Returns the response and quiet timeouts for a request
+        # verbose responses are larger and rarer, they always use the maximum
+        if OMkey not in self.rttStats or 'f' not in OMflags:
+            return self._requestTimeout, None
+        srtt, rttvar, timeout = self.rttStats[OMkey]
+        quiet = None
+        if self._canWait:
+            quiet = min(max(2 * rttvar, self._quietMin), self._requestTimeout // 10)
+        return timeout, quiet
+
+    def _rtt(self, OMkey, sample):
+        # Update the round trip time estimate for a key (see RFC 6298)
+        # with a time in μs, or None if the request timed out
+        if sample is None:
+            # no estimate, fall back to the request timeout until the next reply
+            if OMkey in self.rttStats:
+                del self.rttStats[OMkey]
+            return
+        if OMkey not in self.rttStats:
+            stats = [sample, sample // 2, 0]
+            self.rttStats[OMkey] = stats
         else:
-            return self._updateOM(queryResponse,OMkey)
-
-    def _updateOM(self,response,OMkey):
-        # Merge or replace the local OM copy with results from the query
-
-        def merge(a, b):
-            # A Local function for recursive/iterative merge of dict/list structures.
-            # https://stackoverflow.com/questions/19378143/python-merging-two-arbitrary-data-structures#1
-            if isinstance(a, dict) and isinstance(b, dict):
-                d = dict(a)
-                d.update({k: merge(a.get(k, None), b[k]) for k in b})
-                return d
-            if isinstance(a, list) and isinstance(b, list):
-                return [merge(x, y) for x, y in zip_longest(a, b)]
-            return a if b is None else b
-
-        # Process Json candidate lines
+            stats = self.rttStats[OMkey]
+            stats[1] = (3 * stats[1] + abs(stats[0] - sample)) // 4
+            stats[0] = (7 * stats[0] + sample) // 8
+        stats[2] = min(max(stats[0] + 4 * stats[1], self._rtoMin), self._requestTimeout)
+
+    def _lineResponse(self, cmd, OMkey, timeout, quiet):
+        '''
+            Sends a M409 query and reads the response lines, JSON candidates are
+            loaded directly from the line buffer. Returns True if the response
+            for OMkey was recieved within timeout (μs), False otherwise.
+        '''
+        self.sendGcode(cmd)
+        requestTime = ticks_add(ticks_us(), timeout)
+        expireTime = ticks_add(ticks_us(), self._requestTimeout * 5)
         ownKey = False
-        for line in response:
-            # Load as a json data structure
-            try:
-                payload = loads(line)
-            except:
-                self._print('invalid JSON recieved')
-                continue
-            # Update local OM data
-            if 'seq' in payload.keys():
-                # json info messages, currently ignored, string in payload['resp']
-                continue
-            if 'key' not in payload.keys():
-                self._print('valid JSON recieved, but no "key" data in it')
-                continue
-            elif 'result' not in payload.keys():
-                self._print('valid JSON recieved, but no "result" data in it')
-                continue
-            elif payload['key'] != OMkey:
-                self._print('out of sequence response')
-            else:
+        line = None
+        # look for a response within the timeout
+        while line is None and ticks_diff(ticks_us(),requestTime) < 0:
+            line = self._readLine()
+        # now read all lines that arrive within the quiet or serial timeout
+        while line is not None:
+            if self._ingestLine(line, (OMkey,)) is not None:
                 ownKey = True
-            # We have a result, store it (even if not for 'our' key)
+                self._rxTime = ticks_us()
+            if ticks_diff(ticks_us(),expireTime) > 0:
+                # runaway comms scenario; may indicate controler crash
+                raise serialOMError('Runaway communications; controller in error state?')
+            if quiet is not None and not self._moreData(quiet):
+                break
+            line = self._readLine()
+        if not ownKey:
+            self._print('timed out waiting for a json response')
+        # gc after response loop, if needed
+        self._gc.check()
+        return ownKey
+
+    def _ingestLine(self, line, pending):
+        # Load and ingest a line from the line buffer if it is a JSON candidate
+        # returns the key if this was the response to one of the pending requests
+        n = len(line)
+        if n < 3 or line[0] != 123 or line[n - 2] != 125:  # '{' .. '}\n'
+            return None
+        start = ticks_us()
+        try:
+            payload = _loads(line)
+        except:
+            self._print('invalid JSON recieved')
+            return None
+        self._parseTime = ticks_diff(ticks_us(), start)
+        self._rxBytes = n
+        return self._ingest(payload, pending)
+
+    def _ingest(self, payload, pending, stored=False):
+        # Merge or replace the local OM copy with a response payload
+        # The result may already have been stored (streamed) into the model
+        # Returns the key if this was the response to one of the pending requests
+        if 'seq' in payload.keys():
+            # json info messages, currently ignored, string in payload['resp']
+            return None
+        if 'key' not in payload.keys():
+            self._print('valid JSON recieved, but no "key" data in it')
+            return None
+        elif 'result' not in payload.keys():
+            self._print('valid JSON recieved, but no "result" data in it')
+            return None
+        stat = self._keyStat(payload['key'])
+        _count(stat, _BYTES, self._rxBytes)
+        _count(stat, _SIZE + _bucket(self._rxBytes, 6))
+        _count(stat, _PARSE, self._parseTime)
+        if payload['key'] not in pending:
+            if not self._route(payload['key']):
+                self._print('out of sequence response')
+                _count(stat, _OUTOFSEQ)
+            ownKey = None
+        else:
+            ownKey = payload['key']
+        # We have a result, store it (even if not for 'our' key)
+        start = ticks_us()
+        if payload['result'] != None:
+            key, spec = self._keyView(payload['key'])
+            if not stored:
+                parent, slot = self._resolve(payload['key'])
+                project(payload['result'], spec)
             if 'f' in payload['flags']:
-                # Frequent updates just refresh the existing key as needed
-                if payload['result'] != None:
+                # Frequent updates just refresh the changed values in place
+                if not stored:
                     #debug print('+',end='')
-                    self.model[payload['key']] = merge(self.model[payload['key']],payload['result'])
+                    self.touched += mergeKey(parent, slot, payload['result'],
+                                             False, self._changedPath, self._path)
             else:
-                # Verbose output simply replaces the existing key
-                if payload['result'] != None:
+                # Verbose output replaces the existing key
+                if not stored:
                     #debug print('*',end='')
-                    self.model[payload['key']] = payload['result']
-                    if payload['key'] in self._seqKeys:
-                        self._seqs[payload['key']] = self.model['seqs'][payload['key']]
-            # always gc if OM updated
-            collect()
+                    self.touched += self._storeResult(parent, slot, payload['result'])
+                if key in self._seqKeys:
+                    self._seqs[key] = self.model['seqs'][key]
+        _count(stat, _MERGE, ticks_diff(ticks_us(), start))
         return ownKey
 
+    def _keyView(self, OMkey):
+        # Returns the top level key, and the spec for a response to OMkey
+        key = OMkey.split('.')[0] if '.' in OMkey else OMkey
+        view = self._view.get(key, None)
+        if view is None or view[0] != OMkey:
+            return key, True
+        return key, view[2]
+
+    def _resolve(self, OMkey):
+        # Returns the container and key in the local model for a response to OMkey
+        # and sets the change path prefix to match
+        if OMkey == '':
+            # snapshot; the whole model is merged
+            self._snapRoot[''] = self.model
+            if self._path:
+                self._path = []
+            return self._snapRoot, ''
+        if '.' not in OMkey:
+            if self._path:
+                self._path = []
+            return self.model, OMkey
+        keys = OMkey.split('.')
+        parent = self.model
+        for k in keys[:-1]:
+            if not isinstance(parent.get(k, None), dict):
+                parent[k] = {}
+            parent = parent[k]
+        self._path = keys[:-1]
+        return parent, keys[-1]
+
+    def _storeResult(self, parent, key, result):
+        # Replace parent[key] with a complete (verbose) result, in place, so
+        # that only the values that differ are written and recorded as changed
+        return mergeKey(parent, key, result, True, self._changedPath, self._path)
+
+    def _changedPath(self, path, value):
+        # Record the path of a changed leaf
+        self.changed.add(pathString(path))
+        if self._hotTree:
+            self._hotStore(path, value)
+
+    def _hotStore(self, path, value):
+        # Write a changed value to it's hot array, containers that may hold
+        # hot values are filled in once the update is complete
+        node = self._hotTree
+        index = 0
+        for k in path:
+            if not isinstance(node, dict):
+                return
+            if isinstance(k, int):
+                index = k
+                node = node.get('[]', None)
+            elif '.' in k:
+                # a request key (from the stream parser)
+                for part in k.split('.'):
+                    node = node.get(part, None) if isinstance(node, dict) else None
+            elif k:
+                node = node.get(k, None)
+        if isinstance(node, tuple):
+            self._hotSet(node, index, value)
+        elif node is not None and isinstance(value, (dict, list)):
+            self._hotFill.append((node, index, value))
+
+    def _hotWalk(self, node, index, value):
+        # Fill the hot arrays from a container
+        if isinstance(node, tuple):
+            self._hotSet(node, index, value)
+        elif isinstance(value, dict):
+            for k in node:
+                if k in value:
+                    self._hotWalk(node[k], index, value[k])
+        elif isinstance(value, list) and '[]' in node:
+            for i in range(min(len(value), self._hotSize)):
+                self._hotWalk(node['[]'], i, value[i])
+
+    def _hotSet(self, leaf, index, value):
+        # Store a value in a hot array
+        values, isInt = leaf
+        if index >= len(values):
+            return
+        if not isinstance(value, (int, float)):
+            value = 0
+        values[index] = int(value) if isInt else value
+
+    def _streamTarget(self, envelope):
+        # Called by the stream parser when it reaches the result
+        # tells it where the result goes and whether to merge it
+        if 'key' not in envelope or 'flags' not in envelope:
+            return None
+        parent, slot = self._resolve(envelope['key'])
+        return (parent, slot, 'f' in envelope['flags'], self._keyView(envelope['key'])[1])
+
+    def _waiting(self):
+        # The number of bytes waiting to be read
+        try:
+            if self._uart:
+                return self._rrf.any()
+            return self._rrf.in_waiting
+        except Exception as e:
+            raise serialOMError('Serial read from controller failed : ' + repr(e)) from None
+
+    def _readChunk(self):
+        # Read everything waiting into the stream buffer, if nothing is
+        # waiting block for up to the device timeout for a single byte
+        waiting = self._waiting()
+        try:
+            n = self._rrf.readinto(self._rxView[:max(1, min(waiting, self._rxChunk))])
+        except Exception as e:
+            raise serialOMError('Serial read from controller failed : ' + repr(e)) from None
+        if not n:
+            return 0
+        if self._rawLog:
+            try:
+                self._rawLog.write(bytes(self._rxView[:n]).decode('ascii'))
+            except:
+                self._print('ascii decode failure')
+        self._rxPos = 0
+        self._rxEnd = n
+        return n
+
+    def _feed(self):
+        # Parse the stream buffer, counting the time taken and bytes parsed
+        start = ticks_us()
+        end = self._parser.feed(self._rxBuf, self._rxPos, self._rxEnd)
+        self._parseTime += ticks_diff(ticks_us(), start)
+        self._rxBytes += end - self._rxPos
+        self._rxPos = end
+
+    def _streamResponse(self, cmd, OMkey, timeout):
+        '''
+            Sends a M409 query and parses the response directly from the stream
+            into the local model. Returns as soon as the response for OMkey is
+            complete, True if it was recieved within timeout (μs), False otherwise.
+        '''
+        self.sendGcode(cmd)
+        requestTime = ticks_add(ticks_us(), timeout)
+        expireTime = ticks_add(ticks_us(), self._requestTimeout * 5)
+        parser = self._parser
+        ownKey = False
+        seen = False
+        while not ownKey:
+            if self._rxPos == self._rxEnd:
+                if not self._readChunk():
+                    # nothing more within the read timeout
+                    if seen or ticks_diff(ticks_us(),requestTime) > 0:
+                        break
+                    continue
+                seen = True
+            self._feed()
+            if parser.envelope is not None:
+                if self._ingest(parser.envelope, (OMkey,), stored=True) is not None:
+                    ownKey = True
+                    self._rxTime = ticks_us()
+                self.touched += parser.touched
+                parser.reset()
+                self._rxBytes = self._parseTime = 0
+            if ticks_diff(ticks_us(),expireTime) > 0:
+                # runaway comms scenario; may indicate controler crash
+                raise serialOMError('Runaway communications; controller in error state?')
+        if not ownKey:
+            # discard any incomplete response
+            parser.abort()
+            self._rxBytes = self._parseTime = 0
+            self._print('timed out waiting for a json response')
+        # gc after response loop, if needed
+        self._gc.check()
+        return ownKey
+
+    def _keyQuery(self,key):
+        # Returns the request key and flags for a key with the correct verbosity
+        # keys with a view use the request key and depth from that
+        OMkey = key
+        depth = self._depth
+        if key in self._view:
+            OMkey, depth, _ = self._view[key]
+        if self._seqs[key] != self.model['seqs'][key]:
+            return OMkey, 'vnd' + str(depth)
+        return OMkey, 'fnd' + str(depth)
+
     def _keyRequest(self,key):
         # Do an individual key request using the correct verbosity
-        if self._seqs[key] != self.model['seqs'][key]:
-            if self._omRequest(key,'vnd' + str(self._depth)):
-                return True;
-        else:
-            if self._omRequest(key,'fnd' + str(self._depth)):
-                return True;
-        return False
+        OMkey, OMflags = self._keyQuery(key)
+        return self._omRequest(OMkey, OMflags)
+
+    def _pipeRequest(self, keys):
+        '''
+            Pipelined key requests; keeps up to self._pipeline M409 requests in
+            flight, sending the next as each response arrives, and matches the
+            responses to the requests by their key.
+            Returns a list of the request keys that were not answered.
+        '''
+        queries = [self._keyQuery(key) for key in keys]
+        flags = {}
+        for OMkey, OMflags in queries:
+            flags[OMkey] = OMflags
+        pending = []
+        sentAt = []
+        missed = []
+        sent = 0
+        requestTime = ticks_us()
+        expireTime = ticks_add(ticks_us(), self._requestTimeout * (len(queries) + 4))
+        while sent < len(queries) or pending:
+            while sent < len(queries) and len(pending) < self._pipeline:
+                OMkey, OMflags = queries[sent]
+                self.sendGcode('M409 F"' + OMflags + '" K"' + OMkey + '"')
+                self._countRequest(OMkey, OMflags)
+                pending.append(OMkey)
+                sentAt.append(ticks_us())
+                sent += 1
+                requestTime = ticks_add(sentAt[0],
+                                        self._timeouts(pending[0], flags[pending[0]])[0])
+            key = self._readResponse(pending)
+            if key is not None and key is not False:
+                i = pending.index(key)
+                self._countResponse(key, ticks_diff(ticks_us(), sentAt[i]))
+                if 'f' in flags[key]:
+                    self._rtt(key, ticks_diff(ticks_us(), sentAt[i]))
+                pending.pop(i)
+                sentAt.pop(i)
+                if pending:
+                    requestTime = ticks_add(sentAt[0],
+                                            self._timeouts(pending[0], flags[pending[0]])[0])
+            elif key is None and ticks_diff(ticks_us(),requestTime) > 0:
+                # give up on everything in flight, carry on with the rest
+                self._print('timed out waiting for a json response')
+                if self._stream:
+                    self._parser.abort()
+                    self._rxBytes = self._parseTime = 0
+                for OMkey in pending:
+                    self._countResponse(OMkey, None)
+                    if 'f' in flags[OMkey]:
+                        self._rtt(OMkey, None)
+                missed.extend(pending)
+                del pending[:]
+                del sentAt[:]
+            if ticks_diff(ticks_us(),expireTime) > 0:
+                # runaway comms scenario; may indicate controler crash
+                raise serialOMError('Runaway communications; controller in error state?')
+        # gc after response loop, if needed
+        self._gc.check()
+        return missed
+
+    def _readResponse(self, pending):
+        '''
+            Reads from the controller until a response is complete, or the
+            read times out. Returns the key if the response was for one of
+            the pending requests, False for any other line and None on timeout.
+        '''
+        if self._stream:
+            parser = self._parser
+            if self._rxPos == self._rxEnd and not self._readChunk():
+                return None
+            self._feed()
+            if parser.envelope is None:
+                return False
+            key = self._ingest(parser.envelope, pending, stored=True)
+            self.touched += parser.touched
+            parser.reset()
+            self._rxBytes = self._parseTime = 0
+            return False if key is None else key
+        line = self._readLine()
+        if line is None:
+            return None
+        key = self._ingestLine(line, pending)
+        return False if key is None else key
 
     def _stateRequest(self):
         # sends a state request
         # handles machine mode and uptime changes
+        if not self._keyRequest('state'):
+            self._print('state key request failed')
+            return False
+        self._stateCheck()
+        return True
+
+    def _stateCheck(self):
+        # handles machine mode and uptime changes after a state update
+        # returns True if the local OM was cleaned
 
         def cleanstart(why):
-            # clean and reset the local OM and seqs, returns full seqs list
-            self.model = self._defaultModel
+            # clean and reset the local OM and seqs
+            # keeping the state and seqs we just recieved
+            for key in self.model.keys():
+                if key not in ('state', 'seqs'):
+                    self.changed.add(key)
+            self.model = {'state':self.model['state'], 'seqs':self.model['seqs']}
             self._seqs = {}
             for key in self._seqKeys:
                 self._seqs[key] = -1
             self._print(why)
-            return self._seqKeys
 
-        if not self._keyRequest('state'):
-            self._print('state key request failed')
-            return False
+        cleaned = False
         if self._upTime > self.model['state']['upTime']:
             cleanstart('controller restarted')
+            cleaned = True
         if self.machineMode != self.model['state']['machineMode']:
             cleanstart('machine mode is: ' + self.model['state']['machineMode'])
+            cleaned = True
         self.machineMode = self.model['state']['machineMode']
+        self._view = self._views.get(self.machineMode, {})
         self._upTime = self.model['state']['upTime']
-        return True
+        return cleaned
 
     def _seqRequest(self):
         # Send a 'seqs' request to the OM, updates local OM and returns
@@ -344,7 +1259,10 @@ class serialOM:
         # Use M115 to (re-establish comms and verify firmware
         # Send the M115 info request and look for a sensible reply
         self._print('> M115')
-        response = self.getResponse('M115')
+        return self._firmwareCheck(self.getResponse('M115'))
+
+    def _firmwareCheck(self, response):
+        # Look for a sensible reply in the M115 response lines
         haveRRF = False
         if len(response) > 0:
             for line in response:
@@ -374,40 +1292,121 @@ class serialOM:
         if self._rawLog:
             self._rawLog.write("> " + code + "\n")
 
-    def getResponse(self, cmd, json=False):
+    def _getLine(self):
+        # Get and decode a line from serial device
+        line = self._readLine()
+        if line is None:
+            return ''
+        try:
+            return str(line, 'ascii')
+        except:
+            self._print('ascii decode failure')
+            return ''
+
+    def _readLine(self):
         '''
-            Sends a query and waits for response data,
-            returns a list of response lines, or None
-            If 'json' is set we exit immediately when
-            a potential JSON canidate is seen.
+            Returns the next line from the serial device as a memoryview of the
+            line buffer, including the newline. This is only valid until the
+            next read. Returns None if no complete line arrives within the
+            device timeout, and discards any partial line.
         '''
-        def getLine():
-            # Local function to get and decode a line from serial device
+        while True:
+            end = self._findLine()
+            if end >= 0:
+                start = self._lnStart
+                self._lnStart = self._lnScan = end + 1
+                return self._lnView[start:end + 1]
+            if self._lnStart == self._lnEnd:
+                # empty, start again at the beginning
+                self._lnStart = self._lnScan = self._lnEnd = 0
+            elif self._lnEnd == len(self._lnBuf):
+                self._makeRoom()
+            waiting = self._waiting() if self._canWait else 1
+            free = len(self._lnBuf) - self._lnEnd
             try:
-                rawLine = self._rrf.readline()
+                n = self._rrf.readinto(self._lnView[self._lnEnd:self._lnEnd +
+                                                    max(1, min(waiting, free))])
             except Exception as e:
                 raise serialOMError('Serial read from controller failed : ' + repr(e)) from None
-            if not rawLine:
-                return ''
-            try:
-                readLine = rawLine.decode('ascii')
-            except:
-                self._print('ascii decode failure')
-                readLine = ''
-            if self._rawLog and readLine:
-                self._rawLog.write(readLine)
-            return readLine
+            if not n:
+                # timed out, discard any partial line
+                self._lnStart = self._lnScan = self._lnEnd = 0
+                return None
+            if self._rawLog:
+                try:
+                    self._rawLog.write(str(self._lnView[self._lnEnd:self._lnEnd + n], 'ascii'))
+                except:
+                    self._print('ascii decode failure')
+            self._lnEnd += n
+
+    def _findLine(self):
+        # Returns the index of the next newline in the line buffer, or -1
+        # bytearray.find() is not available in microPython
+        if self._lnFind:
+            i = self._lnBuf.find(b'\n', self._lnScan, self._lnEnd)
+        else:
+            buf = self._lnBuf
+            i = self._lnScan
+            end = self._lnEnd
+            while i < end and buf[i] != 10:
+                i += 1
+            if i == end:
+                i = -1
+        if i < 0:
+            self._lnScan = self._lnEnd
+        return i
+
+    def _makeRoom(self):
+        # The line buffer is full; move the partial line to the start
+        # or, if it already fills the buffer, make a bigger buffer
+        start = self._lnStart
+        n = self._lnEnd - start
+        if start == 0:
+            self._print('line buffer enlarged')
+            buf = bytearray(len(self._lnBuf) * 2)
+            buf[:n] = self._lnBuf
+            self._lnBuf = buf
+            self._lnView = memoryview(buf)
+            self._lnFind = hasattr(buf, 'find')
+            return
+        buf = self._lnBuf
+        for i in range(n):
+            buf[i] = buf[start + i]
+        self._lnStart = 0
+        self._lnScan -= start
+        self._lnEnd = n
+
+    def _moreData(self, quiet):
+        # Wait up to 'quiet' (μs) for more data, False if none arrived
+        if self._lnEnd > self._lnStart:
+            return True
+        quietTime = ticks_add(ticks_us(), quiet)
+        while not self._waiting():
+            if ticks_diff(ticks_us(),quietTime) > 0:
+                return False
+        return True
 
+    def getResponse(self, cmd, json=False, timeout=None, quiet=None):
+        '''
+            Sends a query and waits for response data,
+            returns a list of response lines, or None
+            If 'json' is set we exit immediately when
+            a potential JSON canidate is seen.
+            The time the first line was seen is left in self._rxTime
+        '''
         # Send the command to RRF
         self.sendGcode(cmd)
         # And wait for a response
-        requestTime = ticks_add(ticks_us(), self._requestTimeout)
+        if timeout is None:
+            timeout = self._requestTimeout
+        requestTime = ticks_add(ticks_us(), timeout)
         expireTime = ticks_add(ticks_us(), self._requestTimeout * 5)
         response=[]
         readLine = ''
         # look for a response within the requestTimeout period
         while (ticks_diff(ticks_us(),requestTime) < 0) and not readLine:
-            readLine = getLine()
+            readLine = self._getLine()
+        self._rxTime = ticks_us()
         # now read all lines that arrive within the serialTimeout
         while readLine:
             if not json:
@@ -418,20 +1417,47 @@ class serialOM:
                 # runaway comms scenario; may indicate controler crash
                 raise serialOMError('Runaway communications; controller in error state?')
                 break
+            if quiet is not None and not self._moreData(quiet):
+                break
             # see if more data is in the recieve buffer
-            readLine = getLine()
+            readLine = self._getLine()
         # cleanup and return
         if len(response) == 0:
             if json:
                 self._print('timed out waiting for a json response')
             else:
                 self._print('timed out waiting for a response')
-        # gc after response loop
-        collect()
+        # gc after response loop, if needed
+        self._gc.check()
         return response
 
     def update(self):
         # Do an update cycle; get new data and update local OM
+        self._beginUpdate()
+        if self.machineMode in self._snapshot:
+            updated = self._snapshotUpdate()
+        elif self._pipeline > 1:
+            updated = self._pipeUpdate()
+        else:
+            updated = self._update()
+        return self._endUpdate(updated)
+
+    def _beginUpdate(self):
+        # changes accumulate over failed updates until one succeeds
+        if self._updated:
+            self.touched = 0
+            self.changed.clear()
+
+    def _endUpdate(self, updated):
+        # fill in the hot values and save the warm start snapshot
+        self._updated = updated
+        while self._hotFill:
+            self._hotWalk(*self._hotFill.pop())
+        if self._updated and self._warmStart is not None:
+            self._save()
+        return self._updated
+
+    def _update(self):
         success = True  # track (soft) failures
         # do a sequence number request update
         if not self._seqRequest():
@@ -439,12 +1465,106 @@ class serialOM:
         # do a state request (handles restart and mode changes)
         if not self._stateRequest():
             return False
-        if self.machineMode not in self._omKeys.keys():
-            # should never hit this, but just in case
-            self._print('unknown machine mode "' + self.machineMode + '"')
+        if not self._modeCheck():
             return False
         # do the individual key requests
-        for key in self._omKeys[self.machineMode]:
+        polled = []
+        for key in self._pollKeys(self._omKeys[self.machineMode]):
+            if self._keyRequest(key):
+                polled.append(key)
+            else:
+                success = False
+        self._schedule(polled)
+        return success
+
+    def _snapshotUpdate(self):
+        # Snapshot update; a single request returns the frequent values for
+        # the whole model, including seqs and state, then verbose requests
+        # are made for any keys where the sequence number has changed
+        if not self._omRequest('', 'fnd' + str(self._depth)):
+            self._print('snapshot request failed')
+            return False
+        if self._seqs['state'] != self.model['seqs']['state']:
+            if not self._keyRequest('state'):
+                self._print('state key request failed')
+                return False
+        self._stateCheck()
+        if not self._modeCheck():
+            return False
+        keys = self._seqsChanged()
+        if self._pipeline > 1:
+            return len(self._pipeRequest(keys)) == 0
+        success = True
+        for key in keys:
             if not self._keyRequest(key):
                 success = False
         return success
+
+    def _pipeUpdate(self):
+        # Pipelined update; the state and the keys for the current mode are
+        # requested together, if the state shows the mode changed or the
+        # controller restarted the keys for the new mode are then requested
+        if not self._seqRequest():
+            return False
+        keys = self._pollKeys(self._omKeys.get(self.machineMode, []))
+        missed = self._pipeRequest(['state'] + keys)
+        if 'state' in missed:
+            self._print('state key request failed')
+            return False
+        if self._stateCheck():
+            if not self._modeCheck():
+                return False
+            keys = self._pollKeys(self._omKeys[self.machineMode])
+            missed = self._pipeRequest(keys)
+        self._schedule([key for key in keys
+                        if (self._view[key][0] if key in self._view else key) not in missed])
+        return len(missed) == 0
+
+    def _modeCheck(self):
+        # True if there are keys for the machine mode
+        if self.machineMode not in self._omKeys.keys():
+            # should never hit this, but just in case
+            self._print('unknown machine mode "' + self.machineMode + '"')
+            return False
+        return True
+
+    def _seqsChanged(self):
+        # The keys for the machine mode where the sequence number has changed
+        return [key for key in self._omKeys[self.machineMode]
+                    if self._seqs[key] != self.model['seqs'][key]]
+
+    def _pollKeys(self, keys):
+        # Returns the keys that are due to be polled, in adaptive mode
+        # keys with new verbose data are always due
+        if not self._adaptive:
+            return keys
+        now = ticks_us()
+        return [key for key in keys if key not in self._poll
+                    or self._seqs[key] != self.model['seqs'][key]
+                    or ticks_diff(now, self._poll[key][1]) >= 0]
+
+    def _schedule(self, keys):
+        # Set the next poll time for the polled keys, in adaptive mode
+        # keys that changed are polled again after the minimum interval,
+        # the interval for unchanged keys doubles, up to the maximum
+        if not self._adaptive:
+            return
+        if pathMatch(self.changed, ('state.status',)):
+            self._poll = {}
+        if self.model['state']['status'] in self._pollIdle:
+            ceiling = self._pollIdleMax
+        else:
+            ceiling = self._pollMax
+        now = ticks_us()
+        for key in keys:
+            if pathMatch(self.changed, (key,)):
+                interval = self._pollMin
+            elif key in self._poll:
+                interval = min(max(self._poll[key][0] * 2, self._pollStep), ceiling)
+            else:
+                interval = min(self._pollStep, ceiling)
+            self._poll[key] = (interval, ticks_add(now, interval))
+
+    def hasChanged(self, paths):
+        # True if any of the model paths were changed by the last update
+        return pathMatch(self.changed, paths)
@@ -1,6 +1,14 @@
 # MicroPython SSD1306 OLED driver, I2C and SPI interfaces
+#
+# show() only sends the columns of each page that changed since the last
+# show(), found by comparing the buffer with a shadow copy of what was sent.
+# frame_bytes is the number of bytes (data and commands) sent by the last
+# show(), total_bytes and frames count them since the display was created.
+# Every transfer, full or one page, is counted as its data plus the window
+# commands and the control bytes the interface puts in front of each write.
 
 from micropython import const
+import micropython
 import framebuf
 
 
@@ -23,15 +31,47 @@ SET_PRECHARGE = const(0xD9)
 SET_VCOM_DESEL = const(0xDB)
 SET_CHARGE_PUMP = const(0x8D)
 
+
+@micropython.viper
+def _diff(buf: ptr8, shadow: ptr8, start: int, end: int) -> int:
+    # Copies buf[start:end] to shadow, returns the first and last indexes that
+    # changed as (first << 16) | last, or -1 if nothing changed
+    first = -1
+    last = 0
+    i = start
+    while i < end:
+        if buf[i] != shadow[i]:
+            if first < 0:
+                first = i
+            last = i
+            shadow[i] = buf[i]
+        i += 1
+    if first < 0:
+        return -1
+    return (first << 16) | last
+
+
 # Subclassing FrameBuffer provides support for graphics primitives
 # http://docs.micropython.org/en/latest/pyboard/library/framebuf.html
 class SSD1306(framebuf.FrameBuffer):
+    control_bytes = 0  # sent before each command and data write, set by the interface
+
     def __init__(self, width, height, external_vcc):
         self.width = width
         self.height = height
         self.external_vcc = external_vcc
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
+        self.shadow = bytearray(self.pages * self.width)
+        self.view = memoryview(self.buffer)
+        self.window = bytearray(6)
+        # bytes sent per transfer besides the data; the window commands and
+        # the control byte (if any) before the commands and the data
+        self.overhead = len(self.window) + 2 * self.control_bytes
+        self.full = True  # the display contents are unknown, send everything
+        self.frame_bytes = 0
+        self.total_bytes = 0
+        self.frames = 0
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
         self.init_display()
 
@@ -88,29 +128,62 @@ class SSD1306(framebuf.FrameBuffer):
     def rotate(self, rotate):
         self.write_cmd(SET_COM_OUT_DIR | ((rotate & 1) << 3))
         self.write_cmd(SET_SEG_REMAP | (rotate & 1))
+        # the segment remap only applies to new data
+        self.full = True
 
-    def show(self):
-        x0 = 0
-        x1 = self.width - 1
+    def set_window(self, x0, x1, page0, page1):
+        x = 0
         if self.width == 64:
             # displays with width of 64 pixels are shifted by 32
-            x0 += 32
-            x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+            x = 32
+        window = self.window
+        window[0] = SET_COL_ADDR
+        window[1] = x0 + x
+        window[2] = x1 + x
+        window[3] = SET_PAGE_ADDR
+        window[4] = page0
+        window[5] = page1
+        self.write_cmds(window)
+
+    def show(self):
+        width = self.width
+        try:
+            if self.full:
+                self.set_window(0, width - 1, 0, self.pages - 1)
+                self.write_data(self.buffer)
+                self.shadow[:] = self.buffer
+                self.full = False
+                sent = len(self.buffer) + self.overhead
+            else:
+                sent = 0
+                for page in range(self.pages):
+                    start = page * width
+                    span = _diff(self.buffer, self.shadow, start, start + width)
+                    if span < 0:
+                        continue
+                    first = span >> 16
+                    last = span & 0xFFFF
+                    self.set_window(first - start, last - start, page, page)
+                    self.write_data(self.view[first:last + 1])
+                    sent += last - first + 1 + self.overhead
+        except:
+            # the shadow may not match the display, send everything next time
+            self.full = True
+            raise
+        self.frame_bytes = sent
+        self.total_bytes += sent
+        self.frames += 1
 
 
 class SSD1306_I2C(SSD1306):
+    control_bytes = 1  # Co and D/C# byte before each write
+
     def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False):
         self.i2c = i2c
         self.addr = addr
         self.temp = bytearray(2)
         self.write_list = [b"\x40", None]  # Co=0, D/C#=1
+        self.cmds_list = [b"\x00", None]  # Co=0, D/C#=0
         super().__init__(width, height, external_vcc)
 
     def write_cmd(self, cmd):
@@ -118,12 +191,18 @@ class SSD1306_I2C(SSD1306):
         self.temp[1] = cmd
         self.i2c.writeto(self.addr, self.temp)
 
+    def write_cmds(self, cmds):
+        self.cmds_list[1] = cmds
+        self.i2c.writevto(self.addr, self.cmds_list)
+
     def write_data(self, buf):
         self.write_list[1] = buf
         self.i2c.writevto(self.addr, self.write_list)
 
 
 class SSD1306_SPI(SSD1306):
+    control_bytes = 0  # D/C# is a pin
+
     def __init__(self, width, height, spi, dc, res, cs, external_vcc=False):
         self.rate = 10 * 1024 * 1024
         dc.init(dc.OUT, value=0)
@@ -150,6 +229,14 @@ class SSD1306_SPI(SSD1306):
         self.spi.write(bytearray([cmd]))
         self.cs(1)
 
+    def write_cmds(self, cmds):
+        self.spi.init(baudrate=self.rate, polarity=0, phase=0)
+        self.cs(1)
+        self.dc(0)
+        self.cs(0)
+        self.spi.write(cmds)
+        self.cs(1)
+
     def write_data(self, buf):
         self.spi.init(baudrate=self.rate, polarity=0, phase=0)
         self.cs(1)
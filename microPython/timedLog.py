@@ -0,0 +1,70 @@
+'''
+    timedLog: a timestamped serialOM rawLog.
+
+    Wraps a file object and is passed to serialOM as it's 'rawLog'; every
+    line written is prefixed with the time since the log was opened, in
+    microseconds, when the line was completed:
+        @1234567 > M409 F"fnd99" K"heat"
+        @1241321 {"key":"heat","flags":"fnd99","result":{...}}
+    Otherwise the lines are exactly those of the plain rawLog; commands
+    that were sent begin with '> ', everything else was recieved.
+
+    Responses are written to the rawLog in chunks as they are read, these
+    are buffered here until the line is complete. A command can be sent
+    while a response is still arriving (pipelining), it is logged at once
+    and the partial response line is kept.
+
+    The time is a running total of the time between lines, so it is not
+    limited by the range of the microPython ticks_diff() (about 9 minutes);
+    only a gap of more than that between two lines would be mistimed.
+
+    Captures in this format can be replayed to serialOM with their original
+    timing by host/replayRRF.py.
+
+    arguments:
+        log:        file object; where to write the capture, required
+
+    methods:
+        write(text):    Log text sent to, or recieved from, the controller
+        flush():        Write any partial line and flush the log
+'''
+
+# CPython / MicroPython compatibility:
+try:
+    from time import ticks_us, ticks_diff  # microPython
+except:
+    from time import time
+    def ticks_us():
+        return int(time() * 1000000)
+    def ticks_diff(first,second):
+        return int(first-second)
+
+class timedLog:
+    def __init__(self, log):
+        self._log = log
+        self._last = ticks_us()
+        self._elapsed = 0   # μs since the log was opened
+        self._partial = ''
+
+    def _stamp(self, line):
+        now = ticks_us()
+        self._elapsed += ticks_diff(now, self._last)
+        self._last = now
+        self._log.write('@{} {}'.format(self._elapsed, line))
+
+    def write(self, text):
+        if text.startswith('> ') and text.endswith('\n'):
+            # a command sent by serialOM
+            self._stamp(text)
+            return len(text)
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self._stamp(line + '\n')
+        return len(text)
+
+    def flush(self):
+        if self._partial:
+            self._stamp(self._partial + '\n')
+            self._partial = ''
+        self._log.flush()